@@ -0,0 +1,90 @@
+"""Índices para las queries calientes de reminder_instances y notification_logs
+
+Las tablas ya existen (se crearon fuera de Alembic), por lo que esta es la primera
+revisión y solo agrega índices y la restricción única de (reminder_id, scheduled_datetime).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Eliminar instancias duplicadas (mismo reminder y slot) para poder crear la restricción
+    # única. De cada slot sobrevive la más avanzada (estado final antes que en curso, y con
+    # taken_at antes que sin él; a igualdad, la más antigua), y los notification_logs de las
+    # duplicadas se pasan a la sobreviviente antes de borrarlas (si no, se irían en cascada)
+    survivors = """
+        SELECT id, first_value(id) OVER (
+            PARTITION BY reminder_id, scheduled_datetime
+            ORDER BY
+                CASE status
+                    WHEN 'success' THEN 5
+                    WHEN 'rejected' THEN 4
+                    WHEN 'waiting' THEN 3
+                    WHEN 'failure' THEN 2
+                    ELSE 1
+                END DESC,
+                (taken_at IS NOT NULL) DESC,
+                id
+        ) AS survivor_id
+        FROM reminder_instances
+    """
+    op.execute(
+        f"""
+        UPDATE notification_logs nl
+        SET reminder_instance_id = s.survivor_id
+        FROM ({survivors}) s
+        WHERE nl.reminder_instance_id = s.id
+          AND s.id <> s.survivor_id
+        """
+    )
+    op.execute(
+        f"""
+        DELETE FROM reminder_instances ri
+        USING ({survivors}) s
+        WHERE ri.id = s.id
+          AND s.id <> s.survivor_id
+        """
+    )
+    op.create_unique_constraint(
+        "uq_reminder_instances_reminder_scheduled",
+        "reminder_instances",
+        ["reminder_id", "scheduled_datetime"],
+    )
+    op.create_index(
+        "ix_reminder_instances_pending_scheduled",
+        "reminder_instances",
+        ["scheduled_datetime"],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        "ix_reminder_instances_message_id",
+        "reminder_instances",
+        ["message_id"],
+        postgresql_where=sa.text("message_id IS NOT NULL"),
+    )
+    op.create_index(
+        "ix_notification_logs_instance_sent_at",
+        "notification_logs",
+        ["reminder_instance_id", sa.text("sent_at DESC")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notification_logs_instance_sent_at", table_name="notification_logs")
+    op.drop_index("ix_reminder_instances_message_id", table_name="reminder_instances")
+    op.drop_index("ix_reminder_instances_pending_scheduled", table_name="reminder_instances")
+    op.drop_constraint("uq_reminder_instances_reminder_scheduled", "reminder_instances", type_="unique")
@@ -0,0 +1,28 @@
+"""Columnas de claim/lease en reminder_instances para el despacho multi-réplica
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("reminder_instances", sa.Column("claimed_by", sa.String(length=255), nullable=True))
+    op.add_column("reminder_instances", sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("reminder_instances", "lease_expires_at")
+    op.drop_column("reminder_instances", "claimed_by")
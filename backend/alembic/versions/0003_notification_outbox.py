@@ -0,0 +1,60 @@
+"""Tabla notification_outbox para el envío transaccional de notificaciones
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("idempotency_key", sa.String(length=255), nullable=False, unique=True),
+        sa.Column(
+            "reminder_instance_id",
+            sa.Integer(),
+            sa.ForeignKey("reminder_instances.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "notification_log_id",
+            sa.Integer(),
+            sa.ForeignKey("notification_logs.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("channel", sa.String(length=50), nullable=False),
+        sa.Column("recipient", sa.String(), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("status", sa.String(length=50), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("claimed_by", sa.String(length=255), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.current_timestamp(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "ix_notification_outbox_open",
+        "notification_outbox",
+        ["id"],
+        postgresql_where=sa.text("status IN ('pending', 'sending')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notification_outbox_open", table_name="notification_outbox")
+    op.drop_table("notification_outbox")
@@ -0,0 +1,40 @@
+"""Columna next_attempt_at e índices para los reintentos con backoff
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("reminder_instances", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_reminder_instances_pending_due",
+        "reminder_instances",
+        [sa.text("COALESCE(next_attempt_at, scheduled_datetime)")],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index(
+        "ix_reminder_instances_retryable",
+        "reminder_instances",
+        ["updated_at"],
+        postgresql_where=sa.text("status IN ('failure', 'waiting')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reminder_instances_retryable", table_name="reminder_instances")
+    op.drop_index("ix_reminder_instances_pending_due", table_name="reminder_instances")
+    op.drop_column("reminder_instances", "next_attempt_at")
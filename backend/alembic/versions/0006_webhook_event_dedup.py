@@ -0,0 +1,45 @@
+"""Deduplicación de webhook_events por (provider, event_id) y limpieza por antigüedad
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Los reenvíos ya guardados antes de la restricción se conservan solo una vez
+    op.execute(
+        """
+        DELETE FROM webhook_events we
+        USING webhook_events dup
+        WHERE we.provider = dup.provider
+          AND we.event_id = dup.event_id
+          AND we.id > dup.id
+        """
+    )
+    op.create_unique_constraint(
+        "uq_webhook_events_provider_event", "webhook_events", ["provider", "event_id"]
+    )
+    op.create_index(
+        "ix_webhook_events_closed",
+        "webhook_events",
+        ["received_at"],
+        postgresql_where=sa.text("status IN ('processed', 'failed')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_webhook_events_closed", table_name="webhook_events")
+    op.drop_constraint("uq_webhook_events_provider_event", "webhook_events", type_="unique")
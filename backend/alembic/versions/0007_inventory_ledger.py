@@ -0,0 +1,64 @@
+"""Tabla inventory_ledger con los movimientos de stock de los medicamentos
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "inventory_ledger",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "medicine_id",
+            sa.Integer(),
+            sa.ForeignKey("medicines.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column(
+            "reminder_instance_id",
+            sa.Integer(),
+            sa.ForeignKey("reminder_instances.id", ondelete="SET NULL"),
+            nullable=True,
+        ),
+        sa.Column("delta", sa.Integer(), nullable=False),
+        sa.Column("reason", sa.String(length=50), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.current_timestamp(), nullable=True),
+    )
+    op.create_index("ix_inventory_ledger_medicine", "inventory_ledger", ["medicine_id"])
+    # Una instancia descuenta su dosis una sola vez; es el árbitro del ON CONFLICT de consume_doses
+    op.create_index(
+        "ux_inventory_ledger_dose_taken",
+        "inventory_ledger",
+        ["reminder_instance_id"],
+        unique=True,
+        postgresql_where=sa.text("reason = 'dose_taken'"),
+    )
+    # El stock actual de cada medicamento queda como movimiento inicial
+    op.execute(
+        """
+        INSERT INTO inventory_ledger (medicine_id, delta, reason)
+        SELECT id, tablets_left, 'initial'
+        FROM medicines
+        WHERE tablets_left IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ux_inventory_ledger_dose_taken", table_name="inventory_ledger")
+    op.drop_index("ix_inventory_ledger_medicine", table_name="inventory_ledger")
+    op.drop_table("inventory_ledger")
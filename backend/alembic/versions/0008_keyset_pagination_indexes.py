@@ -0,0 +1,35 @@
+"""Índices (scheduled_datetime, id) para la paginación por cursor de los listados
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_reminder_instances_scheduled_id",
+        "reminder_instances",
+        ["scheduled_datetime", "id"],
+    )
+    op.create_index(
+        "ix_appointments_scheduled_id",
+        "appointments",
+        ["scheduled_datetime", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_appointments_scheduled_id", table_name="appointments")
+    op.drop_index("ix_reminder_instances_scheduled_id", table_name="reminder_instances")
@@ -0,0 +1,42 @@
+"""Estado scheduled para las reminder_instances materializadas por adelantado
+
+Las instancias futuras que generó el materializador quedaban pending y el claim de
+llamadas las tomaba antes que el despacho de WhatsApp. Se pasan a scheduled las que aún
+no tienen dueño: futuras, sin claim, sin reintentos y sin notificaciones.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        UPDATE reminder_instances ri
+        SET status = 'scheduled'
+        WHERE ri.status = 'pending'
+          AND ri.scheduled_datetime > now()
+          AND ri.claimed_by IS NULL
+          AND ri.next_attempt_at IS NULL
+          AND COALESCE(ri.retry_count, 0) = 0
+          AND NOT EXISTS (
+              SELECT 1 FROM notification_logs nl WHERE nl.reminder_instance_id = ri.id
+          )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE reminder_instances SET status = 'pending' WHERE status = 'scheduled'")
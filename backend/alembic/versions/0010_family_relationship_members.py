@@ -0,0 +1,60 @@
+"""Columnas elderly_id y family_member_id en family_elderly_relationship
+
+La relación solo tenía id, que hacía de adulto mayor y de familiar a la vez, así que no había
+cómo llegar al teléfono del familiar. Se agregan las dos FKs. elderly_id se completa con el id
+de las relaciones existentes (así las leía get_by_elderly_id); el familiar no se puede deducir
+y queda en NULL hasta que se cargue: esas relaciones no reciben escalamientos.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "family_elderly_relationship",
+        sa.Column(
+            "elderly_id",
+            sa.Integer(),
+            sa.ForeignKey("elderly_profiles.id", ondelete="CASCADE"),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        "family_elderly_relationship",
+        sa.Column(
+            "family_member_id",
+            sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=True,
+        ),
+    )
+    op.execute(
+        """
+        UPDATE family_elderly_relationship fer
+        SET elderly_id = fer.id
+        WHERE EXISTS (SELECT 1 FROM elderly_profiles ep WHERE ep.id = fer.id)
+        """
+    )
+    op.create_index("ix_family_elderly_relationship_elderly", "family_elderly_relationship", ["elderly_id"])
+    op.create_index("ix_family_elderly_relationship_family_member", "family_elderly_relationship", ["family_member_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_family_elderly_relationship_family_member", table_name="family_elderly_relationship")
+    op.drop_index("ix_family_elderly_relationship_elderly", table_name="family_elderly_relationship")
+    op.drop_column("family_elderly_relationship", "family_member_id")
+    op.drop_column("family_elderly_relationship", "elderly_id")
@@ -0,0 +1,35 @@
+"""Elimina ix_reminder_instances_pending_scheduled
+
+Redundante con ix_reminder_instances_pending_due (0004): las consultas de instancias
+pendientes vencidas filtran y ordenan por COALESCE(next_attempt_at, scheduled_datetime), y
+mantener los dos índices solo encarece cada cambio de estado.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index("ix_reminder_instances_pending_scheduled", table_name="reminder_instances")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_reminder_instances_pending_scheduled",
+        "reminder_instances",
+        ["scheduled_datetime"],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
@@ -1,37 +1,64 @@
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from typing import List, Dict
+import asyncio
 import os
 from integrations.twilio import create_call
 from integrations.gemini import generate_content
 from integrations.kapso import send_whatsapp_message
 from integrations.telegram import send_telegram_message
+from integrations.http_clients import init_http_clients, close_http_clients
 from routers import appointments, elderly_profiles, health_workers, users, medicines, notification_logs, reminders, reminder_instances, family_elderly_relationship
 from database import Base, engine
-from services.cron_service import init_scheduler, shutdown_scheduler
+from services.cron_service import init_scheduler, shutdown_scheduler, ReminderSweeper, SHUTDOWN_DRAIN_SECONDS
+from services.reminder_dispatcher import reminder_dispatcher
+from services.schedule_events import ScheduleChangeListener
+from services.webhook_events import webhook_worker
+from services.pagination import NEXT_CURSOR_HEADER
 # from routers import auth
 # from config import settings
 import os
 
 load_dotenv()
 
-app = FastAPI()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://localhost:3001",
-        "http://127.0.0.1:3000",
-        "http://127.0.0.1:3001",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clientes HTTP compartidos (keep-alive) para Gemini, Kapso y Telegram
+    init_http_clients()
+    # Jobs nocturnos (APScheduler)
+    init_scheduler()
+    # Barrido periódico de pendientes en el event loop de la app (respaldo del dispatcher)
+    interval_seconds = int(os.getenv('REMINDER_CRON_INTERVAL_SECONDS', '60'))
+    sweeper = ReminderSweeper(interval_seconds=interval_seconds)
+    sweeper.start()
+    print(f"✅ Scheduler de recordatorios iniciado (intervalo: {interval_seconds} segundos)")
+    # Despacho puntual de las instancias pendientes
+    reminder_dispatcher.start()
+    # Cambios de horario (de cualquier proceso) vía LISTEN/NOTIFY
+    schedule_listener = ScheduleChangeListener(reminder_dispatcher)
+    schedule_listener.start()
+    # Procesamiento por lotes de los webhooks encolados
+    webhook_worker.start()
+
+    yield
+
+    # Se deja de recibir trabajo nuevo y se espera a que termine el que está en curso
+    await schedule_listener.stop()
+    await asyncio.gather(
+        reminder_dispatcher.stop(drain_seconds=SHUTDOWN_DRAIN_SECONDS),
+        sweeper.stop(drain_seconds=SHUTDOWN_DRAIN_SECONDS),
+        webhook_worker.stop(drain_seconds=SHUTDOWN_DRAIN_SECONDS)
+    )
+    shutdown_scheduler()
+    print("✅ Scheduler de recordatorios detenido")
+    await close_http_clients()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -45,21 +72,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El frontend (otro origen) necesita leer el cursor de la página siguiente
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Inicializar el scheduler de cron al arrancar la aplicación
-@app.on_event("startup")
-async def startup_event():
-    # Obtener intervalo del .env o usar 60 segundos por defecto
-    interval_seconds = int(os.getenv('REMINDER_CRON_INTERVAL_SECONDS', '60'))
-    init_scheduler(interval_seconds=interval_seconds)
-    print(f"✅ Scheduler de recordatorios iniciado (intervalo: {interval_seconds} segundos)")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    shutdown_scheduler()
-    print("✅ Scheduler de recordatorios detenido")
-
 # Importar todos los modelos para que estén registrados en Base.metadata
 from models import Appointment, ElderlyProfile, HealthWorker, User, Medicine, NotificationLog, ReminderInstance, Reminder, FamilyElderlyRelationship
 
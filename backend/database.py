@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 import os
@@ -51,4 +53,42 @@ def get_db():
         yield db
     
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _async_database_url(url: str):
+    """
+    Convierte la URL de psycopg2 en una URL de asyncpg.
+    asyncpg no acepta sslmode ni channel_binding en la URL: sslmode se pasa como connect_args["ssl"].
+    """
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+
+    connect_args = {}
+    if sslmode and sslmode not in ("disable", "allow", "prefer"):
+        connect_args["ssl"] = sslmode
+
+    return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL, _async_connect_args = _async_database_url(SQLALCHEMY_DATABASE_URL)
+
+# Engine asíncrono para los handlers que no deben bloquear el event loop
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL,
+                                   pool_pre_ping=True,
+                                   pool_recycle=3600,
+                                   connect_args=_async_connect_args)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Conexión asyncpg dedicada (fuera del pool) para LISTEN/NOTIFY
+ASYNCPG_DSN = ASYNC_SQLALCHEMY_DATABASE_URL.set(drivername="postgresql").render_as_string(hide_password=False)
+ASYNCPG_CONNECT_ARGS = _async_connect_args
@@ -5,12 +5,16 @@ from typing import Optional
 
 class FamilyElderlyRelationshipCreate(BaseModel):
     id: int  # Debe ser el mismo ID que elderly_profile o user (family_member)
+    elderly_id: Optional[int] = None
+    family_member_id: Optional[int] = None
     relationship_type: Optional[str] = None
     is_primary_contact: Optional[bool] = False
     notification_enabled: Optional[bool] = True
 
 
 class FamilyElderlyRelationshipUpdate(BaseModel):
+    elderly_id: Optional[int] = None
+    family_member_id: Optional[int] = None
     relationship_type: Optional[str] = None
     is_primary_contact: Optional[bool] = None
     notification_enabled: Optional[bool] = None
@@ -18,6 +22,8 @@ class FamilyElderlyRelationshipUpdate(BaseModel):
 
 class FamilyElderlyRelationshipResponse(BaseModel):
     id: int
+    elderly_id: Optional[int] = None
+    family_member_id: Optional[int] = None
     relationship_type: Optional[str]
     is_primary_contact: Optional[bool]
     notification_enabled: Optional[bool]
@@ -36,3 +36,11 @@ class MedicineResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+class RefillForecastResponse(BaseModel):
+    id: int
+    name: str
+    tablets_left: int
+    tablets_per_day: float
+    days_until_empty: float
+    estimated_empty_at: Optional[datetime] = None
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Optional
+
+
+class RecipientContext(BaseModel):
+    """Datos de contacto y del medicamento necesarios para enviar un recordatorio"""
+    reminder_id: int
+    reminder_type: Optional[str] = None
+    medicine_id: Optional[int] = None
+    appointment_id: Optional[int] = None
+    elderly_profile_id: Optional[int] = None
+    phone: Optional[str] = None
+    emergency_contact: Optional[str] = None
+    elderly_name: Optional[str] = None
+    medicine_name: Optional[str] = None
+    dosage: Optional[str] = None
+    tablets_per_dose: Optional[int] = None
@@ -46,6 +46,7 @@ class ReminderInstanceResponse(BaseModel):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
     message_id: Optional[str] = None
+    next_attempt_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
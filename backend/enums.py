@@ -2,8 +2,41 @@ from enum import Enum
 
 
 class ReminderInstanceStatus(str, Enum):
+    # Slot materializado por adelantado: nadie lo toma hasta que el despacho de WhatsApp lo adopta
+    SCHEDULED = "scheduled"
     PENDING = "pending"
+    # Notificación encolada en el outbox: el relay la pasa a waiting o failure
+    QUEUED = "queued"
     WAITING = "waiting"
     FAILURE = "failure"
     SUCCESS = "success"
     REJECTED = "rejected"
+    SKIPPED = "skipped"
+
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    # El lease venció durante el envío: no se sabe si el proveedor la recibió, no se reenvía
+    UNCERTAIN = "uncertain"
+
+
+class WebhookEventStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
+
+class InventoryReason(str, Enum):
+    INITIAL = "initial"
+    ADJUSTMENT = "adjustment"
+    DOSE_TAKEN = "dose_taken"
+
+
+class CatchUpPolicy(str, Enum):
+    SKIP_STALE = "skip-stale"
+    SEND_LATEST_ONLY = "send-latest-only"
+    SEND_ALL = "send-all"
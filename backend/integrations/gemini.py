@@ -1,5 +1,5 @@
 import os
-import httpx
+from integrations.http_clients import sync_client
 
 
 def generate_content(text: str, model: str = "gemini-2.5-flash-lite"):
@@ -37,8 +37,7 @@ def generate_content(text: str, model: str = "gemini-2.5-flash-lite"):
         ]
     }
     
-    with httpx.Client() as client:
-        response = client.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        return response.json()
+    response = sync_client("gemini").post(url, headers=headers, json=payload)
+    response.raise_for_status()
+    return response.json()
 
@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# Un pool de conexiones por proveedor: cada uno apunta a un único host,
+# así que los límites del pool son límites por host.
+PROVIDERS = ("gemini", "kapso", "telegram")
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv('HTTP_TIMEOUT_SECONDS', '15'))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', '5'))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', '20'))
+HTTP_MAX_KEEPALIVE_PER_HOST = int(os.getenv('HTTP_MAX_KEEPALIVE_PER_HOST', '10'))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('HTTP_KEEPALIVE_EXPIRY_SECONDS', '60'))
+
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_clients: Dict[str, httpx.Client] = {}
+_sync_lock = threading.Lock()
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def init_http_clients():
+    """
+    Crea los clientes HTTP asíncronos compartidos (uno por proveedor).
+    Debe llamarse desde el event loop de la aplicación al arrancar.
+    """
+    global _async_loop
+    if _async_clients:
+        return
+
+    _async_loop = asyncio.get_running_loop()
+    for provider in PROVIDERS:
+        _async_clients[provider] = httpx.AsyncClient(timeout=_timeout(), limits=_limits())
+
+
+async def close_http_clients():
+    """Cierra todos los clientes HTTP compartidos (síncronos y asíncronos)"""
+    global _async_loop
+    clients = list(_async_clients.values())
+    _async_clients.clear()
+    _async_loop = None
+    for client in clients:
+        await client.aclose()
+
+    with _sync_lock:
+        sync_clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in sync_clients:
+        client.close()
+
+
+@asynccontextmanager
+async def async_client(provider: str):
+    """
+    Entrega el cliente asíncrono compartido del proveedor.
+
+    Los clientes asíncronos quedan ligados al event loop donde se crearon; si se llama
+    desde otro loop (o antes de inicializar el registro) se usa un cliente temporal.
+    """
+    client = _async_clients.get(provider)
+    if client is not None and _async_loop is asyncio.get_running_loop():
+        yield client
+        return
+
+    async with httpx.AsyncClient(timeout=_timeout(), limits=_limits()) as temporary_client:
+        yield temporary_client
+
+
+def sync_client(provider: str) -> httpx.Client:
+    """
+    Entrega el cliente síncrono compartido del proveedor, creándolo la primera vez.
+    httpx.Client es thread-safe, por lo que puede usarse desde los threads de los SDK bloqueantes.
+    """
+    client = _sync_clients.get(provider)
+    if client is not None:
+        return client
+
+    with _sync_lock:
+        client = _sync_clients.get(provider)
+        if client is None:
+            client = httpx.Client(timeout=_timeout(), limits=_limits())
+            _sync_clients[provider] = client
+        return client
@@ -1,6 +1,6 @@
-import httpx
 import os
 from typing import List, Dict
+from integrations.http_clients import async_client
 
 
 async def send_whatsapp_message(
@@ -51,7 +51,7 @@ async def send_whatsapp_message(
         }
     }
     
-    async with httpx.AsyncClient() as client:
+    async with async_client("kapso") as client:
         response = await client.post(url, headers=headers, json=payload)
         response.raise_for_status()
         return response.json()
@@ -1,5 +1,5 @@
-import httpx
 import os
+from integrations.http_clients import async_client
 
 
 async def send_telegram_message(
@@ -35,7 +35,7 @@ async def send_telegram_message(
         }
     }
     
-    async with httpx.AsyncClient() as client:
+    async with async_client("telegram") as client:
         response = await client.post(url, json=payload)
         
         # Manejar errores de manera descriptiva
@@ -55,3 +55,19 @@ async def send_telegram_message(
             )
         
         return response.json()
+
+
+async def answer_callback_query(callback_query_id: str):
+    """
+    Confirma a Telegram que se recibió un callback_query (quita el "cargando" del botón).
+    
+    Args:
+        callback_query_id: ID del callback_query recibido en el webhook
+    """
+    bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
+    
+    async with async_client("telegram") as client:
+        await client.post(
+            f"https://api.telegram.org/bot{bot_token}/answerCallbackQuery",
+            json={"callback_query_id": callback_query_id}
+        )
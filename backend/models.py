@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Numeric, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, ForeignKey, Numeric, Boolean, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from database import Base
-from enums import ReminderInstanceStatus
+from enums import ReminderInstanceStatus, OutboxStatus, WebhookEventStatus
 
 
 class User(Base):
@@ -73,9 +74,33 @@ class ReminderInstance(Base):
     family_notified_at = Column(DateTime, nullable=True)
     notes = Column(Text, nullable=True)
     message_id = Column(String(255), nullable=True)
+    claimed_by = Column(String(255), nullable=True)  # Worker que tomó la instancia para despacharla
+    lease_expires_at = Column(DateTime, nullable=True)  # Al vencer, otro worker puede volver a tomarla
+    next_attempt_at = Column(DateTime, nullable=True)  # Próximo reintento (backoff); None = scheduled_datetime
     created_at = Column(DateTime, server_default=func.current_timestamp(), nullable=True)
     updated_at = Column(DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp(), nullable=True)
 
+    __table_args__ = (
+        # Una sola instancia por slot: los chequeos de duplicados se apoyan en esta restricción
+        UniqueConstraint("reminder_id", "scheduled_datetime", name="uq_reminder_instances_reminder_scheduled"),
+        # Búsqueda por message_id en los webhooks
+        Index("ix_reminder_instances_message_id", "message_id", postgresql_where=text("message_id IS NOT NULL")),
+        # Instancias pendientes por momento de envío (primer intento o reintento): claim y dispatcher
+        Index(
+            "ix_reminder_instances_pending_due",
+            func.coalesce(next_attempt_at, scheduled_datetime),
+            postgresql_where=text("status = 'pending'")
+        ),
+        # Candidatas a reintento (fallidas o sin respuesta)
+        Index(
+            "ix_reminder_instances_retryable",
+            "updated_at",
+            postgresql_where=text("status IN ('failure', 'waiting')")
+        ),
+        # Orden de los listados y paginación por cursor (scheduled_datetime, id)
+        Index("ix_reminder_instances_scheduled_id", "scheduled_datetime", "id"),
+    )
+
 
 class NotificationLog(Base):
     __tablename__ = "notification_logs"
@@ -90,6 +115,83 @@ class NotificationLog(Base):
     response = Column(Text, nullable=True)
     error_message = Column(Text, nullable=True)
 
+    __table_args__ = (
+        # Log más reciente de una instancia (reminder_instance_id ORDER BY sent_at DESC)
+        Index("ix_notification_logs_instance_sent_at", reminder_instance_id, sent_at.desc()),
+    )
+
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    idempotency_key = Column(String(255), nullable=False, unique=True)  # canal:instancia:intento
+    reminder_instance_id = Column(Integer, ForeignKey("reminder_instances.id", ondelete="CASCADE"), nullable=False)
+    notification_log_id = Column(Integer, ForeignKey("notification_logs.id", ondelete="CASCADE"), nullable=False)
+    channel = Column(String(50), nullable=False)  # "whatsapp" o "call"
+    recipient = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)  # Mensaje (y botones / webhook) a enviar
+    status = Column(String(50), default=OutboxStatus.PENDING.value, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    claimed_by = Column(String(255), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.current_timestamp(), nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Entradas por despachar (pending) y en envío (sending, se apartan como uncertain al vencer el lease)
+        Index("ix_notification_outbox_open", "id", postgresql_where=text("status IN ('pending', 'sending')")),
+    )
+
+
+class InventoryLedger(Base):
+    __tablename__ = "inventory_ledger"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id", ondelete="CASCADE"), nullable=False)
+    reminder_instance_id = Column(Integer, ForeignKey("reminder_instances.id", ondelete="SET NULL"), nullable=True)
+    delta = Column(Integer, nullable=False)  # Pastillas agregadas (+) o consumidas (-)
+    reason = Column(String(50), nullable=False)  # "initial", "adjustment" o "dose_taken"
+    created_at = Column(DateTime, server_default=func.current_timestamp(), nullable=True)
+
+    __table_args__ = (
+        # Stock de un medicamento = SUM(delta) de sus movimientos
+        Index("ix_inventory_ledger_medicine", "medicine_id"),
+        # Una instancia descuenta su dosis una sola vez (ON CONFLICT de consume_doses)
+        Index(
+            "ux_inventory_ledger_dose_taken",
+            "reminder_instance_id",
+            unique=True,
+            postgresql_where=text("reason = 'dose_taken'")
+        ),
+    )
+
+
+class WebhookEvent(Base):
+    __tablename__ = "webhook_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    provider = Column(String(50), nullable=False)  # "kapso" o "telegram"
+    event_id = Column(String(255), nullable=True)  # ID del evento según el proveedor
+    payload = Column(JSONB, nullable=False)  # Cuerpo del webhook tal como llegó
+    status = Column(String(50), default=WebhookEventStatus.PENDING.value, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    claimed_by = Column(String(255), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, server_default=func.current_timestamp(), nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Eventos por procesar (pending, o processing con lease vencido) en orden de llegada
+        Index("ix_webhook_events_open", "id", postgresql_where=text("status IN ('pending', 'processing')")),
+        # Deduplicación de reenvíos del proveedor (los eventos sin ID no se deduplican)
+        UniqueConstraint("provider", "event_id", name="uq_webhook_events_provider_event"),
+        # Limpieza por antigüedad de los eventos ya cerrados
+        Index("ix_webhook_events_closed", "received_at", postgresql_where=text("status IN ('processed', 'failed')")),
+    )
+
 
 class Reminder(Base):
     __tablename__ = "reminders"
@@ -111,11 +213,19 @@ class FamilyElderlyRelationship(Base):
     __tablename__ = "family_elderly_relationship"
 
     id = Column(Integer, primary_key=True)  # Puede referenciar a elderly_profiles.id o users.id
+    elderly_id = Column(Integer, ForeignKey("elderly_profiles.id", ondelete="CASCADE"), nullable=True)  # Adulto mayor
+    family_member_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # Familiar (su phone recibe los avisos)
     relationship_type = Column(Text, nullable=True)
     is_primary_contact = Column(Boolean, default=False, nullable=True)
     notification_enabled = Column(Boolean, default=True, nullable=True)
     created_at = Column(DateTime, server_default=func.current_timestamp(), nullable=True)
 
+    __table_args__ = (
+        # Familiares de un adulto mayor (escalamiento)
+        Index("ix_family_elderly_relationship_elderly", "elderly_id"),
+        Index("ix_family_elderly_relationship_family_member", "family_member_id"),
+    )
+
 
 class Appointment(Base):
     __tablename__ = "appointments"
@@ -134,3 +244,8 @@ class Appointment(Base):
     # Foreign keys
     elderly_id = Column(Integer, ForeignKey("elderly_profiles.id", ondelete="CASCADE"), nullable=False)
     health_worker_id = Column(Integer, ForeignKey("health_workers.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        # Orden de los listados y paginación por cursor (scheduled_datetime, id)
+        Index("ix_appointments_scheduled_id", "scheduled_datetime", "id"),
+    )
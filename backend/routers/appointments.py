@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from services.appointments import AppointmentService
+from services.pagination import set_next_cursor
 from dtos.appointments import AppointmentCreate, AppointmentUpdate, AppointmentResponse
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
@@ -10,12 +11,21 @@ router = APIRouter(prefix="/appointments", tags=["appointments"])
 
 @router.get("/", response_model=List[AppointmentResponse])
 async def get_appointments(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todas las citas con paginación"""
-    appointments = AppointmentService.get_all(db, skip=skip, limit=limit)
+    try:
+        appointments = AppointmentService.get_all(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, appointments, limit, "scheduled_datetime", "id")
     return appointments
 
 
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from services.elderly_profiles import ElderlyProfileService
+from services.pagination import set_next_cursor
 from dtos.elderly_profiles import ElderlyProfileCreate, ElderlyProfileUpdate, ElderlyProfileResponse
 
 router = APIRouter(prefix="/elderly-profiles", tags=["elderly-profiles"])
@@ -10,12 +11,21 @@ router = APIRouter(prefix="/elderly-profiles", tags=["elderly-profiles"])
 
 @router.get("/", response_model=List[ElderlyProfileResponse])
 async def get_elderly_profiles(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todos los perfiles de adultos mayores con paginación"""
-    profiles = ElderlyProfileService.get_all(db, skip=skip, limit=limit)
+    try:
+        profiles = ElderlyProfileService.get_all(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, profiles, limit, "id")
     return profiles
 
 
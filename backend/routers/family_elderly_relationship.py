@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from services.family_elderly_relationship import FamilyElderlyRelationshipService
+from services.pagination import set_next_cursor
 from dtos.family_elderly_relationship import FamilyElderlyRelationshipCreate, FamilyElderlyRelationshipUpdate, FamilyElderlyRelationshipResponse
 
 router = APIRouter(prefix="/family-elderly-relationships", tags=["family-elderly-relationships"])
@@ -10,12 +11,21 @@ router = APIRouter(prefix="/family-elderly-relationships", tags=["family-elderly
 
 @router.get("/", response_model=List[FamilyElderlyRelationshipResponse])
 async def get_family_elderly_relationships(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todas las relaciones familia-adulto mayor con paginación"""
-    relationships = FamilyElderlyRelationshipService.get_all(db, skip=skip, limit=limit)
+    try:
+        relationships = FamilyElderlyRelationshipService.get_all(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, relationships, limit, "id")
     return relationships
 
 
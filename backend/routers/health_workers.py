@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from services.health_workers import HealthWorkerService
+from services.pagination import set_next_cursor
 from dtos.health_workers import HealthWorkerCreate, HealthWorkerUpdate, HealthWorkerResponse
 
 router = APIRouter(prefix="/health-workers", tags=["health-workers"])
@@ -10,12 +11,21 @@ router = APIRouter(prefix="/health-workers", tags=["health-workers"])
 
 @router.get("/", response_model=List[HealthWorkerResponse])
 async def get_health_workers(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todos los trabajadores de salud con paginación"""
-    workers = HealthWorkerService.get_all(db, skip=skip, limit=limit)
+    try:
+        workers = HealthWorkerService.get_all(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, workers, limit, "id")
     return workers
 
 
@@ -1,24 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from database import get_db
 from services.medicines import MedicineService
-from dtos.medicines import MedicineCreate, MedicineUpdate, MedicineResponse
+from services.inventory import InventoryService
+from services.refill_forecast import refill_forecaster, REFILL_FORECAST_THRESHOLD_DAYS, REFILL_FORECAST_MAX_DAYS
+from services.pagination import set_next_cursor
+from dtos.medicines import MedicineCreate, MedicineUpdate, MedicineResponse, RefillForecastResponse
 
 router = APIRouter(prefix="/medicines", tags=["medicines"])
 
 
 @router.get("/", response_model=List[MedicineResponse])
 async def get_medicines(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todos los medicamentos con paginación"""
-    medicines = MedicineService.get_all(db, skip=skip, limit=limit)
+    try:
+        medicines = MedicineService.get_all(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, medicines, limit, "id")
     return medicines
 
 
+@router.get("/refill-forecast", response_model=List[RefillForecastResponse])
+async def get_refill_forecast(
+    threshold_days: float = Query(
+        REFILL_FORECAST_THRESHOLD_DAYS, gt=0, le=REFILL_FORECAST_MAX_DAYS, allow_inf_nan=False
+    ),
+    limit: Optional[int] = 100,
+    db: Session = Depends(get_db)
+):
+    """Obtener los medicamentos que se agotan en menos de threshold_days días (los más urgentes primero)"""
+    return refill_forecaster.below(threshold_days=threshold_days, limit=limit, db=db)
+
+
+@router.post("/rebuild-stock")
+async def rebuild_medicine_stock(
+    db: Session = Depends(get_db)
+):
+    """Recalcular tablets_left de todos los medicamentos desde el ledger de inventario"""
+    try:
+        updated = InventoryService.rebuild_stock(db)
+        refill_forecaster.invalidate()
+        return {"status": "success", "updated": updated}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al recalcular el stock: {str(e)}"
+        )
+
+
 @router.get("/{medicine_id}", response_model=MedicineResponse)
 async def get_medicine(
     medicine_id: int,
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, status, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import List, Optional
+from database import get_db, get_async_db
 from services.notification_logs import NotificationLogService
+from services.pagination import set_next_cursor
+from services.exports import ExportService
 from dtos.notification_logs import NotificationLogCreate, NotificationLogUpdate, NotificationLogResponse
 
 router = APIRouter(prefix="/notification-logs", tags=["notification-logs"])
@@ -10,22 +15,54 @@ router = APIRouter(prefix="/notification-logs", tags=["notification-logs"])
 
 @router.get("/", response_model=List[NotificationLogResponse])
 async def get_notification_logs(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todos los logs de notificaciones con paginación"""
-    logs = NotificationLogService.get_all(db, skip=skip, limit=limit)
+    try:
+        logs = await NotificationLogService.get_all_async(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, logs, limit, "id")
     return logs
 
 
+@router.get("/export")
+async def export_notification_logs(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    export_format: str = Query("ndjson", alias="format")
+):
+    """Exportar todos los logs de notificaciones (sent_at en [start, end) y estado opcional) como NDJSON o CSV en streaming"""
+    try:
+        media_type = ExportService.media_type(export_format)
+        stmt = ExportService.notification_logs_select(start, end, status_filter)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return StreamingResponse(
+        ExportService.stream(stmt, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="notification_logs.{export_format}"'}
+    )
+
+
 @router.get("/{log_id}", response_model=NotificationLogResponse)
 async def get_notification_log(
     log_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener un log de notificación por su ID"""
-    log = NotificationLogService.get_by_id(db, log_id)
+    log = await NotificationLogService.get_by_id_async(db, log_id)
     if not log:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -37,20 +74,20 @@ async def get_notification_log(
 @router.get("/reminder-instance/{reminder_instance_id}", response_model=List[NotificationLogResponse])
 async def get_notification_logs_by_reminder_instance(
     reminder_instance_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todos los logs de notificaciones de una instancia de recordatorio"""
-    logs = NotificationLogService.get_by_reminder_instance_id(db, reminder_instance_id)
+    logs = await NotificationLogService.get_by_reminder_instance_id_async(db, reminder_instance_id)
     return logs
 
 
 @router.get("/status/{status}", response_model=List[NotificationLogResponse])
 async def get_notification_logs_by_status(
     status: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todos los logs de notificaciones por estado"""
-    logs = NotificationLogService.get_by_status(db, status)
+    logs = await NotificationLogService.get_by_status_async(db, status)
     return logs
 
 
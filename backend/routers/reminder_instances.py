@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, status, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from typing import List, Optional
-from database import get_db
+from database import get_db, get_async_db
 from services.reminder_instances import ReminderInstanceService
+from services.pagination import set_next_cursor
+from services.exports import ExportService
 from dtos.reminder_instances import ReminderInstanceCreate, ReminderInstanceUpdate, ReminderInstanceResponse, ReminderInstanceWithMedicineResponse
 
 router = APIRouter(prefix="/reminder-instances", tags=["reminder-instances"])
@@ -10,32 +15,73 @@ router = APIRouter(prefix="/reminder-instances", tags=["reminder-instances"])
 
 @router.get("/", response_model=List[ReminderInstanceResponse])
 async def get_reminder_instances(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todas las instancias de recordatorios con paginación"""
-    instances = ReminderInstanceService.get_all(db, skip=skip, limit=limit)
+    try:
+        instances = await ReminderInstanceService.get_all_async(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, instances, limit, "scheduled_datetime", "id")
     return instances
 
 
 @router.get("/with-medicine", response_model=List[ReminderInstanceWithMedicineResponse])
 async def get_reminder_instances_with_medicine(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todas las instancias con datos de reminder y medicina (optimizado con join)"""
-    instances = ReminderInstanceService.get_all_with_medicine(db, skip=skip, limit=limit)
+    try:
+        instances = await ReminderInstanceService.get_all_with_medicine_async(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, instances, limit, "scheduled_datetime", "id")
     return instances
 
 
+@router.get("/export")
+async def export_reminder_instances(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    export_format: str = Query("ndjson", alias="format")
+):
+    """Exportar todas las instancias de recordatorios (scheduled_datetime en [start, end) y estado opcional) como NDJSON o CSV en streaming"""
+    try:
+        media_type = ExportService.media_type(export_format)
+        stmt = ExportService.reminder_instances_select(start, end, status_filter)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return StreamingResponse(
+        ExportService.stream(stmt, export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="reminder_instances.{export_format}"'}
+    )
+
+
 @router.get("/today/with-medicine", response_model=List[ReminderInstanceWithMedicineResponse])
 async def get_today_reminder_instances_with_medicine(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener instancias de hoy con datos de reminder y medicina (optimizado con join)"""
-    instances = ReminderInstanceService.get_today_with_medicine(db)
+    instances = await ReminderInstanceService.get_today_with_medicine_async(db)
     return instances
 
 
@@ -43,7 +89,7 @@ async def get_today_reminder_instances_with_medicine(
 async def get_month_reminder_instances_with_medicine(
     year: int,
     month: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener instancias de un mes específico con datos de reminder y medicina (optimizado con join)"""
     if month < 1 or month > 12:
@@ -51,26 +97,26 @@ async def get_month_reminder_instances_with_medicine(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El mes debe estar entre 1 y 12"
         )
-    instances = ReminderInstanceService.get_by_month_with_medicine(db, year, month)
+    instances = await ReminderInstanceService.get_by_month_with_medicine_async(db, year, month)
     return instances
 
 
 @router.get("/pending/all", response_model=List[ReminderInstanceResponse])
 async def get_pending_reminder_instances(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todas las instancias pendientes"""
-    instances = ReminderInstanceService.get_pending(db)
+    instances = await ReminderInstanceService.get_pending_async(db)
     return instances
 
 
 @router.get("/reminder/{reminder_id}", response_model=List[ReminderInstanceResponse])
 async def get_reminder_instances_by_reminder(
     reminder_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todas las instancias de un recordatorio"""
-    instances = ReminderInstanceService.get_by_reminder_id(db, reminder_id)
+    instances = await ReminderInstanceService.get_by_reminder_id_async(db, reminder_id)
     return instances
 
 
@@ -78,30 +124,30 @@ async def get_reminder_instances_by_reminder(
 async def get_reminder_instances_by_reminder_with_medicine(
     reminder_id: int,
     limit: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener instancias de un recordatorio con datos de medicina (optimizado con join)"""
-    instances = ReminderInstanceService.get_by_reminder_id_with_medicine(db, reminder_id, limit=limit)
+    instances = await ReminderInstanceService.get_by_reminder_id_with_medicine_async(db, reminder_id, limit=limit)
     return instances
 
 
 @router.get("/status/{status}", response_model=List[ReminderInstanceResponse])
 async def get_reminder_instances_by_status(
     status: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener todas las instancias por estado"""
-    instances = ReminderInstanceService.get_by_status(db, status)
+    instances = await ReminderInstanceService.get_by_status_async(db, status)
     return instances
 
 
 @router.get("/{instance_id}", response_model=ReminderInstanceResponse)
 async def get_reminder_instance(
     instance_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener una instancia de recordatorio por su ID"""
-    instance = ReminderInstanceService.get_by_id(db, instance_id)
+    instance = await ReminderInstanceService.get_by_id_async(db, instance_id)
     if not instance:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,20 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from datetime import datetime
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional
+from database import get_db, get_async_db
 from services.reminders import ReminderService
 from services.reminder_scheduler import ReminderSchedulerService
-from services.reminder_instances import ReminderInstanceService
-from services.notification_logs import NotificationLogService
+from services.webhook_events import WebhookEventService, webhook_worker, KAPSO_PROVIDER, TELEGRAM_PROVIDER
+from services.pagination import set_next_cursor
 from dtos.reminders import ReminderCreate, ReminderUpdate, ReminderResponse, ReminderWithMedicineResponse
-from dtos.reminder_instances import ReminderInstanceUpdate
-from dtos.notification_logs import NotificationLogUpdate
-from enums import ReminderInstanceStatus
 import logging
-import httpx
-import os
-from models import ReminderInstance, Reminder, Medicine
 
 logger = logging.getLogger(__name__)
 
@@ -23,23 +17,41 @@ router = APIRouter(prefix="/reminders", tags=["reminders"])
 
 @router.get("/", response_model=List[ReminderResponse])
 async def get_reminders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todos los recordatorios con paginación"""
-    reminders = ReminderService.get_all(db, skip=skip, limit=limit)
+    try:
+        reminders = ReminderService.get_all(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, reminders, limit, "id")
     return reminders
 
 
 @router.get("/with-medicine", response_model=List[ReminderWithMedicineResponse])
 async def get_reminders_with_medicine(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Obtener todos los recordatorios con datos de medicina (optimizado con join)"""
-    reminders = ReminderService.get_all_with_medicine(db, skip=skip, limit=limit)
+    try:
+        reminders = ReminderService.get_all_with_medicine(db, skip=skip, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, reminders, limit, "id")
     return reminders
 
 
@@ -191,6 +203,7 @@ async def check_reminders(
             "processed": results["processed"],
             "successful": results["successful"],
             "failed": results["failed"],
+            "queued": results["queued"],
             "errors": results["errors"]
         }
     except Exception as e:
@@ -204,11 +217,12 @@ async def check_reminders(
 @router.post("/webhook")
 async def whatsapp_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Webhook para recibir respuestas de WhatsApp desde Kapso.
-    Actualiza el reminder_instance y notification_log con la respuesta del usuario.
+    Guarda el evento y responde de inmediato; el reminder_instance, el notification_log y la
+    medicina los actualiza en segundo plano el worker de webhooks (por lotes).
     
     Payload esperado de Kapso:
     {
@@ -229,143 +243,42 @@ async def whatsapp_webhook(
     """
     try:
         body = await request.json()
-        logger.info(f"Webhook recibido: {body}")
-        
-        # Extraer información del payload de Kapso
-        phone_number = None
-        user_response = None
-        button_id = None
-        button_title = None
-        
-        # Obtener número de teléfono del remitente
-        if "message" in body and "from" in body["message"]:
-            phone_number = body["message"]["from"]
-        elif "conversation" in body and "phone_number" in body["conversation"]:
-            phone_number = body["conversation"]["phone_number"]
-        
-        # Obtener respuesta del botón si es un mensaje interactivo
-        if "message" in body and "interactive" in body["message"]:
-            interactive = body["message"]["interactive"]
-            if interactive.get("type") == "button_reply" and "button_reply" in interactive:
-                button_reply = interactive["button_reply"]
-                button_id = button_reply.get("id")
-                button_title = button_reply.get("title")
-                user_response = f"{button_id}: {button_title}" if button_id and button_title else button_id or button_title
-        
-        if not phone_number:
-            logger.warning(f"No se pudo obtener phone_number del webhook: {body}")
-            return {
-                "status": "error",
-                "message": "No se pudo obtener el número de teléfono del webhook"
-            }
-        
-        # Buscar reminder_instance por message_id del mensaje original
-        message_id = body.get("message", {}).get("context", {}).get("id", None)
-        
-        if not message_id:
-            logger.warning("No se pudo obtener message_id del webhook")
-            return {
-                "status": "error",
-                "message": "No se pudo obtener message_id del mensaje"
-            }
-        
-        reminder_instance = db.query(ReminderInstance).filter(
-            ReminderInstance.message_id == message_id
-        ).first()
-        
-        if not reminder_instance:
-            logger.warning(f"No se encontró reminder_instance para message_id {message_id}")
-            return {
-                "status": "error",
-                "message": f"No se encontró reminder_instance para el message_id {message_id}"
-            }
-        
-        reminder_instance_id = reminder_instance.id
-        
-        # Determinar el estado según la respuesta del botón
-        # "taken" o "btn_yes" o "Si" = respuesta positiva
-        # "skip" o "btn_no" o "No" = respuesta negativa
-        is_positive_response = (
-            button_id in ["taken", "btn_yes"] or 
-            button_title and button_title.lower() in ["sí", "si", "yes", "ya lo tomé"]
-        )
-        print('is_positive_response', is_positive_response)
-        
-        # Status del notification_log: "sent" si fue sí, "rejected" si fue no
-        log_status = "sent" if is_positive_response else "rejected"
-        print('log_status', log_status)
-        
-        # Status del reminder_instance
-        instance_status = ReminderInstanceStatus.SUCCESS.value if is_positive_response else ReminderInstanceStatus.REJECTED.value
-        print('instance_status', instance_status)
-
-        # Crear nuevo notification_log con la respuesta
-        from models import NotificationLog
-        notification_log = NotificationLog(
-            reminder_instance_id=reminder_instance_id,
-            notification_type="whatsapp",
-            recepient_phone=phone_number,
-            status=log_status,
-            sent_at=datetime.now(),
-            delivered_at=datetime.now(),
-            response=user_response or f"Respuesta recibida: {button_id or button_title}"
-        )
-        db.add(notification_log)
-        db.flush()
-        db.refresh(notification_log)
-        
-        # Actualizar reminder_instance status directamente (sin usar el servicio para evitar commit prematuro)
-        reminder_instance.status = instance_status
-        if is_positive_response:
-            reminder_instance.taken_at = datetime.now()
-        db.flush()
-        
-        # Si la respuesta fue positiva, restar 1 al total de tablets_left de la medicina
-        if is_positive_response:
-            # Obtener el reminder del reminder_instance
-            reminder = db.query(Reminder).filter(Reminder.id == reminder_instance.reminder_id).first()
-            
-            if reminder and reminder.medicine:
-                medicine = db.query(Medicine).filter(Medicine.id == reminder.medicine).first()
-                
-                if medicine and medicine.tablets_left is not None and medicine.tablets_left > 0:
-                    # Restar 1 al total de tablets_left
-                    medicine.tablets_left = medicine.tablets_left - 1
-                    print(f"Medicina {medicine.id} ({medicine.name}): tablets_left actualizado de {medicine.tablets_left + 1} a {medicine.tablets_left}")
-                elif medicine:
-                    print(f"Medicina {medicine.id} ({medicine.name}): tablets_left es {medicine.tablets_left}, no se puede restar")
-            elif reminder:
-                print(f"Reminder {reminder.id} no tiene medicine asociada")
-            else:
-                print(f"No se encontró reminder con id {reminder_instance.reminder_id}")
-        
-        # Hacer un solo commit al final para guardar todos los cambios (notification_log, reminder_instance, medicine)
-        db.commit()
-        
-        logger.info(f"NotificationLog {notification_log.id} creado con status {log_status}. Reminder instance {reminder_instance_id} actualizado a {instance_status}. Respuesta: {user_response}")
-        
-        return {
-            "status": "success",
-            "reminder_instance_id": reminder_instance_id,
-            "phone_number": phone_number,
-            "user_response": user_response,
-            "message": "Webhook procesado correctamente"
-        }
-        
     except Exception as e:
-        logger.error(f"Error procesando webhook: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.error(f"Webhook con cuerpo inválido: {str(e)}")
         return {
             "status": "error",
             "message": str(e)
         }
+    
+    logger.info(f"Webhook recibido: {body}")
+    try:
+        event_id = await WebhookEventService.append_async(
+            db, KAPSO_PROVIDER, body, event_id=WebhookEventService.kapso_event_id(body)
+        )
+    except Exception as e:
+        # Sin guardar el evento se responde con error para que Kapso lo reintente
+        logger.error(f"Error guardando webhook: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al guardar el webhook: {str(e)}"
+        )
+    if event_id is None:
+        logger.info("Webhook duplicado, ignorando")
+        return {"status": "ok", "message": "Webhook duplicado"}
+    webhook_worker.notify()
+    
+    return {
+        "status": "success",
+        "webhook_event_id": event_id,
+        "message": "Webhook recibido"
+    }
 
 @router.post("/webhook/telegram")
-async def telegram_webhook(request: Request, db: Session = Depends(get_db)):
+async def telegram_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Webhook para recibir respuestas de Telegram.
-    Actualiza el reminder_instance y notification_log con la respuesta del usuario.
+    Guarda el evento y responde de inmediato; el worker de webhooks confirma el callback_query
+    y actualiza el reminder_instance y el notification_log en segundo plano (por lotes).
     
     Payload esperado de Telegram:
     {
@@ -380,120 +293,37 @@ async def telegram_webhook(request: Request, db: Session = Depends(get_db)):
     """
     try:
         body = await request.json()
-        logger.info(f"Webhook de Telegram recibido: {body}")
-        
-        bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        
-        if "callback_query" not in body:
-            logger.info("No hay callback_query en el webhook, ignorando")
-            return {"status": "ok", "message": "No es un callback_query"}
-        
-        callback_query = body["callback_query"]
-        callback_id = callback_query["id"]
-        chat_id = str(callback_query["from"]["id"])  # Convertir a string para comparar
-        callback_data = callback_query.get("data")
-        
-        # Extraer message_id del mensaje original
-        message_id = None
-        if "message" in callback_query and "message_id" in callback_query["message"]:
-            message_id = str(callback_query["message"]["message_id"])
-        
-        logger.info(f"Callback recibido - chat_id: {chat_id}, message_id: {message_id}, data: {callback_data}")
-        
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"https://api.telegram.org/bot{bot_token}/answerCallbackQuery",
-                json={"callback_query_id": callback_id}
-            )
-        
-        if not callback_data:
-            logger.warning("No hay callback_data en el callback_query")
-            return {
-                "status": "error",
-                "message": "No se pudo obtener callback_data"
-            }
-        
-        if not message_id:
-            logger.warning("No hay message_id en el callback_query")
-            return {
-                "status": "error",
-                "message": "No se pudo obtener message_id del mensaje"
-            }
-        
-        # Buscar reminder_instance por message_id
-        from models import ReminderInstance
-        reminder_instance = db.query(ReminderInstance).filter(
-            ReminderInstance.message_id == message_id
-        ).first()
-        
-        if not reminder_instance:
-            logger.warning(f"No se encontró reminder_instance para message_id {message_id}")
-            return {
-                "status": "error",
-                "message": f"No se encontró reminder_instance para el message_id {message_id}"
-            }
-        
-        reminder_instance_id = reminder_instance.id
-        
-        # Determinar el estado según el callback_data
-        if callback_data == "taken":
-            instance_status = ReminderInstanceStatus.SUCCESS.value
-            user_response = "taken: Ya lo tomé"
-        elif callback_data == "skip":
-            instance_status = ReminderInstanceStatus.REJECTED.value  # Usar REJECTED para "skip"
-            user_response = "skip: Omitir"
-        elif callback_data == "confirm":
-            instance_status = ReminderInstanceStatus.SUCCESS.value
-            user_response = "confirm: Confirmado"
-        elif callback_data == "cancel":
-            instance_status = ReminderInstanceStatus.REJECTED.value
-            user_response = "cancel: Cancelado"
-        else:
-            # Para otros casos
-            instance_status = ReminderInstanceStatus.SUCCESS.value
-            user_response = f"{callback_data}: Respuesta recibida"
-        
-        # Buscar notification_log asociado al reminder_instance
-        from models import NotificationLog
-        notification_log = db.query(NotificationLog).filter(
-            NotificationLog.reminder_instance_id == reminder_instance_id,
-            NotificationLog.notification_type == "telegram"
-        ).first()
-        
-        # Actualizar notification_log con la respuesta si existe
-        if notification_log:
-            log_update = NotificationLogUpdate(
-                response=user_response,
-                delivered_at=datetime.now(),
-                status="delivered"
-            )
-            NotificationLogService.update(db, notification_log.id, log_update)
-            logger.info(f"NotificationLog {notification_log.id} actualizado con respuesta: {user_response}")
-        else:
-            logger.warning(f"No se encontró notification_log para reminder_instance_id {reminder_instance_id}")
-        
-        # Actualizar reminder_instance status
-        instance_update = ReminderInstanceUpdate(
-            status=instance_status,
-            taken_at=datetime.now() if callback_data == "taken" else None
-        )
-        ReminderInstanceService.update(db, reminder_instance_id, instance_update)
-        logger.info(f"Reminder instance {reminder_instance_id} actualizado a {instance_status}. Respuesta: {user_response}")
-        
-        return {
-            "status": "success",
-            "reminder_instance_id": reminder_instance_id,
-            "chat_id": chat_id,
-            "user_response": user_response,
-            "callback_data": callback_data,
-            "message": "Webhook procesado correctamente"
-        }
-        
     except Exception as e:
-        logger.error(f"Error procesando webhook de Telegram: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.error(f"Webhook de Telegram con cuerpo inválido: {str(e)}")
         return {
             "status": "error",
             "message": str(e)
-        }
\ No newline at end of file
+        }
+    
+    logger.info(f"Webhook de Telegram recibido: {body}")
+    
+    if "callback_query" not in body:
+        logger.info("No hay callback_query en el webhook, ignorando")
+        return {"status": "ok", "message": "No es un callback_query"}
+    
+    try:
+        event_id = await WebhookEventService.append_async(
+            db, TELEGRAM_PROVIDER, body, event_id=WebhookEventService.telegram_event_id(body)
+        )
+    except Exception as e:
+        # Sin guardar el evento se responde con error para que Telegram lo reintente
+        logger.error(f"Error guardando webhook de Telegram: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al guardar el webhook: {str(e)}"
+        )
+    if event_id is None:
+        logger.info("Webhook duplicado, ignorando")
+        return {"status": "ok", "message": "Webhook duplicado"}
+    webhook_worker.notify()
+    
+    return {
+        "status": "success",
+        "webhook_event_id": event_id,
+        "message": "Webhook recibido"
+    }
@@ -0,0 +1,119 @@
+"""
+Utilidades compartidas por los scripts de benchmark (scripts/bench_*.py).
+
+Los benchmarks siembran sus propios datos en la base de POSTGRES_URL; úsese una base de
+desarrollo o staging. Salvo que el script diga lo contrario, todo corre en una transacción
+que se deshace al final (scratch_session), así que no queda nada sembrado. Los que necesitan
+commits reales borran al final sus reminders (delete_reminders), y con ellos en cascada sus
+instancias y logs.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator, List, Tuple
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, event, text, Integer  # noqa: E402
+from sqlalchemy.dialects.postgresql import ARRAY  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+
+_SEED_REMINDERS_SQL = text("""
+INSERT INTO reminders (reminder_type, periodicity, start_date, is_active)
+SELECT 'medicine', :periodicity, :start_date, :is_active
+FROM generate_series(1, :count)
+RETURNING id
+""")
+
+# per_instance instancias por reminder, en la grilla start_date + k * periodicity
+_SEED_INSTANCES_SQL = text("""
+INSERT INTO reminder_instances (reminder_id, scheduled_datetime, status)
+SELECT r.id, r.start_date + (g.k * r.periodicity) * interval '1 minute', :status
+FROM reminders r
+CROSS JOIN generate_series(0, :per_reminder - 1) AS g(k)
+WHERE r.id = ANY(:reminder_ids)
+RETURNING id
+""").bindparams(bindparam("reminder_ids", type_=ARRAY(Integer)))
+
+# per_instance logs por instancia, con sent_at hacia atrás desde ahora
+_SEED_LOGS_SQL = text("""
+INSERT INTO notification_logs (reminder_instance_id, notification_type, recepient_phone, status, sent_at)
+SELECT i.id, 'whatsapp', '56900000000', :status, now() - g.k * interval '1 minute'
+FROM unnest(:instance_ids) AS i(id)
+CROSS JOIN generate_series(1, :per_instance) AS g(k)
+""").bindparams(bindparam("instance_ids", type_=ARRAY(Integer)))
+
+_DELETE_REMINDERS_SQL = text("DELETE FROM reminders WHERE id = ANY(:reminder_ids)").bindparams(
+    bindparam("reminder_ids", type_=ARRAY(Integer))
+)
+
+
+@contextmanager
+def scratch_session() -> Iterator[Session]:
+    """Sesión cuyo trabajo (incluidos los datos sembrados) se deshace al salir"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
+
+
+@contextmanager
+def count_statements() -> Iterator[List[int]]:
+    """Cuenta las sentencias enviadas a Postgres dentro del bloque (round trips)"""
+    counter = [0]
+
+    def _count(*_):
+        counter[0] += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+
+def timed(func: Callable[[], object], repeat: int = 3) -> Tuple[float, object]:
+    """Mediana de repeat ejecuciones (en segundos) y el resultado de la última"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def seed_reminders(
+    db: Session, count: int, start_date: datetime, periodicity: int = 60, is_active: bool = True
+) -> List[int]:
+    """Inserta count reminders de medicamento (sin medicine) y retorna sus ids, sin commit"""
+    return db.execute(_SEED_REMINDERS_SQL, {
+        "count": count, "periodicity": periodicity, "start_date": start_date, "is_active": is_active
+    }).scalars().all()
+
+
+def seed_instances(db: Session, reminder_ids: List[int], per_reminder: int, status: str) -> List[int]:
+    """Inserta per_reminder instancias por reminder en su grilla y retorna sus ids, sin commit"""
+    return db.execute(_SEED_INSTANCES_SQL, {
+        "reminder_ids": list(reminder_ids), "per_reminder": per_reminder, "status": status
+    }).scalars().all()
+
+
+def seed_logs(db: Session, instance_ids: List[int], per_instance: int, status: str = "sent") -> int:
+    """Inserta per_instance notification_logs por instancia y retorna cuántos, sin commit"""
+    return db.execute(_SEED_LOGS_SQL, {
+        "instance_ids": list(instance_ids), "per_instance": per_instance, "status": status
+    }).rowcount
+
+
+def delete_reminders(db: Session, reminder_ids: List[int]):
+    """Borra (con commit) reminders sembrados; sus instancias y logs se van en cascada"""
+    db.rollback()
+    db.execute(_DELETE_REMINDERS_SQL, {"reminder_ids": list(reminder_ids)})
+    db.commit()
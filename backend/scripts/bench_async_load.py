@@ -0,0 +1,120 @@
+"""
+Prueba de carga de la API: latencia (p50/p95/p99) de los webhooks mientras corre tráfico
+concurrente del dashboard, para comparar los handlers síncronos con los de AsyncSession.
+
+Uso (con la API corriendo, p.ej. uvicorn app:app):
+
+    python scripts/bench_async_load.py --url http://localhost:8000 \\
+        [--baseline-url http://localhost:8001] [--duration 30] \\
+        [--webhooks 20] [--dashboards 10]
+
+--baseline-url apunta a otra instancia de la API (p.ej. levantada desde el commit anterior
+al engine async) y se mide con la misma carga, una después de la otra. Los webhooks
+enviados son respuestas de Kapso a botones de mensajes que no existen: el worker los guarda
+y los descarta, pero quedan en webhook_events. Úsese contra una base de desarrollo.
+"""
+from datetime import datetime
+from typing import Dict, List
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def _webhook_body() -> Dict:
+    message_id = f"wamid.bench-{uuid.uuid4().hex}"
+    return {
+        "message": {
+            "id": message_id,
+            "from": "56900000000",
+            "context": {"id": f"wamid.bench-context-{uuid.uuid4().hex}"},
+            "interactive": {
+                "type": "button_reply",
+                "button_reply": {"id": "btn_yes", "title": "Si"}
+            }
+        },
+        "conversation": {"phone_number": "56900000000"}
+    }
+
+
+async def _webhook_worker(client: httpx.AsyncClient, deadline: float, latencies: List[float], errors: List[int]):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.post("/reminders/webhook", json=_webhook_body())
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append(time.perf_counter() - started)
+
+
+async def _dashboard_worker(client: httpx.AsyncClient, deadline: float, latencies: List[float], errors: List[int]):
+    today = datetime.now()
+    paths = [
+        f"/reminder-instances/month/{today.year}/{today.month}/with-medicine",
+        "/reminder-instances/today/with-medicine",
+        "/notification-logs/?limit=100",
+    ]
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+        latencies.append(time.perf_counter() - started)
+
+
+def _summary(name: str, latencies: List[float], errors: List[int], duration: float) -> str:
+    if len(latencies) < 2:
+        return f"  {name:<10} sin suficientes respuestas ({len(latencies)})"
+    cuts = statistics.quantiles(latencies, n=100)
+    return (
+        f"  {name:<10} {len(latencies):>7} req {len(latencies) / duration:>8.1f} req/s "
+        f"p50 {cuts[49] * 1000:>8.1f} ms  p95 {cuts[94] * 1000:>8.1f} ms  "
+        f"p99 {cuts[98] * 1000:>8.1f} ms  errores {len(errors)}"
+    )
+
+
+async def run_load(url: str, duration: float, webhooks: int, dashboards: int):
+    limits = httpx.Limits(max_connections=webhooks + dashboards)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        webhook_latencies: List[float] = []
+        webhook_errors: List[int] = []
+        dashboard_latencies: List[float] = []
+        dashboard_errors: List[int] = []
+
+        deadline = time.monotonic() + duration
+        await asyncio.gather(
+            *(_webhook_worker(client, deadline, webhook_latencies, webhook_errors) for _ in range(webhooks)),
+            *(_dashboard_worker(client, deadline, dashboard_latencies, dashboard_errors) for _ in range(dashboards)),
+        )
+
+    print(f"{url} ({webhooks} webhooks y {dashboards} dashboards concurrentes, {duration:.0f} s)")
+    print(_summary("webhooks", webhook_latencies, webhook_errors, duration))
+    print(_summary("dashboard", dashboard_latencies, dashboard_errors, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="API a medir")
+    parser.add_argument("--baseline-url", help="API de referencia, medida con la misma carga antes que --url")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga por API")
+    parser.add_argument("--webhooks", type=int, default=20, help="Clientes de webhooks concurrentes")
+    parser.add_argument("--dashboards", type=int, default=10, help="Clientes del dashboard concurrentes")
+    args = parser.parse_args()
+
+    for url in filter(None, [args.baseline_url, args.url]):
+        asyncio.run(run_load(url, args.duration, args.webhooks, args.dashboards))
+
+
+if __name__ == "__main__":
+    main()
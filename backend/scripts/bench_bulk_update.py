@@ -0,0 +1,98 @@
+"""
+Benchmark de los cambios de estado de reminder_instances y notification_logs: update por
+fila (SELECT + setattr + commit + refresh, dos veces por notificación) contra bulk_update
+(un UPDATE ... FROM (VALUES ...) por tabla y un commit por lote).
+
+Uso (desde backend/, con POSTGRES_URL de una base de desarrollo y las migraciones aplicadas):
+
+    python scripts/bench_bulk_update.py [--count 10000] [--batch-size 100]
+
+Cada transición pasa una instancia y su log a otro estado final. Los commits son reales, así
+que siembra reminders inactivos con instancias skipped (ningún worker las toma) y los borra al
+terminar, con sus instancias y logs.
+"""
+from datetime import datetime, timedelta
+from typing import List, Tuple
+import argparse
+
+from _bench import delete_reminders, seed_instances, seed_logs, seed_reminders, timed
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import NotificationLog
+from enums import ReminderInstanceStatus
+from services.reminder_instances import ReminderInstanceService
+from services.notification_logs import NotificationLogService
+from dtos.reminder_instances import ReminderInstanceUpdate
+from dtos.notification_logs import NotificationLogUpdate
+
+
+def per_row(db: Session, pairs: List[Tuple[int, int]], status: str) -> int:
+    """Versión anterior: update por fila de la instancia y de su log (un commit cada uno)"""
+    commits = 0
+    for instance_id, log_id in pairs:
+        ReminderInstanceService.update(db, instance_id, ReminderInstanceUpdate(status=status))
+        NotificationLogService.update(db, log_id, NotificationLogUpdate(status=status))
+        commits += 2
+    return commits
+
+
+def bulk(db: Session, pairs: List[Tuple[int, int]], status: str, batch_size: int) -> int:
+    """bulk_update de instancias y logs, un commit por lote (como el relay del outbox)"""
+    commits = 0
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start:start + batch_size]
+        ReminderInstanceService.bulk_update(
+            db, [(instance_id, ReminderInstanceUpdate(status=status)) for instance_id, _ in batch], commit=False
+        )
+        NotificationLogService.bulk_update(
+            db, [(log_id, NotificationLogUpdate(status=status)) for _, log_id in batch], commit=False
+        )
+        db.commit()
+        commits += 1
+    return commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="Transiciones de estado a aplicar")
+    parser.add_argument("--batch-size", type=int, default=100, help="Transiciones por commit en bulk_update")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    reminder_ids = []
+    try:
+        reminder_ids = seed_reminders(db, args.count, datetime.now() - timedelta(days=1), is_active=False)
+        instance_ids = seed_instances(db, reminder_ids, 1, ReminderInstanceStatus.SKIPPED.value)
+        seed_logs(db, instance_ids, 1)
+        pairs = sorted(db.execute(
+            select(NotificationLog.reminder_instance_id, NotificationLog.id)
+            .where(NotificationLog.reminder_instance_id.in_(instance_ids))
+        ).all())
+        db.commit()
+
+        per_row_seconds, per_row_commits = timed(
+            lambda: per_row(db, pairs, ReminderInstanceStatus.SUCCESS.value), repeat=1
+        )
+        bulk_seconds, bulk_commits = timed(
+            lambda: bulk(db, pairs, ReminderInstanceStatus.REJECTED.value, args.batch_size), repeat=1
+        )
+
+        print(f"{len(pairs)} transiciones (instancia + log)")
+        for name, seconds, commits in (
+            ("update por fila", per_row_seconds, per_row_commits),
+            (f"bulk_update x{args.batch_size}", bulk_seconds, bulk_commits),
+        ):
+            print(
+                f"  {name:<18} {seconds:>8.2f} s {len(pairs) / seconds:>10.0f} transiciones/s "
+                f"{commits:>7} commits {commits / seconds:>8.0f} commits/s"
+            )
+        print(f"  mejora: {per_row_seconds / bulk_seconds:.1f}x")
+    finally:
+        if reminder_ids:
+            delete_reminders(db, reminder_ids)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Microbenchmark de los clientes HTTP de las integraciones: el cliente compartido por proveedor
+(integrations.http_clients, con keep-alive) contra un cliente nuevo por llamada, como se hacía
+antes, contra un servidor local de prueba.
+
+Uso (desde backend/; no necesita base de datos ni credenciales):
+
+    python scripts/bench_http_clients.py [--requests 2000] [--concurrency 10] [--handshake-ms 30]
+
+El servidor responde un JSON fijo por HTTP/1.1 con keep-alive y cuenta las conexiones que
+abre cada modo. En local abrir una conexión casi no cuesta; --handshake-ms agrega esa demora a
+cada conexión nueva para simular el TCP + TLS contra un proveedor real (Kapso, Telegram, Gemini).
+Los clientes asíncronos se miden con --concurrency tareas en el event loop y los síncronos con
+--concurrency threads (como las llamadas bloqueantes del SDK de Gemini).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from integrations import http_clients  # noqa: E402
+
+_RESPONSE_BODY = b'{"ok": true}'
+_RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: " + str(len(_RESPONSE_BODY)).encode() + b"\r\n"
+    b"Connection: keep-alive\r\n\r\n" + _RESPONSE_BODY
+)
+
+
+class StubServer:
+    """Servidor HTTP/1.1 mínimo con keep-alive, en su propio thread y event loop"""
+
+    def __init__(self, handshake_seconds: float):
+        self.handshake_seconds = handshake_seconds
+        self.connections = 0
+        self.port: int = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        server.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.handshake_seconds)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                writer.write(_RESPONSE)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _summary(name: str, latencies: List[float], seconds: float, connections: int) -> str:
+    cuts = statistics.quantiles(latencies, n=100)
+    return (
+        f"  {name:<22} {len(latencies) / seconds:>8.0f} req/s  p50 {cuts[49] * 1000:>7.2f} ms  "
+        f"p95 {cuts[94] * 1000:>7.2f} ms  {connections:>5} conexiones"
+    )
+
+
+async def _run_async(url: str, requests: int, concurrency: int, shared: bool) -> List[float]:
+    latencies: List[float] = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            if shared:
+                async with http_clients.async_client("kapso") as client:
+                    response = await client.post(url, json={"text": "hola"})
+            else:
+                async with httpx.AsyncClient(timeout=http_clients._timeout()) as client:
+                    response = await client.post(url, json={"text": "hola"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    if shared:
+        http_clients.init_http_clients()
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        if shared:
+            await http_clients.close_http_clients()
+    return latencies
+
+
+def _run_sync(url: str, requests: int, concurrency: int, shared: bool) -> List[float]:
+    def call() -> float:
+        started = time.perf_counter()
+        if shared:
+            response = http_clients.sync_client("gemini").post(url, json={"text": "hola"})
+        else:
+            with httpx.Client(timeout=http_clients._timeout()) as client:
+                response = client.post(url, json={"text": "hola"})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: call(), range(requests)))
+    if shared:
+        asyncio.run(http_clients.close_http_clients())
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests por modo")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests en curso simultáneamente")
+    parser.add_argument("--handshake-ms", type=float, default=30, help="Demora simulada por conexión nueva")
+    args = parser.parse_args()
+
+    server = StubServer(args.handshake_ms / 1000)
+    server.start()
+    url = f"http://127.0.0.1:{server.port}/messages"
+    modes = [
+        ("async compartido", lambda: asyncio.run(_run_async(url, args.requests, args.concurrency, True))),
+        ("async por llamada", lambda: asyncio.run(_run_async(url, args.requests, args.concurrency, False))),
+        ("sync compartido", lambda: _run_sync(url, args.requests, args.concurrency, True)),
+        ("sync por llamada", lambda: _run_sync(url, args.requests, args.concurrency, False)),
+    ]
+
+    print(f"{args.requests} requests, {args.concurrency} concurrentes, {args.handshake_ms:.0f} ms por conexión nueva")
+    try:
+        for name, run in modes:
+            opened = server.connections
+            started = time.perf_counter()
+            latencies = run()
+            seconds = time.perf_counter() - started
+            print(_summary(name, latencies, seconds, server.connections - opened))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
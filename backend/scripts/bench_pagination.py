@@ -0,0 +1,77 @@
+"""
+Benchmark de la paginación de notification_logs: offset(skip).limit(limit) contra el cursor
+(keyset, WHERE id > cursor) a distintas profundidades de página.
+
+Uso (desde backend/, con POSTGRES_URL de una base de desarrollo y las migraciones aplicadas):
+
+    python scripts/bench_pagination.py [--rows 1000000] [--limit 100] [--pages 1,100,1000,10000]
+
+Siembra --rows logs (más los que ya hubiera), los analiza y mide con
+NotificationLogService.get_all la misma página pedida por offset y por cursor. El cursor de
+cada página se arma con el id de la última fila de la anterior, como lo haría el cliente con
+X-Next-Cursor. Todo se deshace al terminar.
+"""
+from datetime import datetime, timedelta
+import argparse
+
+from _bench import scratch_session, seed_instances, seed_logs, seed_reminders, timed
+from sqlalchemy import text
+from enums import ReminderInstanceStatus
+from services.notification_logs import NotificationLogService
+from services.pagination import encode_cursor
+
+LOGS_PER_INSTANCE = 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Logs a sembrar")
+    parser.add_argument("--limit", type=int, default=100, help="Filas por página")
+    parser.add_argument("--pages", default="1,100,1000,10000", help="Páginas a medir (desde 1)")
+    parser.add_argument("--repeat", type=int, default=5, help="Ejecuciones por medición (se reporta la mediana)")
+    args = parser.parse_args()
+    pages = sorted(int(page) for page in args.pages.split(","))
+
+    with scratch_session() as db:
+        instances = -(-args.rows // LOGS_PER_INSTANCE)
+        reminder_ids = seed_reminders(db, instances, datetime.now() - timedelta(days=1), is_active=False)
+        instance_ids = seed_instances(db, reminder_ids, 1, ReminderInstanceStatus.SKIPPED.value)
+        seeded = seed_logs(db, instance_ids, LOGS_PER_INSTANCE)
+        db.execute(text("ANALYZE notification_logs"))
+        total = db.execute(text("SELECT count(*) FROM notification_logs")).scalar()
+        print(f"notification_logs: {total} filas ({seeded} sembradas), {args.limit} por página")
+
+        print(f"{'página':>8} {'offset (ms)':>12} {'cursor (ms)':>12} {'mejora':>8}")
+        for page in pages:
+            skip = (page - 1) * args.limit
+            if skip >= total:
+                print(f"{page:>8} fuera de la tabla")
+                continue
+
+            cursor = None
+            if skip:
+                last_id = db.execute(
+                    text("SELECT id FROM notification_logs ORDER BY id OFFSET :skip LIMIT 1"),
+                    {"skip": skip - 1}
+                ).scalar()
+                cursor = encode_cursor([last_id])
+
+            offset_seconds, by_offset = timed(
+                lambda: NotificationLogService.get_all(db, skip=skip, limit=args.limit), args.repeat
+            )
+            db.expunge_all()
+            cursor_seconds, by_cursor = timed(
+                lambda: NotificationLogService.get_all(db, limit=args.limit, cursor=cursor), args.repeat
+            )
+            db.expunge_all()
+
+            if [log.id for log in by_offset] != [log.id for log in by_cursor]:
+                print(f"  aviso: la página {page} no coincide entre offset y cursor")
+            print(
+                f"{page:>8} {offset_seconds * 1000:>12.2f} {cursor_seconds * 1000:>12.2f} "
+                f"{offset_seconds / cursor_seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark del planner de recordatorios vencidos (get_reminders_to_process): el recorrido
+anterior, con dos queries por reminder, contra el planner con una sola query agrupada.
+
+Uso (desde backend/, con POSTGRES_URL de una base de desarrollo y las migraciones aplicadas):
+
+    python scripts/bench_reminder_planner.py [--sizes 1000,5000,20000] [--repeat 3]
+
+Por cada tamaño siembra reminders activos y vencidos (con algunas instancias ya despachadas),
+mide el tiempo de un tick de cada versión y cuenta sus sentencias. Los reminders activos que
+ya hubiera en la base también entran en la medición. Todo se deshace al terminar.
+"""
+from datetime import datetime, timedelta
+from typing import List, Tuple
+import argparse
+
+from _bench import count_statements, scratch_session, seed_instances, seed_reminders, timed
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from models import Reminder, ReminderInstance
+from enums import ReminderInstanceStatus
+from services.reminder_scheduler import ReminderSchedulerService
+
+PERIODICITY_MINUTES = 60
+INSTANCES_PER_REMINDER = 3
+
+
+def legacy_reminders_to_process(db: Session) -> List[Tuple[Reminder, datetime]]:
+    """Versión anterior: la instancia más reciente y el chequeo de duplicado, por reminder"""
+    now = datetime.now()
+    active_reminders = db.query(Reminder).filter(
+        Reminder.is_active.is_(True),
+        Reminder.start_date <= now
+    ).all()
+
+    reminders_to_process = []
+    for reminder in active_reminders:
+        if reminder.end_date and datetime.combine(reminder.end_date, datetime.max.time()) < now:
+            continue
+        latest = db.query(ReminderInstance).filter(
+            ReminderInstance.reminder_id == reminder.id
+        ).order_by(ReminderInstance.scheduled_datetime.desc()).first()
+        if not reminder.periodicity:
+            next_datetime = reminder.start_date if latest is None else None
+        elif latest is not None:
+            next_datetime = latest.scheduled_datetime + timedelta(minutes=reminder.periodicity)
+        else:
+            next_datetime = reminder.start_date
+        if next_datetime is None or next_datetime > now:
+            continue
+
+        duplicate = db.query(ReminderInstance).filter(
+            and_(
+                ReminderInstance.reminder_id == reminder.id,
+                ReminderInstance.scheduled_datetime == next_datetime
+            )
+        ).first()
+        if not duplicate:
+            reminders_to_process.append((reminder, next_datetime))
+    return reminders_to_process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Cantidades de reminders sembrados")
+    parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones por medición (se reporta la mediana)")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    # Vencidos: el slot siguiente a las instancias sembradas ya pasó
+    start_date = datetime.now() - timedelta(minutes=PERIODICITY_MINUTES * (INSTANCES_PER_REMINDER + 2))
+
+    print(f"{'reminders':>10} {'anterior (s)':>13} {'sentencias':>11} {'planner (s)':>12} {'sentencias':>11} {'mejora':>8}")
+    with scratch_session() as db:
+        seeded = 0
+        for size in sizes:
+            reminder_ids = seed_reminders(db, size - seeded, start_date, PERIODICITY_MINUTES)
+            seed_instances(db, reminder_ids, INSTANCES_PER_REMINDER, ReminderInstanceStatus.SUCCESS.value)
+            seeded = size
+            db.expire_all()
+
+            with count_statements() as legacy_statements:
+                legacy_seconds, legacy = timed(lambda: legacy_reminders_to_process(db), args.repeat)
+            db.expire_all()
+            with count_statements() as planner_statements:
+                planner_seconds, planned = timed(lambda: ReminderSchedulerService.get_reminders_to_process(db), args.repeat)
+
+            if len(legacy) != len(planned):
+                print(f"  aviso: la versión anterior planificó {len(legacy)} y el planner {len(planned)}")
+            print(
+                f"{size:>10} {legacy_seconds:>13.3f} {legacy_statements[0] // args.repeat:>11} "
+                f"{planner_seconds:>12.3f} {planner_statements[0] // args.repeat:>11} "
+                f"{legacy_seconds / planner_seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
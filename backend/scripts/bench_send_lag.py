@@ -0,0 +1,129 @@
+"""
+Benchmark del retraso de envío (send lag): cuánto pasa entre el momento de envío de una
+instancia pendiente y su claim, con el barrido de intervalo fijo (ReminderSweeper) contra el
+dispatcher guiado por el heap (ReminderDispatcher), y cuántas sentencias manda cada uno a
+Postgres en el mismo período (carga en reposo incluida).
+
+Uso (desde backend/, con POSTGRES_URL de una base de desarrollo, las migraciones aplicadas y
+la API detenida, para que ningún otro worker tome las instancias):
+
+    python scripts/bench_send_lag.py [--count 200] [--window 120] [--interval 60]
+
+Por cada modo siembra --count instancias pendientes con su momento de envío repartido al azar
+en los próximos --window segundos y deja correr el worker hasta que vence la última (más un
+intervalo). Los reminders sembrados no tienen adulto mayor ni teléfono: el claim las toma pero
+no se encola ni se envía nada, y el lease del claim queda como registro de su hora. Los commits
+son reales (los workers usan sus propias sesiones), así que al terminar se borran los reminders
+sembrados con sus instancias. Las demás pendientes de la base también se procesan: úsese
+contra una base de desarrollo.
+"""
+from datetime import datetime, timedelta
+from typing import List, Tuple
+import argparse
+import asyncio
+import statistics
+
+from _bench import count_statements, delete_reminders, seed_instances, seed_reminders
+from sqlalchemy import bindparam, text, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from database import SessionLocal
+from enums import ReminderInstanceStatus
+from services.cron_service import ReminderSweeper
+from services.reminder_dispatcher import ReminderDispatcher
+from services.reminder_call_service import CLAIM_LEASE_SECONDS
+
+# Reparte el momento de envío de las instancias sembradas en (start, start + window]
+_SPREAD_DUE_SQL = text("""
+UPDATE reminder_instances
+SET scheduled_datetime = CAST(:start AS timestamp) + make_interval(secs => random() * :window)
+WHERE id = ANY(:instance_ids)
+""").bindparams(bindparam("instance_ids", type_=ARRAY(Integer)))
+
+# Segundos entre el momento de envío y el claim (el lease se fija en claim + CLAIM_LEASE_SECONDS)
+_CLAIM_LAG_SQL = text("""
+SELECT EXTRACT(EPOCH FROM (lease_expires_at - make_interval(secs => :lease) - scheduled_datetime))
+FROM reminder_instances
+WHERE id = ANY(:instance_ids) AND lease_expires_at IS NOT NULL
+""").bindparams(bindparam("instance_ids", type_=ARRAY(Integer)))
+
+
+def _seed(count: int, window: float) -> Tuple[List[int], List[int]]:
+    """
+    Siembra (con commit) count instancias pendientes que vencen en los próximos window segundos.
+    Retorna los ids de los reminders y de las instancias.
+    """
+    db = SessionLocal()
+    try:
+        reminder_ids = seed_reminders(db, count, datetime.now(), is_active=False)
+        instance_ids = seed_instances(db, reminder_ids, 1, ReminderInstanceStatus.PENDING.value)
+        db.execute(_SPREAD_DUE_SQL, {
+            "start": datetime.now() + timedelta(seconds=1), "window": window, "instance_ids": instance_ids
+        })
+        db.commit()
+        return reminder_ids, instance_ids
+    finally:
+        db.close()
+
+
+def _claim_lags(instance_ids: List[int]) -> List[float]:
+    """Retraso (segundos) entre el momento de envío y el claim de cada instancia tomada"""
+    db = SessionLocal()
+    try:
+        return [
+            float(lag) for lag in db.execute(
+                _CLAIM_LAG_SQL, {"lease": CLAIM_LEASE_SECONDS, "instance_ids": list(instance_ids)}
+            ).scalars()
+        ]
+    finally:
+        db.close()
+
+
+async def _run_worker(mode: str, duration: float, interval: int):
+    if mode == "sweeper":
+        worker = ReminderSweeper(interval_seconds=interval)
+    else:
+        worker = ReminderDispatcher()
+    worker.start()
+    await asyncio.sleep(duration)
+    await worker.stop()
+
+
+def _summary(mode: str, count: int, lags: List[float], statements: int, duration: float) -> str:
+    if len(lags) < 2:
+        return f"  {mode:<10} solo {len(lags)} de {count} instancias tomadas"
+    cuts = statistics.quantiles(lags, n=100)
+    return (
+        f"  {mode:<10} {len(lags):>5}/{count} tomadas  p50 {cuts[49]:>7.2f} s  p95 {cuts[94]:>7.2f} s  "
+        f"máx {max(lags):>7.2f} s  {statements:>6} sentencias ({statements * 60 / duration:.0f}/min)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="Instancias pendientes sembradas por modo")
+    parser.add_argument("--window", type=float, default=120, help="Segundos en que se reparten sus momentos de envío")
+    parser.add_argument("--interval", type=int, default=60, help="Intervalo del barrido (segundos)")
+    parser.add_argument("--modes", default="sweeper,dispatcher", help="Workers a medir")
+    args = parser.parse_args()
+
+    duration = args.window + args.interval + 5
+    if duration >= CLAIM_LEASE_SECONDS:
+        parser.error(f"--window + --interval debe ser menor que el lease del claim ({CLAIM_LEASE_SECONDS} s)")
+
+    print(f"{args.count} instancias repartidas en {args.window:.0f} s, {duration:.0f} s por modo")
+    for mode in args.modes.split(","):
+        reminder_ids, instance_ids = _seed(args.count, args.window)
+        try:
+            with count_statements() as statements:
+                asyncio.run(_run_worker(mode, duration, args.interval))
+            print(_summary(mode, args.count, _claim_lags(instance_ids), statements[0], duration))
+        finally:
+            db = SessionLocal()
+            try:
+                delete_reminders(db, reminder_ids)
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Verifica contra Postgres el camino de los eventos de horario: emit_schedule_change (pg_notify
+en la transacción del servicio) -> ScheduleChangeListener (LISTEN por asyncpg) -> recarga del
+ReminderDispatcher.
+
+Uso (desde backend/, con POSTGRES_URL de una base de desarrollo y las migraciones aplicadas):
+
+    python scripts/check_schedule_events.py [--timeout 5]
+
+Arranca un dispatcher y su listener como lo hace la app. Luego crea un reminder inactivo,
+le agrega una instancia pendiente (dentro de la ventana del dispatcher pero sin vencer),
+cambia su horario y lo elimina, con los servicios de la app. Después de cada paso espera a que
+el evento llegue y el dispatcher reaccione. El dispatcher de la prueba no despacha, así no se
+envía nada aunque la base tenga pendientes vencidas. El reminder se borra al terminar. Sale
+con código 1 si algún paso no llega a tiempo.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+import argparse
+import asyncio
+import sys
+
+import _bench  # noqa: F401  (agrega backend/ al path)
+from database import SessionLocal
+from enums import ReminderInstanceStatus
+from dtos.reminders import ReminderCreate, ReminderUpdate
+from dtos.reminder_instances import ReminderInstanceCreate
+from services.reminders import ReminderService
+from services.reminder_instances import ReminderInstanceService
+from services.reminder_dispatcher import ReminderDispatcher
+from services.schedule_events import ScheduleChangeListener
+
+
+class RecordingDispatcher(ReminderDispatcher):
+    """Dispatcher real que registra sus recargas y no despacha"""
+
+    def __init__(self):
+        super().__init__()
+        self.reloads: List[Optional[List[int]]] = []
+
+    async def _reload(self, reminder_ids: Optional[List[int]] = None, after: Optional[datetime] = None):
+        await super()._reload(reminder_ids, after)
+        self.reloads.append(reminder_ids)
+
+    async def _dispatch(self):
+        pass
+
+
+async def _wait_for(condition: Callable[[], bool], timeout: float) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def _create_reminder() -> int:
+    db = SessionLocal()
+    try:
+        reminder = ReminderService.create(db, ReminderCreate(
+            reminder_type="medicine", periodicity=60, start_date=datetime.now() + timedelta(days=1), is_active=False
+        ))
+        return reminder.id
+    finally:
+        db.close()
+
+
+def _create_pending_instance(reminder_id: int, scheduled_datetime: datetime) -> int:
+    db = SessionLocal()
+    try:
+        instance = ReminderInstanceService.create(db, ReminderInstanceCreate(
+            reminder_id=reminder_id,
+            scheduled_datetime=scheduled_datetime,
+            status=ReminderInstanceStatus.PENDING.value
+        ))
+        db.commit()
+        return instance.id
+    finally:
+        db.close()
+
+
+def _update_reminder(reminder_id: int):
+    db = SessionLocal()
+    try:
+        ReminderService.update(db, reminder_id, ReminderUpdate(periodicity=120))
+    finally:
+        db.close()
+
+
+def _delete_reminder(reminder_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return ReminderService.delete(db, reminder_id)
+    finally:
+        db.close()
+
+
+async def run_check(timeout: float) -> int:
+    dispatcher = RecordingDispatcher()
+    listener = ScheduleChangeListener(dispatcher)
+    dispatcher.start()
+    listener.start()
+
+    failures = 0
+
+    def report(name: str, ok: bool):
+        nonlocal failures
+        failures += 0 if ok else 1
+        print(f"[{'OK' if ok else 'FALLA'}] {name}")
+
+    reminder_id = None
+    try:
+        ok = await _wait_for(lambda: dispatcher.listening and None in dispatcher.reloads, timeout)
+        report("listener conectado y ventana cargada", ok)
+        if not ok:
+            return 1
+
+        reminder_id = await asyncio.to_thread(_create_reminder)
+        report(
+            f"reminder_created -> recarga del reminder {reminder_id}",
+            await _wait_for(lambda: [reminder_id] in dispatcher.reloads, timeout)
+        )
+
+        scheduled_datetime = (datetime.now() + timedelta(seconds=dispatcher.lookahead_seconds / 2)).replace(microsecond=0)
+        instance_id = await asyncio.to_thread(_create_pending_instance, reminder_id, scheduled_datetime)
+        report(
+            f"instance_created -> instancia {instance_id} en el heap",
+            await _wait_for(lambda: dispatcher._due.get(instance_id, (None,))[0] == scheduled_datetime, timeout)
+        )
+
+        reloads_before = dispatcher.reloads.count([reminder_id])
+        await asyncio.to_thread(_update_reminder, reminder_id)
+        report(
+            "reminder_updated -> recarga del reminder",
+            await _wait_for(lambda: dispatcher.reloads.count([reminder_id]) > reloads_before, timeout)
+        )
+
+        deleted = await asyncio.to_thread(_delete_reminder, reminder_id)
+        reminder_id = None if deleted else reminder_id
+        report(
+            f"reminder_deleted -> instancia {instance_id} fuera del heap",
+            await _wait_for(lambda: instance_id not in dispatcher._due, timeout)
+        )
+    finally:
+        await listener.stop()
+        await dispatcher.stop()
+        if reminder_id is not None:
+            await asyncio.to_thread(_delete_reminder, reminder_id)
+
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=5, help="Segundos de espera por cada evento")
+    args = parser.parse_args()
+    return asyncio.run(run_check(args.timeout))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
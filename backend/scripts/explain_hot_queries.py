@@ -0,0 +1,149 @@
+"""
+Verifica con EXPLAIN que las queries calientes de reminder_instances y notification_logs
+usan sus índices (migraciones 0001 y 0004), con volúmenes de producción.
+
+Uso (desde backend/, con POSTGRES_URL de una base de desarrollo y las migraciones aplicadas):
+
+    python scripts/explain_hot_queries.py [--reminders 5000] [--instances-per-reminder 60] \\
+        [--force-index] [--verbose]
+
+Siembra reminders con su historial de instancias (la mayoría ya respondidas y unas pocas
+pendientes, en espera o fallidas, como en producción) y un log por instancia, analiza las
+tablas y pide el plan que el planner elige con esos datos. Todo se deshace al terminar.
+Con --force-index se desactiva enable_seqscan, para ver solo si el índice es utilizable para
+la forma de cada query. Sale con código 1 si alguna query no usa su índice.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Tuple
+import argparse
+import json
+import sys
+
+from _bench import scratch_session, seed_instances, seed_logs, seed_reminders
+from sqlalchemy import bindparam, text, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from enums import ReminderInstanceStatus
+
+PERIODICITY_MINUTES = 60
+
+# Reparte los estados de las instancias sembradas (el resto queda success)
+_STATUS_MIX_SQL = text("""
+UPDATE reminder_instances
+SET status = CASE
+    WHEN r < :pending THEN 'pending'
+    WHEN r < :pending + :waiting THEN 'waiting'
+    WHEN r < :pending + :waiting + :failure THEN 'failure'
+    ELSE status
+END
+FROM (SELECT id, random() AS r FROM reminder_instances WHERE id = ANY(:instance_ids)) AS mix
+WHERE reminder_instances.id = mix.id
+""").bindparams(bindparam("instance_ids", type_=ARRAY(Integer)))
+
+# Fracción de instancias en cada estado abierto
+STATUS_MIX = {"pending": 0.01, "waiting": 0.01, "failure": 0.005}
+
+# (nombre, query, parámetros a partir de una instancia sembrada, índice esperado en el plan)
+HOT_QUERIES: List[Tuple[str, str, Callable[[Dict], Dict], str]] = [
+    (
+        "claim de instancias pendientes vencidas",
+        """
+        SELECT id FROM reminder_instances
+        WHERE status = 'pending'
+          AND COALESCE(next_attempt_at, scheduled_datetime) <= :now
+          AND (lease_expires_at IS NULL OR lease_expires_at < :now)
+        ORDER BY COALESCE(next_attempt_at, scheduled_datetime)
+        LIMIT 50
+        FOR UPDATE SKIP LOCKED
+        """,
+        lambda sample: {"now": datetime.now()},
+        "ix_reminder_instances_pending_due",
+    ),
+    (
+        "webhook por message_id",
+        "SELECT id FROM reminder_instances WHERE message_id = :message_id",
+        lambda sample: {"message_id": "wamid.explain"},
+        "ix_reminder_instances_message_id",
+    ),
+    (
+        "instancia de un slot (reminder_id, scheduled_datetime)",
+        "SELECT id FROM reminder_instances WHERE reminder_id = :reminder_id AND scheduled_datetime = :scheduled",
+        lambda sample: {"reminder_id": sample["reminder_id"], "scheduled": sample["scheduled_datetime"]},
+        "uq_reminder_instances_reminder_scheduled",
+    ),
+    (
+        "candidatas a reintento",
+        """
+        SELECT id FROM reminder_instances
+        WHERE status IN ('failure', 'waiting') AND updated_at <= :cutoff
+        """,
+        lambda sample: {"cutoff": datetime.now() - timedelta(minutes=30)},
+        "ix_reminder_instances_retryable",
+    ),
+    (
+        "log más reciente de una instancia",
+        """
+        SELECT id FROM notification_logs
+        WHERE reminder_instance_id = :instance_id
+        ORDER BY sent_at DESC
+        LIMIT 1
+        """,
+        lambda sample: {"instance_id": sample["id"]},
+        "ix_notification_logs_instance_sent_at",
+    ),
+]
+
+
+def _plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reminders", type=int, default=5000, help="Reminders a sembrar")
+    parser.add_argument("--instances-per-reminder", type=int, default=60, help="Historial de instancias por reminder")
+    parser.add_argument("--force-index", action="store_true", help="Desactivar enable_seqscan")
+    parser.add_argument("--verbose", action="store_true", help="Imprimir el plan de cada query")
+    args = parser.parse_args()
+
+    failures = 0
+    with scratch_session() as db:
+        # El historial termina ahora: las instancias pendientes ya están vencidas
+        start_date = datetime.now() - timedelta(minutes=PERIODICITY_MINUTES * args.instances_per_reminder)
+        reminder_ids = seed_reminders(db, args.reminders, start_date, PERIODICITY_MINUTES)
+        instance_ids = seed_instances(
+            db, reminder_ids, args.instances_per_reminder, ReminderInstanceStatus.SUCCESS.value
+        )
+        db.execute(_STATUS_MIX_SQL, {**STATUS_MIX, "instance_ids": instance_ids})
+        seed_logs(db, instance_ids, 1)
+        db.execute(text("ANALYZE reminder_instances"))
+        db.execute(text("ANALYZE notification_logs"))
+        sample = db.execute(
+            text("SELECT id, reminder_id, scheduled_datetime FROM reminder_instances WHERE id = :id"),
+            {"id": instance_ids[len(instance_ids) // 2]}
+        ).mappings().one()
+        print(f"Sembradas {len(instance_ids)} instancias de {len(reminder_ids)} reminders y sus logs")
+
+        for name, sql, params, expected_index in HOT_QUERIES:
+            # SAVEPOINT: el SET LOCAL se deshace con él y los datos sembrados quedan
+            savepoint = db.begin_nested()
+            if args.force_index:
+                db.execute(text("SET LOCAL enable_seqscan = off"))
+            plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params(sample)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            savepoint.rollback()
+
+            indexes = {node["Index Name"] for node in _plan_nodes(plan[0]["Plan"]) if "Index Name" in node}
+            ok = expected_index in indexes
+            failures += 0 if ok else 1
+            print(f"[{'OK' if ok else 'FALLA'}] {name}: esperado {expected_index}, usados {sorted(indexes) or '-'}")
+            if args.verbose or not ok:
+                print(json.dumps(plan[0]["Plan"], indent=2, default=str))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
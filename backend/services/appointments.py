@@ -3,13 +3,17 @@ from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from models import Appointment, ElderlyProfile, HealthWorker  # Importar todos los modelos para que estén en metadata
 from dtos.appointments import AppointmentCreate, AppointmentUpdate
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (Appointment.scheduled_datetime, Appointment.id)
 
 
 class AppointmentService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Appointment]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Appointment]:
         """Obtener todas las citas con paginación"""
-        return db.query(Appointment).offset(skip).limit(limit).all()
+        return paginate(db.query(Appointment), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, appointment_id: int) -> Optional[Appointment]:
@@ -0,0 +1,53 @@
+from sqlalchemy import Integer, cast, column, update, values
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Filas por sentencia UPDATE ... FROM (VALUES ...)
+BULK_UPDATE_CHUNK_SIZE = 1000
+
+
+def bulk_update_statements(
+    model,
+    updates: Iterable[Tuple[int, Dict[str, Any]]],
+    chunk_size: int = BULK_UPDATE_CHUNK_SIZE,
+    where: Optional[Any] = None
+) -> List:
+    """
+    Arma las sentencias UPDATE ... FROM (VALUES ...) que aplican muchos cambios (id, {campo: valor})
+    sin cargar objetos ORM. Las filas se agrupan por conjunto de campos, así cada grupo es una
+    sola sentencia (por chunk). Si un id aparece varias veces, gana el último cambio.
+    where es una condición extra sobre la fila actual (p.ej. su estado): las que no la cumplen
+    no se tocan.
+    """
+    merged: Dict[int, Dict[str, Any]] = {}
+    for row_id, changes in updates:
+        merged.setdefault(row_id, {}).update(changes)
+
+    groups: Dict[Tuple[str, ...], List[Tuple[int, Dict[str, Any]]]] = {}
+    for row_id, changes in merged.items():
+        if changes:
+            groups.setdefault(tuple(sorted(changes)), []).append((row_id, changes))
+
+    table = model.__table__
+    statements = []
+    for field_names, rows in groups.items():
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            changes_table = values(
+                column("id", Integer),
+                *(column(name, table.c[name].type) for name in field_names),
+                name="changes"
+            ).data([
+                (row_id, *(changes[name] for name in field_names))
+                for row_id, changes in chunk
+            ])
+            # CAST explícito: en VALUES un NULL sin tipo se infiere como text
+            stmt = (
+                update(model)
+                .where(table.c.id == changes_table.c.id)
+                .values({name: cast(changes_table.c[name], table.c[name].type) for name in field_names})
+                .execution_options(synchronize_session=False)
+            )
+            if where is not None:
+                stmt = stmt.where(where)
+            statements.append(stmt)
+    return statements
@@ -1,69 +1,213 @@
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.cron import CronTrigger
 from sqlalchemy.orm import Session
+from sqlalchemy import exists, select
+from datetime import datetime
 from database import SessionLocal
 from services.reminder_call_service import ReminderCallService
+from services.reminder_retries import ReminderRetryService
+from services.family_escalation import FamilyEscalationService
+from services.notification_outbox import NotificationOutboxService
+from services.reminder_messages import ReminderMessageService
+from services.reminder_materializer import ReminderMaterializerService
+from services.webhook_events import WebhookEventService
+from typing import Dict, Optional
 import logging
 import atexit
 import asyncio
+import os
 
 logger = logging.getLogger(__name__)
 
+# Segundos que se espera a que termine el procesamiento en curso al apagar la aplicación
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('REMINDER_SHUTDOWN_DRAIN_SECONDS', '30'))
+
 # Scheduler global
 scheduler = None
 
 
-def init_scheduler(interval_seconds: int = 20):
+class ReminderSweeper:
     """
-    Inicializa el scheduler de cron para procesar recordatorios pendientes.
-    
-    Args:
-        interval_seconds: Intervalo en segundos entre cada ejecución (por defecto 60 segundos = 1 minuto)
+    Barrido periódico de llamadas pendientes, como tarea asyncio de larga vida en el event
+    loop de la aplicación (así los clientes HTTP, caches y pools se reutilizan entre ticks).
+
+    Cada tick primero consulta (una sola sentencia de solo lectura) qué fases tienen trabajo y
+    ejecuta solo esas: sin nada vencido el barrido no escribe ni toma locks.
+
+    Los ticks nunca se solapan: si uno tarda más que el intervalo, el siguiente empieza al
+    terminar y los ticks perdidos no se acumulan. Al apagar se espera a que termine el tick
+    en curso (hasta drain_seconds) antes de cancelarlo.
+    """
+
+    def __init__(self, interval_seconds: int = 60):
+        self.interval_seconds = interval_seconds
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Arranca el barrido en el event loop actual"""
+        if self._task is not None:
+            logger.warning("Barrido de recordatorios ya está iniciado")
+            return
+
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Barrido de recordatorios iniciado. Ejecutándose cada {self.interval_seconds} segundos.")
+
+    async def stop(self, drain_seconds: float = SHUTDOWN_DRAIN_SECONDS):
+        """Detiene el barrido, esperando (hasta drain_seconds) a que termine el tick en curso"""
+        task = self._task
+        self._task = None
+        if task is None:
+            return
+
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=drain_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("El tick de recordatorios no terminó a tiempo; se cancela")
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        logger.info("Barrido de recordatorios detenido")
+
+    @staticmethod
+    def _due_work(db: Session) -> Dict[str, bool]:
+        """
+        Qué fases del tick tienen trabajo: un EXISTS por fase (sobre sus índices parciales) en
+        una sola consulta, con los mismos criterios que usa cada fase para tomar filas.
+        """
+        now = datetime.now()
+        row = db.execute(
+            select(
+                ReminderRetryService.due_exists(now).label("retries"),
+                FamilyEscalationService.due_exists(now).label("escalation"),
+                exists().where(ReminderCallService.claimable_filter(now)).label("calls"),
+                NotificationOutboxService.due_exists(now).label("outbox"),
+            )
+        ).one()
+        # Cierra la transacción de lectura: si no hay trabajo la sesión no vuelve a usarse
+        db.rollback()
+        return dict(row._mapping)
+
+    async def _tick(self):
+        """
+        Reprograma los reintentos, escala a la familia y procesa las llamadas pendientes una vez,
+        solo las fases con trabajo. Las fases de base de datos (SQLAlchemy síncrono) corren en
+        un thread, así el tick no bloquea a los handlers HTTP que comparten el event loop.
+        """
+        db = SessionLocal()
+        try:
+            due = await asyncio.to_thread(ReminderSweeper._due_work, db)
+            if not any(due.values()):
+                logger.debug("Barrido de recordatorios: nada vencido")
+                return
+
+            if due["retries"]:
+                await asyncio.to_thread(ReminderRetryService.schedule_retries, db)
+            if due["escalation"]:
+                # Los avisos quedan en el outbox; los envía el drain de process_pending_calls
+                await asyncio.to_thread(FamilyEscalationService.escalate, db)
+            if not (due["calls"] or due["outbox"] or due["escalation"]):
+                # Los reintentos recién reprogramados vencen más adelante (backoff)
+                return
+            results = await ReminderCallService.process_pending_calls(db)
+            logger.info(
+                f"Cron job ejecutado: {results['processed']} procesados, "
+                f"{results['successful']} exitosos, {results['failed']} fallidos, "
+                f"{results['queued']} en cola; relay: {results['delivery']}"
+            )
+        except Exception as e:
+            logger.error(f"Error en cron job de recordatorios: {str(e)}", exc_info=True)
+        finally:
+            await asyncio.to_thread(db.close)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + self.interval_seconds
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=max(0.0, next_run - loop.time()))
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            await self._tick()
+            next_run = max(next_run + self.interval_seconds, loop.time())
+
+
+def init_scheduler():
+    """
+    Inicializa el scheduler de cron para los jobs nocturnos (pre-generación de mensajes,
+    materialización de instancias y limpieza de webhooks). El barrido de pendientes corre en
+    ReminderSweeper.
     """
     global scheduler
 
-    
     if scheduler is not None:
         logger.warning("Scheduler ya está inicializado")
         return
     
     scheduler = BackgroundScheduler()
     
-    def process_reminders_job():
-        """Job que se ejecuta periódicamente para procesar recordatorios pendientes"""
+    def prewarm_messages_job():
+        """Job nocturno que genera por adelantado los mensajes de los recordatorios de mañana"""
         db = SessionLocal()
         try:
-            # Procesar llamadas pendientes (es async, usar asyncio.run)
-            try:
-                print('Processing pending calls')
-                print('owo', flush=True)
-                logger.info('logger.info owo')
-                results = asyncio.run(
-                    ReminderCallService.process_pending_calls(db)
-                )
-                print('Results: ', results)
-                logger.info(
-                    f"Cron job ejecutado: {results['processed']} procesados, "
-                    f"{results['successful']} exitosos, {results['failed']} fallidos"
-                )
-            except Exception as e:
-                logger.error(f"Error ejecutando async en cron job: {str(e)}", exc_info=True)
+            ReminderMessageService.prewarm_for_date(db)
         except Exception as e:
-            logger.error(f"Error en cron job de recordatorios: {str(e)}", exc_info=True)
+            logger.error(f"Error pre-generando mensajes de recordatorios: {str(e)}", exc_info=True)
+        finally:
+            db.close()
+    
+    scheduler.add_job(
+        func=prewarm_messages_job,
+        trigger=CronTrigger(hour=int(os.getenv('REMINDER_PREWARM_HOUR', '22'))),
+        id='prewarm_reminder_messages',
+        name='Pre-generar mensajes de recordatorios de mañana',
+        replace_existing=True
+    )
+    
+    def materialize_instances_job():
+        """Job nocturno que extiende el horizonte de reminder_instances pre-generadas"""
+        db = SessionLocal()
+        try:
+            ReminderMaterializerService.materialize(db)
+        except Exception as e:
+            logger.error(f"Error materializando reminder_instances: {str(e)}", exc_info=True)
+        finally:
+            db.close()
+    
+    scheduler.add_job(
+        func=materialize_instances_job,
+        trigger=CronTrigger(hour=int(os.getenv('REMINDER_MATERIALIZE_HOUR', '2'))),
+        id='materialize_reminder_instances',
+        name='Extender el horizonte de reminder_instances',
+        replace_existing=True
+    )
+    
+    def purge_webhook_events_job():
+        """Job nocturno que elimina los webhook_events cerrados fuera de la retención"""
+        db = SessionLocal()
+        try:
+            WebhookEventService.purge_expired(db)
+        except Exception as e:
+            logger.error(f"Error eliminando webhook_events antiguos: {str(e)}", exc_info=True)
         finally:
             db.close()
     
-    # Agregar el job con intervalo configurable
     scheduler.add_job(
-        func=process_reminders_job,
-        trigger=IntervalTrigger(seconds=interval_seconds),
-        id='process_reminder_calls',
-        name='Procesar llamadas de recordatorios pendientes',
+        func=purge_webhook_events_job,
+        trigger=CronTrigger(hour=int(os.getenv('WEBHOOK_PURGE_HOUR', '3'))),
+        id='purge_webhook_events',
+        name='Eliminar webhook_events antiguos',
         replace_existing=True
     )
     
     scheduler.start()
-    logger.info(f"Scheduler iniciado. Ejecutándose cada {interval_seconds} segundos.")
+    logger.info("Scheduler de jobs nocturnos iniciado")
     
     # Registrar shutdown al salir
     atexit.register(lambda: shutdown_scheduler())
@@ -4,13 +4,17 @@ from sqlalchemy import text
 from typing import List, Optional
 from models import ElderlyProfile, User  # Importar User para que esté en metadata
 from dtos.elderly_profiles import ElderlyProfileCreate, ElderlyProfileUpdate
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (ElderlyProfile.id,)
 
 
 class ElderlyProfileService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[ElderlyProfile]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[ElderlyProfile]:
         """Obtener todos los perfiles de adultos mayores con paginación"""
-        return db.query(ElderlyProfile).offset(skip).limit(limit).all()
+        return paginate(db.query(ElderlyProfile), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, profile_id: int) -> Optional[ElderlyProfile]:
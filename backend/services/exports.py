@@ -0,0 +1,124 @@
+from sqlalchemy import select
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Optional
+from models import NotificationLog, ReminderInstance
+from database import AsyncSessionLocal
+import csv
+import io
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Filas que se traen del cursor del servidor por viaje (y que se codifican en cada chunk)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+# Formatos de exportación soportados -> media type de la respuesta
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def _csv_value(value: Any):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class ExportService:
+    @staticmethod
+    def media_type(export_format: str) -> str:
+        """Media type del formato; lanza ValueError si el formato no está soportado"""
+        media_type = EXPORT_MEDIA_TYPES.get(export_format)
+        if media_type is None:
+            raise ValueError(
+                f"Formato de exportación no soportado: {export_format}. Use uno de: {', '.join(EXPORT_MEDIA_TYPES)}"
+            )
+        return media_type
+
+    @staticmethod
+    def _check_range(start: Optional[datetime], end: Optional[datetime]):
+        if start and end and start >= end:
+            raise ValueError("La fecha de inicio debe ser anterior a la fecha de término")
+
+    @staticmethod
+    def notification_logs_select(
+        start: Optional[datetime] = None, end: Optional[datetime] = None, status: Optional[str] = None
+    ):
+        """Logs de notificaciones con sent_at en [start, end) y el estado dado, en orden de id"""
+        ExportService._check_range(start, end)
+        table = NotificationLog.__table__
+        stmt = select(table)
+        if start:
+            stmt = stmt.where(table.c.sent_at >= start)
+        if end:
+            stmt = stmt.where(table.c.sent_at < end)
+        if status:
+            stmt = stmt.where(table.c.status == status)
+        return stmt.order_by(table.c.id)
+
+    @staticmethod
+    def reminder_instances_select(
+        start: Optional[datetime] = None, end: Optional[datetime] = None, status: Optional[str] = None
+    ):
+        """Instancias con scheduled_datetime en [start, end) y el estado dado, en orden (scheduled_datetime, id)"""
+        ExportService._check_range(start, end)
+        table = ReminderInstance.__table__
+        stmt = select(table)
+        if start:
+            stmt = stmt.where(table.c.scheduled_datetime >= start)
+        if end:
+            stmt = stmt.where(table.c.scheduled_datetime < end)
+        if status:
+            stmt = stmt.where(table.c.status == status)
+        return stmt.order_by(table.c.scheduled_datetime, table.c.id)
+
+    @staticmethod
+    async def stream(stmt, export_format: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+        """
+        Ejecuta stmt con un cursor del servidor y va entregando la exportación en chunks de
+        batch_size filas (NDJSON: un objeto JSON por línea; CSV: encabezado y luego filas).
+
+        Usa su propia sesión porque el generador sigue corriendo después de que el endpoint
+        retorna la respuesta. Las filas son de Core (sin identity map) y cada lote se descarta
+        al codificarse, así la memoria no depende del tamaño de la exportación.
+        """
+        ExportService.media_type(export_format)
+        columns = [column.name for column in stmt.selected_columns]
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if export_format == "csv" else None
+        if writer:
+            # El encabezado sale antes de ejecutar la consulta: el primer byte no espera a la BD
+            writer.writerow(columns)
+            yield buffer.getvalue()
+
+        exported = 0
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt.execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                buffer.seek(0)
+                buffer.truncate()
+                if writer:
+                    writer.writerows([_csv_value(value) for value in row] for row in rows)
+                else:
+                    for row in rows:
+                        buffer.write(json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False))
+                        buffer.write("\n")
+                exported += len(rows)
+                yield buffer.getvalue()
+
+        logger.info(f"Exportación {export_format} completada: {exported} filas")
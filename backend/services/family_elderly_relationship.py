@@ -4,13 +4,17 @@ from sqlalchemy import text
 from typing import List, Optional
 from models import FamilyElderlyRelationship, ElderlyProfile, User  # Importar para que estén en metadata
 from dtos.family_elderly_relationship import FamilyElderlyRelationshipCreate, FamilyElderlyRelationshipUpdate
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (FamilyElderlyRelationship.id,)
 
 
 class FamilyElderlyRelationshipService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[FamilyElderlyRelationship]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[FamilyElderlyRelationship]:
         """Obtener todas las relaciones familia-adulto mayor con paginación"""
-        return db.query(FamilyElderlyRelationship).offset(skip).limit(limit).all()
+        return paginate(db.query(FamilyElderlyRelationship), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, relationship_id: int) -> Optional[FamilyElderlyRelationship]:
@@ -20,12 +24,12 @@ class FamilyElderlyRelationshipService:
     @staticmethod
     def get_by_elderly_id(db: Session, elderly_id: int) -> List[FamilyElderlyRelationship]:
         """Obtener todas las relaciones de un adulto mayor"""
-        return db.query(FamilyElderlyRelationship).filter(FamilyElderlyRelationship.id == elderly_id).all()
+        return db.query(FamilyElderlyRelationship).filter(FamilyElderlyRelationship.elderly_id == elderly_id).all()
 
     @staticmethod
     def get_by_family_member_id(db: Session, family_member_id: int) -> List[FamilyElderlyRelationship]:
         """Obtener todas las relaciones de un miembro de la familia"""
-        return db.query(FamilyElderlyRelationship).filter(FamilyElderlyRelationship.id == family_member_id).all()
+        return db.query(FamilyElderlyRelationship).filter(FamilyElderlyRelationship.family_member_id == family_member_id).all()
 
     @staticmethod
     def get_primary_contacts(db: Session) -> List[FamilyElderlyRelationship]:
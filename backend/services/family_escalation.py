@@ -0,0 +1,169 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, or_, func, select
+from datetime import datetime, timedelta
+from typing import Optional
+from models import ReminderInstance, Reminder, Medicine, Appointment, ElderlyProfile, FamilyElderlyRelationship, User
+from enums import ReminderInstanceStatus
+from dtos.reminder_instances import ReminderInstanceUpdate
+from services.reminder_instances import ReminderInstanceService
+from services.notification_outbox import NotificationOutboxService, FAMILY_OUTBOX_CHANNEL
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Minutos desde el horario del recordatorio tras los cuales, si sigue sin confirmarse, se avisa a la familia
+ESCALATION_GRACE_MINUTES = int(os.getenv('REMINDER_ESCALATION_GRACE_MINUTES', '60'))
+# Instancias escaladas por transacción
+ESCALATION_BATCH_SIZE = 1000
+
+# Estados que indican que el adulto mayor no confirmó el recordatorio
+ESCALATION_STATUSES = [
+    ReminderInstanceStatus.WAITING.value,
+    ReminderInstanceStatus.REJECTED.value,
+    ReminderInstanceStatus.FAILURE.value,
+]
+
+_FAMILY_BUTTONS = [{"id": "family_ack", "title": "Entendido"}]
+
+
+class FamilyEscalationService:
+    @staticmethod
+    def _message(elderly_name: Optional[str], medicine_name: Optional[str], appointment: bool,
+                 status: str, scheduled_datetime: datetime) -> str:
+        name = elderly_name or "Tu familiar"
+        hour = scheduled_datetime.strftime("%H:%M")
+        if medicine_name:
+            subject = f"tomar {medicine_name}"
+        elif appointment:
+            subject = "su cita médica"
+        else:
+            subject = "su recordatorio"
+
+        if status == ReminderInstanceStatus.REJECTED.value:
+            return f"{name} indicó que no pudo {subject} de las {hour}. Te recomendamos comunicarte con él/ella."
+        if status == ReminderInstanceStatus.FAILURE.value:
+            return f"No pudimos avisarle a {name} sobre {subject} de las {hour}. Te recomendamos comunicarte con él/ella."
+        return f"{name} no ha confirmado {subject} de las {hour}. Te recomendamos comunicarte con él/ella."
+
+    @staticmethod
+    def _candidates(now: datetime):
+        """
+        Consulta de las instancias a escalar, con su familiar principal (habilitado y con
+        teléfono), adulto mayor y medicamento
+        """
+        escalate_before = now - timedelta(minutes=ESCALATION_GRACE_MINUTES)
+        elderly_id = func.coalesce(Reminder.elderly_profile_id, Appointment.elderly_id, Medicine.id)
+        elderly_user = aliased(User)
+        family_member = aliased(User)
+
+        return (
+            select(
+                ReminderInstance.id,
+                ReminderInstance.status,
+                ReminderInstance.scheduled_datetime,
+                FamilyElderlyRelationship.family_member_id,
+                family_member.phone,
+                elderly_user.full_name,
+                Medicine.name,
+                Reminder.appointment_id
+            )
+            .join(Reminder, Reminder.id == ReminderInstance.reminder_id)
+            .outerjoin(Medicine, Medicine.id == Reminder.medicine)
+            .outerjoin(Appointment, Appointment.id == Reminder.appointment_id)
+            .join(ElderlyProfile, ElderlyProfile.id == elderly_id)
+            .join(
+                FamilyElderlyRelationship,
+                and_(
+                    FamilyElderlyRelationship.elderly_id == ElderlyProfile.id,
+                    FamilyElderlyRelationship.is_primary_contact.is_(True),
+                    FamilyElderlyRelationship.notification_enabled.isnot(False)
+                )
+            )
+            .join(family_member, family_member.id == FamilyElderlyRelationship.family_member_id)
+            .outerjoin(elderly_user, elderly_user.id == ElderlyProfile.id)
+            .where(
+                ReminderInstance.status.in_(ESCALATION_STATUSES),
+                or_(ReminderInstance.family_notified.is_(None), ReminderInstance.family_notified.is_(False)),
+                ReminderInstance.scheduled_datetime < escalate_before,
+                family_member.phone.isnot(None)
+            )
+        )
+
+    @staticmethod
+    def due_exists(now: datetime):
+        """Condición EXISTS: hay instancias que escalate avisaría a la familia"""
+        return FamilyEscalationService._candidates(now).exists()
+
+    @staticmethod
+    def escalate(db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Avisa a los contactos familiares principales de las instancias que siguen en waiting,
+        rejected o failure pasado el período de gracia. El aviso va al teléfono del familiar
+        (FamilyElderlyRelationship.family_member_id -> users.phone), no al emergency_contact,
+        que es el número del propio adulto mayor al que ya se le envió el recordatorio.
+
+        Por lote: una sola consulta con joins resuelve reminder, adulto mayor, relación
+        familiar y familiar de todas las instancias (FOR UPDATE SKIP LOCKED, así dos réplicas no
+        escalan la misma), los avisos se encolan en bloque en el outbox y family_notified se
+        marca en bloque, todo en la misma transacción. El envío lo hace el relay del outbox.
+
+        Las instancias sin contacto familiar habilitado (con teléfono) no se marcan y no se
+        vuelven a considerar una vez que pasan a otro estado.
+
+        Returns:
+            Cantidad de instancias escaladas
+        """
+        now = now or datetime.now()
+        stmt = (
+            FamilyEscalationService._candidates(now)
+            .order_by(ReminderInstance.scheduled_datetime, ReminderInstance.id)
+            .limit(ESCALATION_BATCH_SIZE)
+            .with_for_update(of=ReminderInstance, skip_locked=True)
+        )
+
+        escalated = 0
+        while True:
+            try:
+                rows = db.execute(stmt).all()
+                entries = [
+                    {
+                        "reminder_instance_id": instance_id,
+                        "channel": FAMILY_OUTBOX_CHANNEL,
+                        "recipient": phone,
+                        "payload": {
+                            "body_text": FamilyEscalationService._message(
+                                elderly_name, medicine_name, appointment_id is not None,
+                                status, scheduled_datetime
+                            ),
+                            "buttons": _FAMILY_BUTTONS
+                        },
+                        # Un único aviso por instancia a cada familiar
+                        "idempotency_key": f"{FAMILY_OUTBOX_CHANNEL}:{instance_id}:{family_member_id}"
+                    }
+                    for (instance_id, status, scheduled_datetime, family_member_id,
+                         phone, elderly_name, medicine_name, appointment_id) in rows
+                ]
+                NotificationOutboxService.enqueue_many(db, entries)
+                # Con varios contactos principales una instancia aparece en varias filas
+                instance_ids = list(dict.fromkeys(entry["reminder_instance_id"] for entry in entries))
+                ReminderInstanceService.bulk_update(
+                    db,
+                    [
+                        (instance_id, ReminderInstanceUpdate(family_notified=True, family_notified_at=now))
+                        for instance_id in instance_ids
+                    ],
+                    commit=False
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            escalated += len(instance_ids)
+            if len(rows) < ESCALATION_BATCH_SIZE:
+                break
+
+        if escalated:
+            logger.info(f"Escalamiento familiar: {escalated} reminder_instances avisadas a la familia")
+        return escalated
@@ -4,13 +4,17 @@ from sqlalchemy import text
 from typing import List, Optional
 from models import HealthWorker, User  # Importar User para que esté en metadata
 from dtos.health_workers import HealthWorkerCreate, HealthWorkerUpdate
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (HealthWorker.id,)
 
 
 class HealthWorkerService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[HealthWorker]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[HealthWorker]:
         """Obtener todos los trabajadores de salud con paginación"""
-        return db.query(HealthWorker).offset(skip).limit(limit).all()
+        return paginate(db.query(HealthWorker), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, worker_id: int) -> Optional[HealthWorker]:
@@ -0,0 +1,150 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text, bindparam, Integer, insert, delete
+from sqlalchemy.dialects.postgresql import ARRAY
+from typing import Dict, List, Optional, Tuple
+from models import InventoryLedger
+from enums import InventoryReason
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Registra en el ledger un movimiento por dosis confirmada y descuenta del stock solo las que
+# se insertaron: el índice único ux_inventory_ledger_dose_taken hace que una instancia descuente
+# su dosis una sola vez aunque lleguen confirmaciones concurrentes (la segunda espera a la
+# primera y no inserta nada). Cada medicamento se actualiza con un único UPDATE condicional
+# (sin leer la fila), solo si alcanza el stock; applied indica si se descontó
+_CONSUME_DOSES_SQL = text("""
+WITH inserted AS (
+    INSERT INTO inventory_ledger (medicine_id, reminder_instance_id, delta, reason)
+    SELECT d.medicine_id, d.reminder_instance_id, -COALESCE(m.tablets_per_dose, 1), :reason
+    FROM unnest(:instance_ids, :medicine_ids) AS d(reminder_instance_id, medicine_id)
+    JOIN medicines m ON m.id = d.medicine_id
+    ON CONFLICT (reminder_instance_id) WHERE reason = 'dose_taken' DO NOTHING
+    RETURNING id, medicine_id, delta
+),
+demand AS (
+    SELECT medicine_id, -SUM(delta) AS tablets
+    FROM inserted
+    GROUP BY medicine_id
+),
+consumed AS (
+    UPDATE medicines m
+    SET tablets_left = m.tablets_left - demand.tablets
+    FROM demand
+    WHERE m.id = demand.medicine_id
+      AND m.tablets_left >= demand.tablets
+    RETURNING m.id
+)
+SELECT inserted.id, inserted.medicine_id, inserted.delta, consumed.id IS NOT NULL AS applied
+FROM inserted
+LEFT JOIN consumed ON consumed.id = inserted.medicine_id
+""").bindparams(
+    bindparam("instance_ids", type_=ARRAY(Integer)),
+    bindparam("medicine_ids", type_=ARRAY(Integer))
+)
+
+# Recalcula tablets_left como la suma de los movimientos del ledger
+_REBUILD_STOCK_SQL = """
+UPDATE medicines m
+SET tablets_left = stock.total
+FROM (
+    SELECT medicine_id, SUM(delta) AS total
+    FROM inventory_ledger
+    {medicine_filter}
+    GROUP BY medicine_id
+) stock
+WHERE m.id = stock.medicine_id
+  AND m.tablets_left IS DISTINCT FROM stock.total
+"""
+
+
+class InventoryService:
+    @staticmethod
+    def record(
+        db: Session,
+        medicine_id: int,
+        delta: int,
+        reason: InventoryReason,
+        reminder_instance_id: Optional[int] = None
+    ):
+        """Agrega un movimiento al ledger, sin commit (queda en la transacción del llamador)"""
+        if not delta:
+            return
+        db.execute(
+            insert(InventoryLedger).values(
+                medicine_id=medicine_id,
+                reminder_instance_id=reminder_instance_id,
+                delta=delta,
+                reason=reason.value
+            )
+        )
+
+    @staticmethod
+    def consume_doses(db: Session, doses: List[Tuple[int, int]]) -> Dict[int, int]:
+        """
+        Descuenta las dosis confirmadas, dadas como pares (reminder_instance_id, medicine_id).
+
+        Primero se insertan los movimientos del ledger (ON CONFLICT DO NOTHING sobre
+        ux_inventory_ledger_dose_taken): una instancia que ya descontó su dosis no vuelve a
+        descontarla, ni siquiera con confirmaciones concurrentes. Después cada medicamento se
+        actualiza con un solo UPDATE condicional (tablets_left >= dosis * tablets_per_dose) por
+        las dosis insertadas. Si el stock no alcanza (o no se lleva stock) no se descuenta nada
+        de ese medicamento y sus movimientos se borran. Sin commit.
+
+        Returns:
+            Pastillas descontadas por medicine_id
+        """
+        if not doses:
+            return {}
+
+        rows = db.execute(_CONSUME_DOSES_SQL, {
+            "instance_ids": [instance_id for instance_id, _ in doses],
+            "medicine_ids": [medicine_id for _, medicine_id in doses],
+            "reason": InventoryReason.DOSE_TAKEN.value,
+        }).all()
+
+        consumed: Dict[int, int] = {}
+        rejected_ids = []
+        for ledger_id, medicine_id, delta, applied in rows:
+            if applied:
+                consumed[medicine_id] = consumed.get(medicine_id, 0) - delta
+            else:
+                rejected_ids.append(ledger_id)
+
+        # Sin stock suficiente la dosis no se descontó: su movimiento no debe quedar en el ledger
+        if rejected_ids:
+            db.execute(delete(InventoryLedger).where(InventoryLedger.id.in_(rejected_ids)))
+
+        skipped = {medicine_id for _, medicine_id in doses} - set(consumed)
+        if skipped:
+            logger.warning(
+                f"No se descontaron dosis de los medicamentos {sorted(skipped)} "
+                f"(stock insuficiente, sin stock registrado o ya descontadas)"
+            )
+        return consumed
+
+    @staticmethod
+    def rebuild_stock(db: Session, medicine_ids: Optional[List[int]] = None) -> int:
+        """
+        Recalcula en bloque tablets_left desde el ledger (todos los medicamentos con
+        movimientos, o solo medicine_ids).
+
+        Returns:
+            Cantidad de medicamentos cuyo stock cambió
+        """
+        medicine_filter = "WHERE medicine_id = ANY(:medicine_ids)" if medicine_ids is not None else ""
+        stmt = text(_REBUILD_STOCK_SQL.format(medicine_filter=medicine_filter))
+        params = {}
+        if medicine_ids is not None:
+            stmt = stmt.bindparams(bindparam("medicine_ids", type_=ARRAY(Integer)))
+            params["medicine_ids"] = list(medicine_ids)
+
+        try:
+            updated = db.execute(stmt, params).rowcount
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        logger.info(f"Stock recalculado desde el ledger: {updated} medicamentos actualizados")
+        return updated
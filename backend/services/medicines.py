@@ -1,16 +1,22 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import text
+from sqlalchemy import text, update, func
 from typing import List, Optional
 from models import Medicine, ElderlyProfile  # Importar ElderlyProfile para que esté en metadata
 from dtos.medicines import MedicineCreate, MedicineUpdate
+from services.inventory import InventoryService
+from enums import InventoryReason
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (Medicine.id,)
 
 
 class MedicineService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Medicine]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Medicine]:
         """Obtener todos los medicamentos con paginación"""
-        return db.query(Medicine).offset(skip).limit(limit).all()
+        return paginate(db.query(Medicine), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, medicine_id: int) -> Optional[Medicine]:
@@ -43,6 +49,9 @@ class MedicineService:
         
         try:
             result = db.execute(text(query), params)
+            # Stock inicial en el ledger, en la misma transacción
+            if data.get('tablets_left') is not None:
+                InventoryService.record(db, medicine_id, data['tablets_left'], InventoryReason.INITIAL)
             db.commit()
             # Obtener el medicamento creado
             medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
@@ -61,16 +70,36 @@ class MedicineService:
     def update(
         db: Session, medicine_id: int, medicine_data: MedicineUpdate
     ) -> Optional[Medicine]:
-        """Actualizar un medicamento existente"""
-        medicine = db.query(Medicine).filter(Medicine.id == medicine_id).first()
+        """
+        Actualizar un medicamento existente.
+
+        Un cambio manual de stock se aplica como ajuste relativo
+        (tablets_left = tablets_left + delta) sobre la fila bloqueada, y ese mismo delta queda en
+        el ledger: las dosis descontadas en paralelo no se pisan ni desalinean el ledger.
+        """
+        update_data = medicine_data.model_dump(exclude_unset=True)
+        tablets_left = update_data.pop('tablets_left', None)
+
+        query = db.query(Medicine).filter(Medicine.id == medicine_id)
+        if tablets_left is not None:
+            query = query.with_for_update()
+        medicine = query.first()
         if not medicine:
             return None
 
-        update_data = medicine_data.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(medicine, field, value)
 
         try:
+            if tablets_left is not None and tablets_left != medicine.tablets_left:
+                stock_delta = tablets_left - (medicine.tablets_left or 0)
+                db.execute(
+                    update(Medicine)
+                    .where(Medicine.id == medicine_id)
+                    .values(tablets_left=func.coalesce(Medicine.tablets_left, 0) + stock_delta)
+                    .execution_options(synchronize_session=False)
+                )
+                InventoryService.record(db, medicine_id, stock_delta, InventoryReason.ADJUSTMENT)
             db.commit()
             db.refresh(medicine)
             return medicine
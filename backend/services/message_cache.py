@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+import threading
+import time
+
+
+class MessageCache:
+    """
+    Cache en memoria de mensajes generados, con TTL y desalojo LRU acotado por tamaño.
+    Es thread-safe porque se usa tanto desde el event loop como desde los threads de Gemini.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Obtener un mensaje vigente; lo marca como usado recientemente"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, message = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return message
+
+    def set(self, key: Hashable, message: str):
+        """Guardar un mensaje, desalojando los menos usados si se supera el tamaño máximo"""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, message)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def contains(self, key: Hashable) -> bool:
+        """Indica si hay un mensaje vigente para la clave (sin contar hit/miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
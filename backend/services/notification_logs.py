@@ -1,15 +1,22 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from sqlalchemy import select
+from typing import List, Optional, Tuple
 from models import NotificationLog, ReminderInstance
 from dtos.notification_logs import NotificationLogCreate, NotificationLogUpdate
+from services.bulk_update import bulk_update_statements
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (NotificationLog.id,)
 
 
 class NotificationLogService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[NotificationLog]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[NotificationLog]:
         """Obtener todos los logs de notificaciones con paginación"""
-        return db.query(NotificationLog).offset(skip).limit(limit).all()
+        return paginate(db.query(NotificationLog), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, log_id: int) -> Optional[NotificationLog]:
@@ -26,6 +33,33 @@ class NotificationLogService:
         """Obtener todos los logs de notificaciones por estado"""
         return db.query(NotificationLog).filter(NotificationLog.status == status).all()
 
+    @staticmethod
+    async def get_all_async(
+        db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[NotificationLog]:
+        """Versión asíncrona de get_all"""
+        result = await db.execute(paginate(select(NotificationLog), PAGINATION_KEY, skip, limit, cursor))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_by_id_async(db: AsyncSession, log_id: int) -> Optional[NotificationLog]:
+        """Versión asíncrona de get_by_id"""
+        return await db.get(NotificationLog, log_id)
+
+    @staticmethod
+    async def get_by_reminder_instance_id_async(db: AsyncSession, reminder_instance_id: int) -> List[NotificationLog]:
+        """Versión asíncrona de get_by_reminder_instance_id"""
+        result = await db.execute(
+            select(NotificationLog).where(NotificationLog.reminder_instance_id == reminder_instance_id)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_by_status_async(db: AsyncSession, status: str) -> List[NotificationLog]:
+        """Versión asíncrona de get_by_status"""
+        result = await db.execute(select(NotificationLog).where(NotificationLog.status == status))
+        return list(result.scalars().all())
+
     @staticmethod
     def create(db: Session, log_data: NotificationLogCreate) -> NotificationLog:
         """Crear un nuevo log de notificación"""
@@ -74,6 +108,54 @@ class NotificationLogService:
             db.rollback()
             raise ValueError(f"Error inesperado al actualizar el log de notificación: {str(e)}")
 
+    @staticmethod
+    def bulk_update(
+        db: Session, updates: List[Tuple[int, NotificationLogUpdate]], commit: bool = True
+    ) -> int:
+        """
+        Aplica muchos cambios (id, datos) con UPDATE ... FROM (VALUES ...), sin cargar ni
+        refrescar objetos ORM. Con commit=False los cambios quedan en la transacción del llamador.
+        Retorna la cantidad de filas actualizadas.
+        """
+        statements = bulk_update_statements(
+            NotificationLog, [(row_id, data.model_dump(exclude_unset=True)) for row_id, data in updates]
+        )
+        try:
+            updated = sum(db.execute(stmt).rowcount for stmt in statements)
+            if commit:
+                db.commit()
+            return updated
+        except IntegrityError as e:
+            db.rollback()
+            error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
+            raise ValueError(f"Error al actualizar los logs de notificación: {error_msg}")
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Error inesperado al actualizar los logs de notificación: {str(e)}")
+
+    @staticmethod
+    async def bulk_update_async(
+        db: AsyncSession, updates: List[Tuple[int, NotificationLogUpdate]], commit: bool = True
+    ) -> int:
+        """Versión asíncrona de bulk_update"""
+        statements = bulk_update_statements(
+            NotificationLog, [(row_id, data.model_dump(exclude_unset=True)) for row_id, data in updates]
+        )
+        try:
+            updated = 0
+            for stmt in statements:
+                updated += (await db.execute(stmt)).rowcount
+            if commit:
+                await db.commit()
+            return updated
+        except IntegrityError as e:
+            await db.rollback()
+            error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
+            raise ValueError(f"Error al actualizar los logs de notificación: {error_msg}")
+        except Exception as e:
+            await db.rollback()
+            raise ValueError(f"Error inesperado al actualizar los logs de notificación: {str(e)}")
+
     @staticmethod
     def delete(db: Session, log_id: int) -> bool:
         """Eliminar un log de notificación"""
@@ -0,0 +1,495 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, exists, select, update, delete, insert, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any, Tuple
+from models import NotificationOutbox, NotificationLog, ReminderInstance
+from enums import OutboxStatus, ReminderInstanceStatus
+from integrations.kapso import send_whatsapp_message
+from integrations.twilio import create_call
+from services.reminder_call_service import ReminderCallService, WORKER_ID, CLAIM_LEASE_SECONDS
+from services.reminder_instances import ReminderInstanceService
+from services.notification_logs import NotificationLogService
+from dtos.reminder_instances import ReminderInstanceUpdate
+from dtos.notification_logs import NotificationLogUpdate
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Entradas del outbox que toma el relay por lote
+OUTBOX_BATCH_SIZE = int(os.getenv('NOTIFICATION_OUTBOX_BATCH_SIZE', '100'))
+
+WHATSAPP_OUTBOX_CHANNEL = "whatsapp"
+CALL_OUTBOX_CHANNEL = "call"
+# Aviso por WhatsApp al contacto familiar; no cambia el estado de la instancia
+FAMILY_OUTBOX_CHANNEL = "family"
+
+
+class NotificationOutboxService:
+    @staticmethod
+    def idempotency_key(channel: str, reminder_instance: ReminderInstance) -> str:
+        """Una notificación por canal, instancia e intento"""
+        return f"{channel}:{reminder_instance.id}:{reminder_instance.retry_count or 0}"
+
+    @staticmethod
+    def enqueue(
+        db: Session,
+        reminder_instance: ReminderInstance,
+        channel: str,
+        recipient: str,
+        payload: Dict[str, Any]
+    ) -> Optional[NotificationOutbox]:
+        """
+        Registra el NotificationLog (pending) y la entrada del outbox y pasa la instancia a queued
+        (libera su claim), todo en la transacción actual y con un único commit. Así ni el claim de
+        llamadas ni la recuperación de slots vuelven a tomarla mientras espera al relay (drain).
+
+        Si la notificación ya estaba encolada (misma idempotency_key), o la instancia ya no está
+        pending (p.ej. la confirmó un webhook mientras se preparaba el envío), solo se deshace lo
+        de este encolado (SAVEPOINT), sin commit ni rollback del resto de la transacción, y
+        retorna None.
+        """
+        try:
+            savepoint = db.begin_nested()
+            queued = db.execute(
+                update(ReminderInstance)
+                .where(
+                    and_(
+                        ReminderInstance.id == reminder_instance.id,
+                        ReminderInstance.status == ReminderInstanceStatus.PENDING.value
+                    )
+                )
+                .values(status=ReminderInstanceStatus.QUEUED.value, claimed_by=None, lease_expires_at=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not queued:
+                savepoint.rollback()
+                logger.info(f"reminder_instance {reminder_instance.id} ya no está pending; no se encola {channel}")
+                return None
+
+            notification_log = NotificationLog(
+                reminder_instance_id=reminder_instance.id,
+                notification_type=channel,
+                recepient_phone=recipient,
+                status="pending",
+                sent_at=datetime.now()
+            )
+            db.add(notification_log)
+            db.flush()
+
+            stmt = (
+                pg_insert(NotificationOutbox)
+                .values(
+                    idempotency_key=NotificationOutboxService.idempotency_key(channel, reminder_instance),
+                    reminder_instance_id=reminder_instance.id,
+                    notification_log_id=notification_log.id,
+                    channel=channel,
+                    recipient=recipient,
+                    payload=payload,
+                    status=OutboxStatus.PENDING.value,
+                    attempts=0
+                )
+                .on_conflict_do_nothing(index_elements=[NotificationOutbox.idempotency_key])
+                .returning(NotificationOutbox.id)
+            )
+            outbox_id = db.execute(stmt).scalar()
+            if outbox_id is None:
+                savepoint.rollback()
+                logger.info(f"Notificación {channel} de reminder_instance {reminder_instance.id} ya estaba encolada")
+                return None
+            savepoint.commit()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return db.query(NotificationOutbox).filter(NotificationOutbox.id == outbox_id).first()
+
+    @staticmethod
+    def enqueue_many(db: Session, entries: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
+        """
+        Versión en bloque de enqueue para muchas notificaciones: inserta los NotificationLog y
+        las entradas del outbox con un INSERT por tabla, sin commit (queda en la transacción del
+        llamador). Cada entrada trae reminder_instance_id, channel, recipient, payload e
+        idempotency_key.
+
+        Returns:
+            Pares (reminder_instance_id, outbox_id) de las entradas encoladas; las que ya
+            estaban encoladas (misma idempotency_key) se omiten
+        """
+        if not entries:
+            return []
+
+        now = datetime.now()
+        log_ids = db.execute(
+            insert(NotificationLog).returning(NotificationLog.id, sort_by_parameter_order=True),
+            [
+                {
+                    "reminder_instance_id": entry["reminder_instance_id"],
+                    "notification_type": entry["channel"],
+                    "recepient_phone": entry["recipient"],
+                    "status": "pending",
+                    "sent_at": now
+                }
+                for entry in entries
+            ]
+        ).scalars().all()
+
+        rows = db.execute(
+            pg_insert(NotificationOutbox)
+            .values([
+                {
+                    "idempotency_key": entry["idempotency_key"],
+                    "reminder_instance_id": entry["reminder_instance_id"],
+                    "notification_log_id": log_id,
+                    "channel": entry["channel"],
+                    "recipient": entry["recipient"],
+                    "payload": entry["payload"],
+                    "status": OutboxStatus.PENDING.value,
+                    "attempts": 0
+                }
+                for entry, log_id in zip(entries, log_ids)
+            ])
+            .on_conflict_do_nothing(index_elements=[NotificationOutbox.idempotency_key])
+            .returning(NotificationOutbox.reminder_instance_id, NotificationOutbox.id, NotificationOutbox.notification_log_id)
+        ).all()
+
+        # Los logs de las entradas que ya estaban encoladas quedaron huérfanos
+        used_log_ids = {notification_log_id for _, _, notification_log_id in rows}
+        orphan_log_ids = [log_id for log_id in log_ids if log_id not in used_log_ids]
+        if orphan_log_ids:
+            db.execute(delete(NotificationLog).where(NotificationLog.id.in_(orphan_log_ids)))
+
+        return [(reminder_instance_id, outbox_id) for reminder_instance_id, outbox_id, _ in rows]
+
+    @staticmethod
+    def claim_batch(
+        db: Session,
+        worker_id: str = WORKER_ID,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        lease_seconds: int = CLAIM_LEASE_SECONDS
+    ) -> List[Dict[str, Any]]:
+        """
+        Toma un lote de entradas pending con FOR UPDATE SKIP LOCKED y las marca como sending.
+        Antes aparta como uncertain las que quedaron en sending con el lease vencido (park_expired).
+        """
+        now = datetime.now()
+        claimable = (
+            select(NotificationOutbox.id)
+            .where(NotificationOutbox.status == OutboxStatus.PENDING.value)
+            .order_by(NotificationOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(claimable.scalar_subquery()))
+            .values(
+                status=OutboxStatus.SENDING.value,
+                claimed_by=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=NotificationOutbox.attempts + 1
+            )
+            .returning(
+                NotificationOutbox.id,
+                NotificationOutbox.reminder_instance_id,
+                NotificationOutbox.notification_log_id,
+                NotificationOutbox.channel,
+                NotificationOutbox.recipient,
+                NotificationOutbox.payload
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        try:
+            NotificationOutboxService.park_expired(db, now)
+            entries = [dict(row) for row in db.execute(stmt).mappings().all()]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return entries
+
+    @staticmethod
+    def due_exists(now: datetime):
+        """
+        Condición EXISTS: el relay tiene trabajo (entradas pending, o en sending con el lease
+        vencido para apartar). Se resuelve sobre ix_notification_outbox_open.
+        """
+        return exists().where(
+            or_(
+                NotificationOutbox.status == OutboxStatus.PENDING.value,
+                and_(
+                    NotificationOutbox.status == OutboxStatus.SENDING.value,
+                    NotificationOutbox.lease_expires_at < now
+                )
+            )
+        )
+
+    @staticmethod
+    def park_expired(db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Aparta como uncertain (sin commit) las entradas que siguen en sending con el lease vencido.
+
+        El worker que las tomó murió o se colgó, tal vez después de que el proveedor aceptara
+        el envío: reenviarlas podría duplicar el WhatsApp o la llamada, y ni Kapso ni Twilio
+        aceptan una clave de idempotencia que lo evite. Quedan para conciliar (su log pasa a
+        uncertain); si el worker original termina, _apply_outcomes igual aplica su resultado.
+        """
+        now = now or datetime.now()
+        error = "Lease vencido durante el envío: no se sabe si el proveedor lo recibió"
+        parked = db.execute(
+            update(NotificationOutbox)
+            .where(
+                and_(
+                    NotificationOutbox.status == OutboxStatus.SENDING.value,
+                    NotificationOutbox.lease_expires_at < now
+                )
+            )
+            .values(status=OutboxStatus.UNCERTAIN.value, last_error=error)
+            .returning(NotificationOutbox.id, NotificationOutbox.notification_log_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not parked:
+            return 0
+
+        db.execute(
+            update(NotificationLog)
+            .where(NotificationLog.id.in_([notification_log_id for _, notification_log_id in parked]))
+            .values(status=OutboxStatus.UNCERTAIN.value, error_message=error)
+            .execution_options(synchronize_session=False)
+        )
+        logger.warning(
+            f"Outbox: {len(parked)} entradas quedaron en sending con el lease vencido y se apartan "
+            f"como uncertain para conciliar: {[outbox_id for outbox_id, _ in parked]}"
+        )
+        return len(parked)
+
+    @staticmethod
+    async def _deliver(entry: Dict[str, Any], limits: Dict[str, asyncio.Semaphore]) -> Dict[str, Any]:
+        """Envía una entrada al proveedor; no toca la base de datos"""
+        outcome = {"entry": entry, "success": False, "provider_id": None, "error": None}
+        payload = entry["payload"]
+        try:
+            if entry["channel"] in (WHATSAPP_OUTBOX_CHANNEL, FAMILY_OUTBOX_CHANNEL):
+                async with limits["kapso"]:
+                    response = await send_whatsapp_message(
+                        to=entry["recipient"],
+                        body_text=payload["body_text"],
+                        buttons=payload["buttons"]
+                    )
+                # La estructura es: {"messages": [{"id": "wamid.xxx"}]}
+                messages = response.get("messages") or []
+                outcome["provider_id"] = messages[0].get("id") if messages else None
+            elif entry["channel"] == CALL_OUTBOX_CHANNEL:
+                outcome["provider_id"] = await ReminderCallService._run_blocking(
+                    limits, "twilio", create_call,
+                    entry["recipient"], payload["message"],
+                    webhook_url=payload.get("webhook_url"),
+                    reminder_instance_id=entry["reminder_instance_id"]
+                )
+            else:
+                raise ValueError(f"Canal de notificación desconocido: {entry['channel']}")
+            outcome["success"] = True
+        except Exception as e:
+            outcome["error"] = f"Error al enviar {entry['channel']}: {str(e)}"
+            logger.error(outcome["error"])
+        return outcome
+
+    @staticmethod
+    def _value_by_id(values: Dict[int, Any], id_column, default):
+        """CASE id WHEN ... THEN ... con un valor por fila; sin valores se usa default"""
+        if not values:
+            return default
+        return case(values, value=id_column, else_=default)
+
+    @staticmethod
+    def _apply_outcomes(db: Session, outcomes: List[Dict[str, Any]], worker_id: str = WORKER_ID) -> List[int]:
+        """
+        Aplica los resultados de un lote en una sola transacción: una sentencia por tabla y tipo
+        de cambio (outbox, reminder_instances, notification_logs) en vez de un commit por fila.
+
+        Solo se aplican los resultados de las entradas que este worker sigue teniendo tomadas.
+        Una entrada apartada como uncertain (lease vencido) sigue siendo suya: si el envío
+        terminó, su resultado resuelve la incertidumbre. La instancia solo pasa a waiting/failure
+        si sigue queued: si entretanto un webhook la confirmó (el message_id del intento anterior
+        sigue sirviendo), esa respuesta no se pisa.
+        Retorna los ids del outbox aplicados.
+        """
+        if not outcomes:
+            return []
+
+        now = datetime.now()
+        by_id = {outcome["entry"]["id"]: outcome for outcome in outcomes}
+        status_by_id = {
+            outbox_id: OutboxStatus.SENT.value if outcome["success"] else OutboxStatus.FAILED.value
+            for outbox_id, outcome in by_id.items()
+        }
+        error_by_id = {outbox_id: outcome["error"] for outbox_id, outcome in by_id.items() if outcome["error"]}
+
+        try:
+            applied_ids = db.execute(
+                update(NotificationOutbox)
+                .where(
+                    and_(
+                        NotificationOutbox.id.in_(list(by_id)),
+                        NotificationOutbox.status.in_([OutboxStatus.SENDING.value, OutboxStatus.UNCERTAIN.value]),
+                        NotificationOutbox.claimed_by == worker_id
+                    )
+                )
+                .values(
+                    status=case(status_by_id, value=NotificationOutbox.id),
+                    last_error=NotificationOutboxService._value_by_id(error_by_id, NotificationOutbox.id, None),
+                    sent_at=NotificationOutboxService._value_by_id(
+                        {outbox_id: now for outbox_id, status in status_by_id.items() if status == OutboxStatus.SENT.value},
+                        NotificationOutbox.id,
+                        None
+                    ),
+                    lease_expires_at=None
+                )
+                .returning(NotificationOutbox.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+
+            applied = [by_id[outbox_id] for outbox_id in applied_ids]
+
+            instance_updates = []
+            log_updates = []
+            for outcome in applied:
+                entry = outcome["entry"]
+                if entry["channel"] == FAMILY_OUTBOX_CHANNEL:
+                    # El aviso a la familia solo queda en su log; la instancia ya tiene family_notified
+                    log_updates.append((
+                        entry["notification_log_id"],
+                        NotificationLogUpdate(status="sent", sent_at=now, response=str(outcome["provider_id"]))
+                        if outcome["success"]
+                        else NotificationLogUpdate(status="failed", error_message=outcome["error"])
+                    ))
+                    continue
+                if outcome["success"]:
+                    # WhatsApp guarda el message_id (lo usan los webhooks); las llamadas el Call SID en el log
+                    if entry["channel"] == WHATSAPP_OUTBOX_CHANNEL:
+                        instance_update = ReminderInstanceUpdate(
+                            status=ReminderInstanceStatus.WAITING.value,
+                            message_id=str(outcome["provider_id"])
+                        )
+                        log_update = NotificationLogUpdate(status="sent", sent_at=now)
+                    else:
+                        instance_update = ReminderInstanceUpdate(status=ReminderInstanceStatus.WAITING.value)
+                        log_update = NotificationLogUpdate(
+                            status="sent", sent_at=now, response=f"Call SID: {outcome['provider_id']}"
+                        )
+                else:
+                    instance_update = ReminderInstanceUpdate(status=ReminderInstanceStatus.FAILURE.value)
+                    log_update = NotificationLogUpdate(status="failed", error_message=outcome["error"])
+                instance_updates.append((entry["reminder_instance_id"], instance_update))
+                log_updates.append((entry["notification_log_id"], log_update))
+
+            ReminderInstanceService.bulk_update(
+                db, instance_updates, commit=False, only_status=[ReminderInstanceStatus.QUEUED.value]
+            )
+            NotificationLogService.bulk_update(db, log_updates, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return list(applied_ids)
+
+    @staticmethod
+    async def drain(
+        db: Session,
+        limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE
+    ) -> Dict:
+        """
+        Relay del outbox: toma lotes, los envía concurrentemente (acotado por los semáforos de
+        cada proveedor) y aplica los resultados del lote de una vez, hasta vaciar el outbox.
+
+        Returns:
+            Diccionario con estadísticas del envío (de todos los canales) y, en deliveries, el
+            resultado de cada entrega aplicada
+        """
+        limits = limits or ReminderCallService._provider_limits()
+        results = {
+            "processed": 0,
+            "successful": 0,
+            "failed": 0,
+            "errors": [],
+            "deliveries": []
+        }
+
+        while True:
+            # Claim y aplicación de resultados son consultas síncronas: corren en un thread
+            entries = await asyncio.to_thread(NotificationOutboxService.claim_batch, db, batch_size=batch_size)
+            if not entries:
+                break
+
+            outcomes = await asyncio.gather(*(
+                NotificationOutboxService._deliver(entry, limits) for entry in entries
+            ))
+            applied_ids = set(await asyncio.to_thread(NotificationOutboxService._apply_outcomes, db, outcomes))
+
+            for outcome in outcomes:
+                if outcome["entry"]["id"] not in applied_ids:
+                    continue
+                results["processed"] += 1
+                results["deliveries"].append({
+                    "reminder_instance_id": outcome["entry"]["reminder_instance_id"],
+                    "channel": outcome["entry"]["channel"],
+                    "success": outcome["success"],
+                    "provider_id": outcome["provider_id"],
+                    "error": outcome["error"]
+                })
+                if outcome["success"]:
+                    results["successful"] += 1
+                else:
+                    results["failed"] += 1
+                    results["errors"].append({
+                        "reminder_instance_id": outcome["entry"]["reminder_instance_id"],
+                        "error": outcome["error"]
+                    })
+
+            if len(entries) < batch_size:
+                break
+
+        if results["processed"]:
+            logger.info(
+                f"Outbox: {results['processed']} enviados, "
+                f"{results['successful']} exitosos, {results['failed']} fallidos"
+            )
+        return results
+
+    @staticmethod
+    def settle_enqueued(
+        results: Dict,
+        enqueued: Dict[int, Dict],
+        delivery: Dict,
+        channel: str,
+        error_key: str = "reminder_instance_id",
+        provider_key: str = "provider_id"
+    ):
+        """
+        Completa las estadísticas de un proceso que encoló notificaciones con el envío del relay.
+
+        successful/failed solo cuentan las entregas de channel que encoló este mismo proceso
+        (enqueued: reminder_instance_id -> resultado del encolado, al que se le agrega
+        provider_key). Las que no se enviaron en este drain (las tomó otro relay) quedan en
+        queued, así processed == successful + failed + queued. Las estadísticas del relay
+        completo (todos los canales, también lo encolado antes) quedan en results["delivery"].
+        """
+        for entry in delivery["deliveries"]:
+            result = enqueued.pop(entry["reminder_instance_id"], None) if entry["channel"] == channel else None
+            if result is None:
+                continue
+            result[provider_key] = entry["provider_id"]
+            if entry["success"]:
+                results["successful"] += 1
+            else:
+                results["failed"] += 1
+                results["errors"].append({error_key: result[error_key], "error": entry["error"]})
+
+        results["queued"] = len(enqueued)
+        results["delivery"] = {key: delivery[key] for key in ("processed", "successful", "failed")}
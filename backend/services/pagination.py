@@ -0,0 +1,86 @@
+from sqlalchemy import tuple_
+from fastapi import Response
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+import base64
+import json
+
+# Header con el cursor de la página siguiente (ausente en la última página)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Codifica los valores de la clave de orden de la última fila como un cursor opaco"""
+    payload = [{"dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _cursor_value(value: Any, column) -> Any:
+    """Valor del cursor para una columna de la clave; lanza ValueError si no es de su tipo"""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+
+    if python_type is datetime:
+        if not isinstance(value, dict) or set(value) != {"dt"} or not isinstance(value["dt"], str):
+            raise ValueError
+        return datetime.fromisoformat(value["dt"])
+    if python_type is int:
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError
+        return value
+    if python_type is not None and not isinstance(value, python_type):
+        raise ValueError
+    if isinstance(value, (dict, list)):
+        raise ValueError
+    return value
+
+
+def decode_cursor(cursor: str, key_columns: Sequence) -> List[Any]:
+    """
+    Decodifica un cursor de encode_cursor para las columnas key_columns; lanza ValueError si no
+    es válido o si algún valor no es del tipo de su columna (int para un id, {"dt": ...} para
+    una fecha), en vez de dejar que la comparación falle en la base de datos.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(key_columns):
+            raise ValueError
+        return [_cursor_value(value, column) for value, column in zip(payload, key_columns)]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Cursor de paginación inválido")
+
+
+def paginate(query, key_columns: Sequence, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """
+    Ordena una query (Query o select) por key_columns (únicas en conjunto, la última es el id)
+    y aplica la página: con cursor es keyset (WHERE (claves) > (cursor)), que cuesta lo mismo
+    en cualquier página; sin cursor se mantiene offset(skip) por compatibilidad.
+    """
+    query = query.order_by(*key_columns)
+    if cursor:
+        values = decode_cursor(cursor, key_columns)
+        if len(key_columns) == 1:
+            query = query.where(key_columns[0] > values[0])
+        else:
+            query = query.where(tuple_(*key_columns) > tuple_(*values))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def next_cursor(items: Sequence[Any], limit: int, *key_attributes: str) -> Optional[str]:
+    """Cursor de la página siguiente a partir de la última fila; None si la página no está llena"""
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor([getattr(last, attribute) for attribute in key_attributes])
+
+
+def set_next_cursor(response: Response, items: Sequence[Any], limit: int, *key_attributes: str):
+    """Agrega el header X-Next-Cursor a la respuesta si hay una página siguiente"""
+    cursor = next_cursor(items, limit, *key_attributes)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
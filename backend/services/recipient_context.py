@@ -0,0 +1,110 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Dict, Iterable, Optional
+from models import Reminder, Medicine, Appointment, ElderlyProfile, User
+from dtos.recipients import RecipientContext
+from services.reference_cache import ReferenceCache
+
+
+class RecipientContextService:
+    @staticmethod
+    def resolve(
+        db: Session, reminder_ids: Iterable[int], cache: Optional[ReferenceCache] = None
+    ) -> Dict[int, RecipientContext]:
+        """
+        Resuelve en una sola consulta los datos de envío (teléfono, emergency_contact, nombre
+        del adulto mayor, medicamento y dosis) de un lote de reminders.
+
+        El adulto mayor se obtiene de elderly_profile_id, o si no de la cita, o si no del
+        medicamento (medicines.id es FK a elderly_profiles.id).
+
+        Con una ReferenceCache del tick, Medicine, ElderlyProfile y User se leen de la cache
+        (precargando en bloque solo los que faltan) en vez de repetirse en cada lote.
+
+        Returns:
+            Diccionario reminder_id -> RecipientContext; los reminders inexistentes no aparecen
+        """
+        reminder_ids = list(set(reminder_ids))
+        if not reminder_ids:
+            return {}
+
+        if cache is not None:
+            return RecipientContextService._resolve_cached(db, reminder_ids, cache)
+
+        elderly_id = func.coalesce(Reminder.elderly_profile_id, Appointment.elderly_id, Medicine.id)
+        rows = (
+            db.query(
+                Reminder.id,
+                Reminder.reminder_type,
+                Reminder.medicine,
+                Reminder.appointment_id,
+                ElderlyProfile.id,
+                User.phone,
+                ElderlyProfile.emergency_contact,
+                User.full_name,
+                Medicine.name,
+                Medicine.dosage,
+                Medicine.tablets_per_dose
+            )
+            .outerjoin(Medicine, Medicine.id == Reminder.medicine)
+            .outerjoin(Appointment, Appointment.id == Reminder.appointment_id)
+            .outerjoin(ElderlyProfile, ElderlyProfile.id == elderly_id)
+            .outerjoin(User, User.id == ElderlyProfile.id)
+            .filter(Reminder.id.in_(reminder_ids))
+            .all()
+        )
+
+        return {
+            row[0]: RecipientContext(
+                reminder_id=row[0],
+                reminder_type=row[1],
+                medicine_id=row[2],
+                appointment_id=row[3],
+                elderly_profile_id=row[4],
+                phone=row[5],
+                emergency_contact=row[6],
+                elderly_name=row[7],
+                medicine_name=row[8],
+                dosage=row[9],
+                tablets_per_dose=row[10]
+            )
+            for row in rows
+        }
+
+    @staticmethod
+    def _resolve_cached(db: Session, reminder_ids: list, cache: ReferenceCache) -> Dict[int, RecipientContext]:
+        """Variante de resolve que toma los datos de referencia de la cache del tick"""
+        elderly_id = func.coalesce(Reminder.elderly_profile_id, Appointment.elderly_id, Reminder.medicine)
+        reminders = (
+            db.query(Reminder.id, Reminder.reminder_type, Reminder.medicine, Reminder.appointment_id, elderly_id)
+            .outerjoin(Appointment, Appointment.id == Reminder.appointment_id)
+            .filter(Reminder.id.in_(reminder_ids))
+            .all()
+        )
+
+        # Un SELECT por tabla solo con los ids que aún no están en la cache; las filas recién
+        # consultadas no cuentan como hit al leerlas
+        fetched_medicines = cache.prefetch(db, Medicine, {medicine_id for _, _, medicine_id, _, _ in reminders})
+        elderly_ids = {profile_id for _, _, _, _, profile_id in reminders}
+        fetched_profiles = cache.prefetch(db, ElderlyProfile, elderly_ids)
+        fetched_users = cache.prefetch(db, User, elderly_ids)
+
+        contexts = {}
+        for reminder_id, reminder_type, medicine_id, appointment_id, profile_id in reminders:
+            medicine = cache.get(db, Medicine, medicine_id, fetched_medicines)
+            profile = cache.get(db, ElderlyProfile, profile_id, fetched_profiles)
+            user = cache.get(db, User, profile.id, fetched_users) if profile else None
+            contexts[reminder_id] = RecipientContext(
+                reminder_id=reminder_id,
+                reminder_type=reminder_type,
+                medicine_id=medicine_id,
+                appointment_id=appointment_id,
+                elderly_profile_id=profile.id if profile else None,
+                phone=user.phone if user else None,
+                emergency_contact=profile.emergency_contact if profile else None,
+                elderly_name=user.full_name if user else None,
+                medicine_name=medicine.name if medicine else None,
+                dosage=medicine.dosage if medicine else None,
+                tablets_per_dose=medicine.tablets_per_dose if medicine else None
+            )
+        return contexts
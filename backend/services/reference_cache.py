@@ -0,0 +1,70 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+
+class ReferenceCache:
+    """
+    Cache de lectura de datos de referencia (Medicine, ElderlyProfile, User) con alcance de un
+    tick del despacho: cada fila se carga a lo sumo una vez por tick aunque varios reminders
+    del mismo paciente la necesiten.
+
+    Guarda filas de Core (acceso por atributo, sin identity map de la sesión), así que no
+    expiran con los commits del tick y se pueden usar desde tareas con su propia sesión.
+    No es thread-safe: la usa un solo tick a la vez (sus consultas corren en threads, de a una)
+    y se descarta al terminar.
+    """
+
+    def __init__(self):
+        # (tabla, id) -> fila, o None si la fila no existe (también se cachea la ausencia)
+        self._rows: Dict[Tuple[str, int], Optional[Any]] = {}
+        # hits: lecturas de filas que ya estaban en cache; misses: filas que hubo que consultar
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, db: Session, model, ids: Iterable[int]) -> Set[int]:
+        """
+        Carga con un solo SELECT ... WHERE id IN (...) las filas de model que aún no están en
+        cache. Retorna los ids consultados (cada uno cuenta como un miss).
+        """
+        table = model.__table__
+        missing = {
+            row_id for row_id in ids
+            if row_id is not None and (table.name, row_id) not in self._rows
+        }
+        if not missing:
+            return missing
+
+        self.misses += len(missing)
+        rows = db.execute(select(table).where(table.c.id.in_(missing))).all()
+        for row in rows:
+            self._rows[(table.name, row.id)] = row
+        for row_id in missing:
+            self._rows.setdefault((table.name, row_id), None)
+        return missing
+
+    def get(
+        self, db: Session, model, row_id: Optional[int], prefetched: Iterable[int] = ()
+    ) -> Optional[Any]:
+        """
+        Obtiene una fila por id; si no estaba en cache se consulta y se guarda. prefetched son
+        los ids que el llamador acaba de consultar con prefetch: ya contaron como miss, así que
+        leerlos no cuenta como hit.
+        """
+        if row_id is None:
+            return None
+
+        key = (model.__table__.name, row_id)
+        if key in self._rows:
+            if row_id not in prefetched:
+                self.hits += 1
+            return self._rows[key]
+
+        self.prefetch(db, model, [row_id])
+        return self._rows[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._rows), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._rows)
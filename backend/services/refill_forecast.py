@@ -0,0 +1,184 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+from database import SessionLocal
+import numpy as np
+import threading
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Segundos tras los cuales se recarga el pronóstico completo (recoge cambios de horarios y medicamentos)
+REFILL_FORECAST_REFRESH_SECONDS = float(os.getenv('REFILL_FORECAST_REFRESH_SECONDS', '600'))
+# Días de stock por debajo de los cuales un medicamento se reporta por defecto
+REFILL_FORECAST_THRESHOLD_DAYS = float(os.getenv('REFILL_FORECAST_THRESHOLD_DAYS', '7'))
+# Horizonte máximo del pronóstico: umbral más alto aceptado y última fecha estimada que se reporta
+REFILL_FORECAST_MAX_DAYS = float(os.getenv('REFILL_FORECAST_MAX_DAYS', '3650'))
+
+MINUTES_PER_DAY = 1440
+
+# Stock, pastillas por dosis y dosis diarias (suma de 1440 / periodicity de sus reminders
+# vigentes: activos, ya empezados y sin terminar) de todos los medicamentos con stock
+# registrado, en una sola consulta
+_FORECAST_INPUTS_SQL = text("""
+SELECT m.id,
+       m.name,
+       m.tablets_left,
+       COALESCE(m.tablets_per_dose, 1) AS tablets_per_dose,
+       COALESCE(SUM(CAST(:minutes_per_day AS double precision) / r.periodicity)
+                FILTER (WHERE r.is_active IS TRUE
+                          AND r.periodicity > 0
+                          AND r.start_date <= :now
+                          AND (r.end_date IS NULL OR r.end_date >= CAST(:now AS date))), 0) AS doses_per_day
+FROM medicines m
+LEFT JOIN reminders r ON r.medicine = m.id
+WHERE m.tablets_left IS NOT NULL
+GROUP BY m.id
+""")
+
+
+class RefillForecaster:
+    """
+    Pronóstico de días hasta agotar el stock de cada medicamento, calculado con NumPy sobre
+    arreglos de stock y consumo diario: el cálculo de todos los medicamentos es una sola
+    operación vectorizada, y consultar los que están bajo un umbral es una máscara + argsort.
+
+    Los arreglos se cargan con una consulta y se recargan cada refresh_seconds; entre recargas
+    cada dosis confirmada se descuenta incrementalmente (apply_consumption). Es thread-safe
+    porque se actualiza desde el worker de webhooks (en threads) y se lee desde los endpoints.
+    """
+
+    def __init__(self, refresh_seconds: float = REFILL_FORECAST_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._names: List[str] = []
+        self._tablets_left = np.empty(0, dtype=np.float64)
+        self._tablets_per_day = np.empty(0, dtype=np.float64)
+        self._days_until_empty = np.empty(0, dtype=np.float64)
+        self._position: Dict[int, int] = {}
+
+    @staticmethod
+    def _days(tablets_left: np.ndarray, tablets_per_day: np.ndarray) -> np.ndarray:
+        """Días hasta agotar el stock; infinito si no hay consumo programado"""
+        days = np.full(tablets_left.shape, np.inf)
+        np.divide(np.maximum(tablets_left, 0), tablets_per_day, out=days, where=tablets_per_day > 0)
+        return days
+
+    def load(self, db: Session):
+        """Recarga los arreglos desde la base de datos y recalcula el pronóstico completo"""
+        rows = db.execute(_FORECAST_INPUTS_SQL, {"minutes_per_day": MINUTES_PER_DAY, "now": datetime.now()}).all()
+
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        names = [row[1] for row in rows]
+        tablets_left = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        tablets_per_dose = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+        doses_per_day = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+        tablets_per_day = tablets_per_dose * doses_per_day
+
+        with self._lock:
+            self._ids = ids
+            self._names = names
+            self._tablets_left = tablets_left
+            self._tablets_per_day = tablets_per_day
+            self._days_until_empty = RefillForecaster._days(tablets_left, tablets_per_day)
+            self._position = {int(medicine_id): index for index, medicine_id in enumerate(ids)}
+            self._loaded_at = time.monotonic()
+
+        logger.info(f"Pronóstico de reposición recalculado para {len(rows)} medicamentos")
+
+    def invalidate(self):
+        """Fuerza una recarga completa en la próxima consulta"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_fresh(self, db: Optional[Session]):
+        with self._lock:
+            fresh = self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+        if fresh:
+            return
+
+        if db is not None:
+            self.load(db)
+            return
+        own_db = SessionLocal()
+        try:
+            self.load(own_db)
+        finally:
+            own_db.close()
+
+    def apply_consumption(self, consumed: Dict[int, int]):
+        """
+        Descuenta pastillas ya consumidas (medicine_id -> pastillas) y recalcula solo esos
+        medicamentos. Los medicamentos aún no cargados se recogen en la próxima recarga.
+        """
+        if not consumed:
+            return
+
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            positions = []
+            amounts = []
+            for medicine_id, tablets in consumed.items():
+                index = self._position.get(medicine_id)
+                if index is not None:
+                    positions.append(index)
+                    amounts.append(tablets)
+            if not positions:
+                return
+
+            positions = np.asarray(positions, dtype=np.int64)
+            np.subtract.at(self._tablets_left, positions, np.asarray(amounts, dtype=np.float64))
+            self._days_until_empty[positions] = RefillForecaster._days(
+                self._tablets_left[positions], self._tablets_per_day[positions]
+            )
+
+    @staticmethod
+    def _estimated_empty_at(now: datetime, days: float) -> Optional[datetime]:
+        """Fecha estimada de agotamiento; None si queda fuera del horizonte (o no hay consumo)"""
+        if not np.isfinite(days) or days > REFILL_FORECAST_MAX_DAYS:
+            return None
+        return now + timedelta(days=days)
+
+    def below(
+        self,
+        threshold_days: float = REFILL_FORECAST_THRESHOLD_DAYS,
+        limit: Optional[int] = None,
+        db: Optional[Session] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Medicamentos que se agotan en menos de threshold_days días, del más urgente al menos.
+        Si el pronóstico está vencido se recarga (con db, o con una sesión propia).
+        Más allá de REFILL_FORECAST_MAX_DAYS no se estima la fecha (estimated_empty_at es None).
+        """
+        self._ensure_fresh(db)
+        now = datetime.now()
+
+        with self._lock:
+            matches = np.flatnonzero(self._days_until_empty < threshold_days)
+            order = matches[np.argsort(self._days_until_empty[matches], kind="stable")]
+            if limit is not None:
+                order = order[:limit]
+
+            return [
+                {
+                    "id": int(self._ids[index]),
+                    "name": self._names[index],
+                    "tablets_left": int(self._tablets_left[index]),
+                    "tablets_per_day": float(self._tablets_per_day[index]),
+                    "days_until_empty": float(self._days_until_empty[index]),
+                    "estimated_empty_at": RefillForecaster._estimated_empty_at(
+                        now, float(self._days_until_empty[index])
+                    )
+                }
+                for index in order
+            ]
+
+
+# Pronóstico del proceso (se carga en la primera consulta)
+refill_forecaster = RefillForecaster()
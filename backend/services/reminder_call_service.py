@@ -1,22 +1,103 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, select, update, func, exists
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from models import ReminderInstance, Reminder, Medicine, ElderlyProfile, User, Appointment
-from services.reminder_instances import ReminderInstanceService
-from services.notification_logs import NotificationLogService
-from dtos.reminder_instances import ReminderInstanceUpdate
-from dtos.notification_logs import NotificationLogCreate, NotificationLogUpdate
+from typing import List, Dict, Optional, Tuple
+from models import ReminderInstance, Reminder, NotificationLog
 from enums import ReminderInstanceStatus
-from integrations.twilio import create_call
-from integrations.gemini import generate_content
+from services.reminder_messages import ReminderMessageService, CALL_CHANNEL
+from services.recipient_context import RecipientContextService
+from services.reference_cache import ReferenceCache
+from services.reminder_instances import ReminderInstanceService
+from dtos.recipients import RecipientContext
+from database import SessionLocal
+import asyncio
 import logging
 import os
+import socket
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Máximo de llamadas en curso simultáneamente al despachar pendientes (1 = secuencial)
+CALL_DISPATCH_CONCURRENCY = int(os.getenv('REMINDER_CALL_CONCURRENCY', '10'))
+
+# Identificador de este proceso al tomar (claim) instancias pendientes
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Instancias tomadas por claim y duración del lease antes de que otro worker pueda retomarlas
+CLAIM_BATCH_SIZE = int(os.getenv('REMINDER_CLAIM_BATCH_SIZE', '100'))
+CLAIM_LEASE_SECONDS = int(os.getenv('REMINDER_CLAIM_LEASE_SECONDS', '300'))
+
+# Límite de llamadas concurrentes por proveedor externo
+PROVIDER_CONCURRENCY = {
+    "gemini": int(os.getenv('GEMINI_MAX_CONCURRENCY', '4')),
+    "twilio": int(os.getenv('TWILIO_MAX_CONCURRENCY', '5')),
+    "kapso": int(os.getenv('KAPSO_MAX_CONCURRENCY', '10')),
+}
+
 
 class ReminderCallService:
+    @staticmethod
+    def _provider_limits() -> Dict[str, asyncio.Semaphore]:
+        """
+        Crea los semáforos por proveedor. Se crean en cada ejecución porque deben
+        pertenecer al event loop que los usa.
+        """
+        return {
+            provider: asyncio.Semaphore(max(1, limit))
+            for provider, limit in PROVIDER_CONCURRENCY.items()
+        }
+
+    @staticmethod
+    async def _run_blocking(
+        limits: Optional[Dict[str, asyncio.Semaphore]], provider: str, func, *args, **kwargs
+    ):
+        """
+        Ejecuta una llamada bloqueante (SDK síncrono) en un thread para no bloquear el event loop,
+        respetando el límite de concurrencia del proveedor si se entrega.
+        """
+        semaphore = limits.get(provider) if limits else None
+        if semaphore is None:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        async with semaphore:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    @staticmethod
+    def notified_by_whatsapp():
+        """
+        Condición: la instancia ya se notificó por WhatsApp. Sus reintentos siguen por WhatsApp
+        (los toma ReminderSchedulerService) y no se convierten en llamadas.
+        Usa ix_notification_logs_instance_sent_at.
+        """
+        # Import local: notification_outbox depende de este módulo
+        from services.notification_outbox import WHATSAPP_OUTBOX_CHANNEL
+
+        return exists().where(
+            and_(
+                NotificationLog.reminder_instance_id == ReminderInstance.id,
+                NotificationLog.notification_type == WHATSAPP_OUTBOX_CHANNEL
+            )
+        )
+
+    @staticmethod
+    def claimable_filter(now: datetime, whatsapp_retries: bool = False):
+        """
+        Condición de las instancias que el claim puede tomar: pendientes, vencidas (momento de
+        envío: el del reintento si lo hay, si no el programado), del canal pedido y sin un
+        lease vigente de otro worker. Usa ix_reminder_instances_pending_due.
+        """
+        due_at = func.coalesce(ReminderInstance.next_attempt_at, ReminderInstance.scheduled_datetime)
+        notified_by_whatsapp = ReminderCallService.notified_by_whatsapp()
+        return and_(
+            ReminderInstance.status == ReminderInstanceStatus.PENDING.value,
+            due_at <= now,
+            notified_by_whatsapp if whatsapp_retries else ~notified_by_whatsapp,
+            or_(
+                ReminderInstance.lease_expires_at.is_(None),
+                ReminderInstance.lease_expires_at < now
+            )
+        )
+
     @staticmethod
     def get_pending_instances_for_call(db: Session, check_interval_minutes: int = 15) -> List[ReminderInstance]:
         """
@@ -31,17 +112,75 @@ class ReminderCallService:
             Lista de ReminderInstance que necesitan llamadas
         """
         now = datetime.now()
+        # Momento de envío: el del reintento si lo hay (usa ix_reminder_instances_pending_due)
+        due_at = func.coalesce(ReminderInstance.next_attempt_at, ReminderInstance.scheduled_datetime)
 
         pending_instances = db.query(ReminderInstance).filter(
             and_(
                 ReminderInstance.status == ReminderInstanceStatus.PENDING.value,
-                ReminderInstance.scheduled_datetime <= now,
+                due_at <= now,
+                ~ReminderCallService.notified_by_whatsapp(),
             )
         ).all()
         print(f"Pending instances for call: {len(pending_instances)}")
         
         return pending_instances
     
+    @staticmethod
+    def claim_pending_instances(
+        db: Session,
+        worker_id: str = WORKER_ID,
+        batch_size: int = CLAIM_BATCH_SIZE,
+        lease_seconds: int = CLAIM_LEASE_SECONDS,
+        whatsapp_retries: bool = False
+    ) -> List[int]:
+        """
+        Toma atómicamente un lote de reminder_instances pendientes y vencidas para este worker.
+        Cada reintento sigue por el canal del envío original: por defecto se toman las que van
+        por llamada, y con whatsapp_retries las ya notificadas por WhatsApp.
+        
+        Usa FOR UPDATE SKIP LOCKED, así varias réplicas pueden reclamar en paralelo sin
+        bloquearse ni tomar las mismas filas. Cada claim tiene un lease: si el worker
+        muere antes de procesar la instancia, al vencer el lease otra réplica la retoma.
+        
+        Args:
+            db: Sesión de base de datos
+            worker_id: Identificador del worker que toma las instancias
+            batch_size: Máximo de instancias a tomar
+            lease_seconds: Duración del lease
+            whatsapp_retries: Tomar los reintentos de WhatsApp en vez de las llamadas
+        
+        Returns:
+            IDs de las instancias tomadas (ya commiteadas como propias)
+        """
+        now = datetime.now()
+        due_at = func.coalesce(ReminderInstance.next_attempt_at, ReminderInstance.scheduled_datetime)
+        claimable = (
+            select(ReminderInstance.id)
+            .where(ReminderCallService.claimable_filter(now, whatsapp_retries))
+            .order_by(due_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(ReminderInstance)
+            .where(ReminderInstance.id.in_(claimable.scalar_subquery()))
+            .values(claimed_by=worker_id, lease_expires_at=now + timedelta(seconds=lease_seconds))
+            .returning(ReminderInstance.id)
+            .execution_options(synchronize_session=False)
+        )
+        
+        try:
+            claimed_ids = list(db.execute(stmt).scalars().all())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        if claimed_ids:
+            logger.info(f"Worker {worker_id} tomó {len(claimed_ids)} reminder_instances")
+        return claimed_ids
+    
     @staticmethod
     def get_phone_number_for_reminder(db: Session, reminder: Reminder) -> Optional[str]:
         """
@@ -55,44 +194,23 @@ class ReminderCallService:
         Returns:
             Número de teléfono o None si no se encuentra
         """
-        elderly_profile_id = None
-        
-        # Intentar obtener elderly_profile_id directamente
-        if reminder.elderly_profile_id:
-            elderly_profile_id = reminder.elderly_profile_id
-        # Si no está disponible, intentar obtenerlo a través de appointment_id
-        elif reminder.appointment_id:
-            appointment = db.query(Appointment).filter(Appointment.id == reminder.appointment_id).first()
-            if appointment:
-                elderly_profile_id = appointment.elderly_id
-        # Si no está disponible, intentar obtenerlo a través de medicine
-        elif reminder.medicine:
-            medicine = db.query(Medicine).filter(Medicine.id == reminder.medicine).first()
-            if medicine:
-                # medicine.id es FK a elderly_profiles.id
-                elderly_profile_id = medicine.id
-        
-        if not elderly_profile_id:
-            logger.error(f"Reminder {reminder.id} no tiene elderly_profile_id disponible")
-            return None
-        
-        # Obtener el elderly_profile
-        elderly_profile = db.query(ElderlyProfile).filter(
-            ElderlyProfile.id == elderly_profile_id
-        ).first()
-        
-        if not elderly_profile:
-            logger.error(f"ElderlyProfile con ID {elderly_profile_id} no encontrado")
+        context = RecipientContextService.resolve(db, [reminder.id]).get(reminder.id)
+        return ReminderCallService.phone_number_from_context(context) if context else None
+    
+    @staticmethod
+    def phone_number_from_context(context: RecipientContext) -> Optional[str]:
+        """Número de teléfono para la llamada a partir de los datos ya resueltos del reminder"""
+        if not context.elderly_profile_id:
+            logger.error(f"Reminder {context.reminder_id} no tiene elderly_profile_id disponible")
             return None
         
-        # Obtener el número de teléfono del usuario asociado o emergency_contact
-        user = db.query(User).filter(User.id == elderly_profile.id).first()
-        if user and user.phone:
-            return user.phone
-        elif elderly_profile.emergency_contact:
-            return elderly_profile.emergency_contact
+        # Número de teléfono del usuario asociado o emergency_contact
+        if context.phone:
+            return context.phone
+        elif context.emergency_contact:
+            return context.emergency_contact
         
-        logger.warning(f"No se encontró número de teléfono para ElderlyProfile {elderly_profile_id}")
+        logger.warning(f"No se encontró número de teléfono para ElderlyProfile {context.elderly_profile_id}")
         return None
     
     @staticmethod
@@ -107,71 +225,23 @@ class ReminderCallService:
         Returns:
             Mensaje a decir en la llamada
         """
-        if reminder.reminder_type == "medicine":
-            if not reminder.medicine:
-                return "Recordatorio: Es hora de tomar tu medicamento. ¿Ya lo tomaste?"
-            
-            medicine = db.query(Medicine).filter(Medicine.id == reminder.medicine).first()
-            if not medicine:
+        context = RecipientContextService.resolve(db, [reminder.id]).get(reminder.id)
+        if not context:
+            return "Tienes un recordatorio pendiente. Por favor confirma."
+        return ReminderCallService.call_message_from_context(context)
+    
+    @staticmethod
+    def call_message_from_context(context: RecipientContext) -> str:
+        """Mensaje de la llamada a partir de los datos ya resueltos del reminder (sin consultas)"""
+        if context.reminder_type == "medicine":
+            if not context.medicine_id or not context.medicine_name:
                 return "Recordatorio: Es hora de tomar tu medicamento. ¿Ya lo tomaste?"
             
-            # Obtener información de la persona mayor
-            elderly_profile = db.query(ElderlyProfile).filter(
-                ElderlyProfile.id == medicine.id
-            ).first()
-            
-            elderly_name = None
-            if elderly_profile:
-                user = db.query(User).filter(User.id == elderly_profile.id).first()
-                if user:
-                    elderly_name = user.full_name
-            
-            try:
-                tablets_info = f"{medicine.tablets_per_dose} tableta(s)" if medicine.tablets_per_dose else "la dosis indicada"
-                
-                name_context = f"\n- Nombre de la persona: {elderly_name}" if elderly_name else ""
-                name_instruction = f"\n- Dirigirse a la persona por su nombre: {elderly_name}" if elderly_name else "\n- Usar un saludo genérico y amigable"
-                
-                prompt = f"""Genera un mensaje de recordatorio amigable y claro en español para tomar medicamento que será dicho en una llamada telefónica. 
-
-                Información del medicamento:
-                - Nombre: {medicine.name}
-                - Dosis: {tablets_info}{name_context}
-
-                El mensaje debe:
-                - Ser cálido y empático, dirigido a una persona mayor{name_instruction}
-                - Mencionar el nombre del medicamento: {medicine.name}
-                - Especificar claramente la cantidad: {tablets_info}
-                - Ser breve (máximo 2-3 oraciones)
-                - Usar un tono amigable y no alarmante
-                - Ser apropiado para ser dicho en voz alta en una llamada
-
-                Solo devuelve el mensaje, sin comillas ni formato adicional."""
-
-                # Generar contenido con Gemini
-                gemini_response = generate_content(prompt)
-                
-                # Extraer el texto de la respuesta de Gemini
-                if gemini_response and "candidates" in gemini_response:
-                    candidates = gemini_response.get("candidates", [])
-                    if candidates and len(candidates) > 0:
-                        content = candidates[0].get("content", {})
-                        parts = content.get("parts", [])
-                        if parts and len(parts) > 0:
-                            message = parts[0].get("text", "").strip()
-                            if message:
-                                logger.info(f"Mensaje generado por IA para medicamento {medicine.name}: {message}")
-                                return message
-                
-                raise ValueError("Respuesta vacía de Gemini")
-                
-            except Exception as e:
-                logger.error(f"Error al generar mensaje con IA: {str(e)}. Usando mensaje por defecto.")
-                tablets_info = f"{medicine.tablets_per_dose} tableta(s)" if medicine.tablets_per_dose else "la dosis indicada"
-                greeting = f"Querido/a {elderly_name}, " if elderly_name else "Hola, "
-                return f"{greeting}recuerda tomar {medicine.name} ({tablets_info}). ¿Ya lo tomaste?"
+            return ReminderMessageService.get_medicine_message(
+                CALL_CHANNEL, context.medicine_name, context.tablets_per_dose, context.elderly_name
+            )
         
-        elif reminder.reminder_type == "appointment":
+        elif context.reminder_type == "appointment":
             return "Recordatorio: Tienes una cita médica próximamente. Por favor confirma tu asistencia."
         
         return "Tienes un recordatorio pendiente. Por favor confirma."
@@ -179,45 +249,64 @@ class ReminderCallService:
     @staticmethod
     async def process_reminder_call(
         db: Session, 
-        reminder_instance: ReminderInstance
+        reminder_instance: ReminderInstance,
+        limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+        context: Optional[RecipientContext] = None
     ) -> Dict:
         """
-        Procesa una reminder_instance pendiente enviando una llamada telefónica.
+        Procesa una reminder_instance pendiente: genera el mensaje y encola la llamada en el
+        outbox. La llamada y los cambios de estado los hace el relay (NotificationOutboxService.drain).
+        Las consultas (síncronas) corren en un thread para no bloquear el event loop.
         
         Args:
             db: Sesión de base de datos
             reminder_instance: ReminderInstance a procesar
+            limits: Semáforos por proveedor (gemini, twilio) para acotar la concurrencia
+            context: Datos de envío ya resueltos para el lote (si no, se resuelven con una consulta)
         
         Returns:
             Diccionario con el resultado del procesamiento
         """
+        # Import local: notification_outbox depende de este módulo
+        from services.notification_outbox import NotificationOutboxService, CALL_OUTBOX_CHANNEL
+        
         print('in process_reminder_call', flush=True)
+        # El id se lee antes del commit del encolado: después la instancia queda expirada y
+        # leerla desde el event loop haría una consulta bloqueante
+        instance_id = reminder_instance.id
         result = {
-            "reminder_instance_id": reminder_instance.id,
+            "reminder_instance_id": instance_id,
             "success": False,
-            "error": None,
-            "call_sid": None
+            "call_sid": None,
+            "error": None
         }
         
         try:
-            # Obtener el reminder asociado
-            reminder = db.query(Reminder).filter(Reminder.id == reminder_instance.reminder_id).first()
-            if not reminder:
+            # Datos del reminder, adulto mayor y medicamento en una sola consulta
+            if context is None:
+                contexts = await asyncio.to_thread(
+                    RecipientContextService.resolve, db, [reminder_instance.reminder_id]
+                )
+                context = contexts.get(reminder_instance.reminder_id)
+            if not context:
                 error_msg = f"Reminder con ID {reminder_instance.reminder_id} no encontrado"
                 logger.error(error_msg)
                 result["error"] = error_msg
                 return result
             
             # Obtener número de teléfono
-            phone_number = ReminderCallService.get_phone_number_for_reminder(db, reminder)
+            phone_number = ReminderCallService.phone_number_from_context(context)
             if not phone_number:
-                error_msg = f"No se pudo obtener número de teléfono para reminder {reminder.id}"
+                error_msg = f"No se pudo obtener número de teléfono para reminder {context.reminder_id}"
                 logger.error(error_msg)
                 result["error"] = error_msg
                 return result
             
             # Generar mensaje
-            message = ReminderCallService.generate_call_message(db, reminder)
+            # La generación con Gemini es bloqueante: se ejecuta fuera del event loop
+            message = await ReminderCallService._run_blocking(
+                limits, "gemini", ReminderCallService.call_message_from_context, context
+            )
             print('message from generate_call_message', message, flush=True)
             logger.info(f"Mensaje generado para la llamada: {message}")
             
@@ -226,82 +315,108 @@ class ReminderCallService:
             print(f"Webhook URL: {webhook_url}")
             logger.info(f"Webhook URL: {webhook_url}")
             
-            # Crear notification_log antes de enviar la llamada
-            log_data = NotificationLogCreate(
-                reminder_instance_id=reminder_instance.id,
-                notification_type="call",
-                recepient_phone=phone_number,
-                status="pending",
-                sent_at=datetime.now()
+            # NotificationLog y entrada del outbox en una sola transacción; la llamada la hace el relay
+            outbox_entry = await asyncio.to_thread(
+                NotificationOutboxService.enqueue,
+                db,
+                reminder_instance,
+                CALL_OUTBOX_CHANNEL,
+                phone_number,
+                {"message": message, "webhook_url": webhook_url}
             )
-            notification_log = NotificationLogService.create(db, log_data)
+            if outbox_entry is None:
+                result["error"] = f"La llamada de reminder_instance {instance_id} ya estaba encolada o la instancia fue respondida"
+                return result
             
-            # Enviar llamada
-            try:
-                print('process reminder call')
-                logger.info(f"Enviando llamada a {phone_number} con mensaje: {message}")
-                call_sid = create_call(phone_number, message, webhook_url=webhook_url, reminder_instance_id=reminder_instance.id)
-                
-                result["call_sid"] = call_sid
-                
-                # Actualizar reminder_instance a "waiting" (esperando respuesta)
-                instance_update = ReminderInstanceUpdate(
-                    status=ReminderInstanceStatus.WAITING.value
-                )
-                ReminderInstanceService.update(db, reminder_instance.id, instance_update)
-                
-                # Actualizar notification_log
-                log_update = NotificationLogUpdate(
-                    status="sent",
-                    sent_at=datetime.now(),
-                    response=f"Call SID: {call_sid}"
-                )
-                NotificationLogService.update(db, notification_log.id, log_update)
-                
-                result["success"] = True
-                logger.info(f"Llamada enviada exitosamente para reminder_instance {reminder_instance.id}. Call SID: {call_sid}")
-                
-            except Exception as e:
-                error_msg = f"Error al enviar llamada: {str(e)}"
-                logger.error(error_msg)
-                
-                # Actualizar reminder_instance a "failure"
-                instance_update = ReminderInstanceUpdate(
-                    status=ReminderInstanceStatus.FAILURE.value
-                )
-                ReminderInstanceService.update(db, reminder_instance.id, instance_update)
-                
-                # Actualizar notification_log con el error
-                log_update = NotificationLogUpdate(
-                    status="failed",
-                    error_message=error_msg
-                )
-                NotificationLogService.update(db, notification_log.id, log_update)
-                
-                result["error"] = error_msg
+            result["success"] = True
+            logger.info(f"Llamada encolada para reminder_instance {instance_id} a {phone_number}")
         
         except Exception as e:
-            error_msg = f"Error al procesar reminder_instance {reminder_instance.id}: {str(e)}"
+            error_msg = f"Error al procesar reminder_instance {instance_id}: {str(e)}"
             logger.error(error_msg)
             result["error"] = error_msg
         
         return result
     
     @staticmethod
-    async def process_pending_calls(db: Session) -> Dict:
+    async def _process_call_in_own_session(
+        instance_id: int,
+        in_flight: asyncio.Semaphore,
+        limits: Dict[str, asyncio.Semaphore],
+        context: Optional[RecipientContext] = None
+    ) -> Dict:
+        """
+        Procesa una instancia con su propia sesión de base de datos, para que las
+        tareas concurrentes no compartan (ni commiteen) la misma transacción.
+        Las consultas de la sesión corren en un thread, fuera del event loop.
+        """
+        async with in_flight:
+            task_db = SessionLocal()
+            try:
+                instance = await asyncio.to_thread(ReminderInstanceService.get_by_id, task_db, instance_id)
+                if not instance:
+                    return {
+                        "reminder_instance_id": instance_id,
+                        "success": False,
+                        "call_sid": None,
+                        "error": f"ReminderInstance con ID {instance_id} no encontrada"
+                    }
+                return await ReminderCallService.process_reminder_call(task_db, instance, limits, context)
+            except Exception as e:
+                error_msg = f"Error al procesar reminder_instance {instance_id}: {str(e)}"
+                logger.error(error_msg)
+                return {
+                    "reminder_instance_id": instance_id,
+                    "success": False,
+                    "call_sid": None,
+                    "error": error_msg
+                }
+            finally:
+                await asyncio.to_thread(task_db.close)
+
+    @staticmethod
+    def _load_claimed_contexts(
+        db: Session, claimed_ids: List[int], cache: ReferenceCache
+    ) -> Tuple[Dict[int, int], Dict[int, RecipientContext]]:
+        """Reminder de cada instancia tomada y datos de envío de todo el lote en una sola consulta"""
+        reminder_by_instance = dict(
+            db.query(ReminderInstance.id, ReminderInstance.reminder_id)
+            .filter(ReminderInstance.id.in_(claimed_ids))
+            .all()
+        )
+        contexts = RecipientContextService.resolve(db, reminder_by_instance.values(), cache)
+        return reminder_by_instance, contexts
+
+    @staticmethod
+    async def process_pending_calls(
+        db: Session, max_concurrency: Optional[int] = None, cache: Optional[ReferenceCache] = None
+    ) -> Dict:
         """
-        Procesa todos los reminder_instances pendientes que necesitan llamadas.
+        Procesa los reminder_instances pendientes que necesitan llamadas.
+        
+        Las instancias se toman por lotes con claim_pending_instances, por lo que es seguro
+        ejecutar este proceso en varias réplicas/workers a la vez: cada instancia la llama
+        un solo worker.
         
         Args:
             db: Sesión de base de datos
+            max_concurrency: Máximo de llamadas en curso simultáneamente
+                             (por defecto REMINDER_CALL_CONCURRENCY; 1 = secuencial)
+            cache: Cache de datos de referencia del tick (por defecto, una nueva para esta ejecución)
         
         Returns:
-            Diccionario con estadísticas del procesamiento
+            Diccionario con estadísticas del procesamiento: processed son las instancias tomadas
+            y successful/failed/queued el estado de sus llamadas (queued: encoladas, aún sin
+            enviar en esta ejecución); delivery resume el relay completo, de todos los canales
         """
-        print('in async process_pending_calls', flush=True)
-        logger.info('logger.info in async process_pending_calls')
-        pending_instances = ReminderCallService.get_pending_instances_for_call(db)
-        print('pending_instances from get_pending_instances_for_call', pending_instances, flush=True)
+        # Import local: notification_outbox depende de este módulo
+        from services.notification_outbox import NotificationOutboxService, CALL_OUTBOX_CHANNEL
+        
+        logger.info('Procesando reminder_instances pendientes para llamadas')
+        concurrency = max_concurrency or CALL_DISPATCH_CONCURRENCY
+        limits = ReminderCallService._provider_limits()
+        in_flight = asyncio.Semaphore(max(1, concurrency))
+        cache = cache if cache is not None else ReferenceCache()
         
         results = {
             "processed": 0,
@@ -309,22 +424,51 @@ class ReminderCallService:
             "failed": 0,
             "errors": []
         }
+        # Resultados de las llamadas encoladas en esta ejecución, por reminder_instance_id
+        enqueued: Dict[int, Dict] = {}
         
-        for instance in pending_instances:
-            print('before process_reminder_call', flush=True)
-            result = await ReminderCallService.process_reminder_call(db, instance)
-            print('result from process_reminder_call', result, flush=True)
-            results["processed"] += 1
+        while True:
+            # Las consultas (síncronas) corren en un thread para no bloquear el event loop
+            claimed_ids = await asyncio.to_thread(ReminderCallService.claim_pending_instances, db)
+            if not claimed_ids:
+                break
             
-            if result["success"]:
-                results["successful"] += 1
-            else:
-                results["failed"] += 1
-                if result["error"]:
-                    results["errors"].append({
-                        "reminder_instance_id": result["reminder_instance_id"],
-                        "error": result["error"]
-                    })
+            reminder_by_instance, contexts = await asyncio.to_thread(
+                ReminderCallService._load_claimed_contexts, db, claimed_ids, cache
+            )
+            
+            # Con concurrency = 1 el semáforo in_flight procesa las instancias de a una, en orden
+            outcomes = await asyncio.gather(*(
+                ReminderCallService._process_call_in_own_session(
+                    instance_id, in_flight, limits, contexts.get(reminder_by_instance.get(instance_id))
+                )
+                for instance_id in claimed_ids
+            ))
+            
+            for result in outcomes:
+                results["processed"] += 1
+                
+                if result["success"]:
+                    enqueued[result["reminder_instance_id"]] = result
+                else:
+                    results["failed"] += 1
+                    if result["error"]:
+                        results["errors"].append({
+                            "reminder_instance_id": result["reminder_instance_id"],
+                            "error": result["error"]
+                        })
+            
+            # Un lote incompleto significa que no quedan instancias disponibles
+            if len(claimed_ids) < CLAIM_BATCH_SIZE:
+                break
+        
+        # Hacer las llamadas encoladas; el éxito/fallo de cada una se cuenta con su envío
+        delivery = await NotificationOutboxService.drain(db, limits)
+        NotificationOutboxService.settle_enqueued(
+            results, enqueued, delivery, CALL_OUTBOX_CHANNEL, provider_key="call_sid"
+        )
         
+        if len(cache):
+            logger.debug(f"Cache de referencia del tick: {cache.stats()}")
         return results
 
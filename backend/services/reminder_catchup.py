@@ -0,0 +1,178 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Dict
+from models import Reminder, ReminderInstance
+from enums import ReminderInstanceStatus, CatchUpPolicy
+from services.reminder_scheduler import ReminderSchedulerService
+from services.reminder_call_service import WORKER_ID, CLAIM_LEASE_SECONDS
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Política para los slots perdidos (p.ej. tras un deploy o una caída)
+CATCHUP_POLICY = CatchUpPolicy(os.getenv('REMINDER_CATCHUP_POLICY', CatchUpPolicy.SKIP_STALE.value))
+# Antigüedad a partir de la cual un slot se considera obsoleto (política skip-stale)
+CATCHUP_STALE_MINUTES = int(os.getenv('REMINDER_CATCHUP_STALE_MINUTES', '30'))
+# Máximo de slots perdidos a materializar por reminder (se conservan los más recientes)
+CATCHUP_MAX_SLOTS = int(os.getenv('REMINDER_CATCHUP_MAX_SLOTS', '500'))
+# Filas por sentencia INSERT
+CATCHUP_INSERT_CHUNK_SIZE = 5000
+
+
+class ReminderCatchUpService:
+    @staticmethod
+    def missed_slots(
+        reminder: Reminder,
+        latest_scheduled: Optional[datetime],
+        now: datetime,
+        max_slots: int = CATCHUP_MAX_SLOTS
+    ) -> List[datetime]:
+        """
+        Calcula todos los slots vencidos y aún sin instancia de un reminder, desde el siguiente
+        a la instancia más reciente hasta ahora (acotado por end_date y por max_slots).
+        """
+        first_slot = ReminderSchedulerService._next_slot(reminder, latest_scheduled, now)
+        if first_slot is None:
+            return []
+
+        # Sin periodicidad solo existe el primer slot
+        if not reminder.periodicity:
+            return [first_slot]
+
+        last_allowed = now
+        if reminder.end_date:
+            last_allowed = min(now, datetime.combine(reminder.end_date, datetime.max.time()))
+
+        period = timedelta(minutes=reminder.periodicity)
+        slot_count = int((last_allowed - first_slot) // period) + 1
+        if slot_count > max_slots:
+            # Los slots más antiguos no se materializan: el próximo tick continúa desde el más reciente
+            first_slot = first_slot + period * (slot_count - max_slots)
+            slot_count = max_slots
+
+        return [first_slot + period * index for index in range(slot_count)]
+
+    @staticmethod
+    def split_by_policy(
+        slots: List[datetime],
+        now: datetime,
+        policy: CatchUpPolicy = CATCHUP_POLICY,
+        stale_minutes: int = CATCHUP_STALE_MINUTES
+    ) -> Tuple[List[datetime], List[datetime]]:
+        """
+        Separa los slots (ordenados) entre los que se envían y los que se marcan como omitidos.
+
+        - send-all: se envían todos
+        - send-latest-only: solo se envía el más reciente
+        - skip-stale: se envían los que tienen menos de stale_minutes de atraso
+        """
+        if not slots:
+            return [], []
+
+        if policy == CatchUpPolicy.SEND_ALL:
+            return list(slots), []
+
+        if policy == CatchUpPolicy.SEND_LATEST_ONLY:
+            return [slots[-1]], list(slots[:-1])
+
+        stale_before = now - timedelta(minutes=stale_minutes)
+        to_send = [slot for slot in slots if slot >= stale_before]
+        to_skip = [slot for slot in slots if slot < stale_before]
+        return to_send, to_skip
+
+    @staticmethod
+    def materialize_due_slots(
+        db: Session, now: Optional[datetime] = None
+    ) -> List[Tuple[Reminder, ReminderInstance]]:
+        """
+        Materializa en bloque todos los slots vencidos de los reminders activos y aplica la
+        política de recuperación: los slots a enviar quedan pending y tomados (claim) por este
+        worker, y los demás como skipped, en sentencias INSERT ... ON CONFLICT DO UPDATE.
+
+        Si el slot ya existía solo se adopta cuando sigue scheduled (materializado por
+        adelantado y aún sin dueño). Una instancia pending pertenece al despacho de llamadas
+        (creada a mano o reprogramada por un reintento) y nunca se adopta; tampoco un slot que
+        otra réplica de este job ya adoptó.
+
+        Retorna los pares (reminder, reminder_instance) que deben enviarse ahora.
+        """
+        now = now or datetime.now()
+        lease_expires_at = now + timedelta(seconds=CLAIM_LEASE_SECONDS)
+        rows = ReminderSchedulerService.get_active_reminders_with_latest(db, now)
+
+        reminders_by_id: Dict[int, Reminder] = {}
+        values = []
+        skipped = 0
+        for reminder, latest_scheduled in rows:
+            slots = ReminderCatchUpService.missed_slots(reminder, latest_scheduled, now)
+            if not slots:
+                continue
+
+            to_send, to_skip = ReminderCatchUpService.split_by_policy(slots, now)
+            reminders_by_id[reminder.id] = reminder
+            skipped += len(to_skip)
+            values.extend(
+                {
+                    "reminder_id": reminder.id,
+                    "scheduled_datetime": slot,
+                    "status": ReminderInstanceStatus.SKIPPED.value,
+                    "notes": "Omitido por recuperación de slots perdidos",
+                    "claimed_by": None,
+                    "lease_expires_at": None
+                }
+                for slot in to_skip
+            )
+            values.extend(
+                {
+                    "reminder_id": reminder.id,
+                    "scheduled_datetime": slot,
+                    "status": ReminderInstanceStatus.PENDING.value,
+                    "notes": None,
+                    "claimed_by": WORKER_ID,
+                    "lease_expires_at": lease_expires_at
+                }
+                for slot in to_send
+            )
+
+        if not values:
+            return []
+
+        due_ids = []
+        try:
+            for start in range(0, len(values), CATCHUP_INSERT_CHUNK_SIZE):
+                insert_stmt = pg_insert(ReminderInstance).values(values[start:start + CATCHUP_INSERT_CHUNK_SIZE])
+                stmt = insert_stmt.on_conflict_do_update(
+                    constraint="uq_reminder_instances_reminder_scheduled",
+                    set_={
+                        "status": insert_stmt.excluded.status,
+                        "notes": insert_stmt.excluded.notes,
+                        "claimed_by": insert_stmt.excluded.claimed_by,
+                        "lease_expires_at": insert_stmt.excluded.lease_expires_at,
+                    },
+                    where=ReminderInstance.status == ReminderInstanceStatus.SCHEDULED.value
+                ).returning(ReminderInstance.id, ReminderInstance.status)
+                due_ids.extend(
+                    instance_id
+                    for instance_id, status in db.execute(stmt).all()
+                    if status == ReminderInstanceStatus.PENDING.value
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        if skipped:
+            logger.info(f"Recuperación de slots ({CATCHUP_POLICY.value}): {skipped} slots omitidos")
+
+        if not due_ids:
+            return []
+
+        instances = (
+            db.query(ReminderInstance)
+            .filter(ReminderInstance.id.in_(due_ids))
+            .order_by(ReminderInstance.scheduled_datetime.asc())
+            .all()
+        )
+        return [(reminders_by_id[instance.reminder_id], instance) for instance in instances]
@@ -0,0 +1,292 @@
+from sqlalchemy import and_, func
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from models import ReminderInstance
+from enums import ReminderInstanceStatus
+from database import SessionLocal
+import asyncio
+import heapq
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Ventana hacia adelante de instancias pendientes que se mantienen en memoria
+DISPATCHER_LOOKAHEAD_SECONDS = int(os.getenv('REMINDER_DISPATCHER_LOOKAHEAD_SECONDS', '900'))
+# Cada cuánto se avanza la ventana; sin listener de cambios se recarga completa (cambios de otros procesos)
+DISPATCHER_REFRESH_SECONDS = int(os.getenv('REMINDER_DISPATCHER_REFRESH_SECONDS', '300'))
+# Máximo de instancias cargadas por recarga
+DISPATCHER_MAX_LOADED = int(os.getenv('REMINDER_DISPATCHER_MAX_LOADED', '10000'))
+
+
+class ReminderDispatcher:
+    """
+    Despachador de recordatorios guiado por eventos.
+
+    Mantiene en un min-heap los scheduled_datetime de las instancias pendientes de la
+    próxima ventana y duerme hasta la más cercana, en vez de escanear la tabla cada intervalo.
+    El envío sigue pasando por el claim con lease, así que si una entrada quedó obsoleta
+    (otro worker ya la envió, o cambió el horario) simplemente no se toma nada.
+
+    Corre como una tarea asyncio en el event loop de la aplicación; los avisos de cambios
+    (notify_*) son thread-safe. Con el listener de LISTEN/NOTIFY conectado los cambios llegan
+    como eventos y la ventana solo se extiende con las instancias nuevas que van entrando;
+    sin listener se recarga completa cada refresh_seconds.
+    """
+
+    def __init__(
+        self,
+        lookahead_seconds: int = DISPATCHER_LOOKAHEAD_SECONDS,
+        refresh_seconds: int = DISPATCHER_REFRESH_SECONDS
+    ):
+        self.lookahead_seconds = lookahead_seconds
+        self.refresh_seconds = refresh_seconds
+        self._heap: List[Tuple[datetime, int]] = []
+        # instance_id -> (scheduled_datetime, reminder_id); las entradas del heap que no
+        # coinciden con este índice están obsoletas y se descartan al salir del heap
+        self._due: Dict[int, Tuple[datetime, int]] = {}
+        self._dirty_reminders: Set[int] = set()
+        self._full_reload = True
+        self._last_refresh: Optional[datetime] = None
+        self._loaded_until: Optional[datetime] = None
+        self.listening = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self):
+        """Arranca el despachador en el event loop actual"""
+        if self._task is not None:
+            logger.warning("Dispatcher de recordatorios ya está iniciado")
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._full_reload = True
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+        logger.info("Dispatcher de recordatorios iniciado")
+
+    async def stop(self, drain_seconds: float = 30):
+        """
+        Detiene el despachador esperando (hasta drain_seconds) a que termine el despacho en curso.
+        Si hay que cancelarlo, las instancias tomadas y no enviadas se retoman al vencer su lease.
+        """
+        task = self._task
+        self._task = None
+        if task is None:
+            return
+
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=drain_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("El despacho de recordatorios no terminó a tiempo; se cancela")
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._loop = None
+        logger.info("Dispatcher de recordatorios detenido")
+
+    def notify_reminder_changed(self, reminder_id: int):
+        """Avisa que cambiaron el horario o las instancias de un reminder"""
+        self._call_in_loop(self._mark_reminder_dirty, reminder_id)
+
+    def notify_instance_scheduled(self, instance_id: int, reminder_id: int, scheduled_datetime: datetime):
+        """Agrega (o reprograma) una instancia pendiente sin consultar la base de datos"""
+        self._call_in_loop(self._push, instance_id, reminder_id, scheduled_datetime)
+
+    def request_full_reload(self):
+        """Pide recargar la ventana completa (p.ej. tras materializar el horizonte)"""
+        self._call_in_loop(self._mark_full_reload)
+
+    def set_listening(self, listening: bool):
+        """
+        Indica si hay un listener de cambios conectado. Al (re)conectarse se recarga la ventana
+        completa, porque los eventos emitidos mientras no había conexión se perdieron.
+        """
+        self.listening = listening
+        if listening:
+            self.request_full_reload()
+
+    def _call_in_loop(self, callback, *args):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            # Despachador no iniciado (scripts, jobs fuera de la app): el sweep lo cubre
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is loop:
+            callback(*args)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+
+    def _mark_reminder_dirty(self, reminder_id: int):
+        self._dirty_reminders.add(reminder_id)
+        self._wake.set()
+
+    def _mark_full_reload(self):
+        self._full_reload = True
+        self._wake.set()
+
+    def _push(self, instance_id: int, reminder_id: int, scheduled_datetime: datetime):
+        if scheduled_datetime > datetime.now() + timedelta(seconds=self.lookahead_seconds):
+            return
+        self._due[instance_id] = (scheduled_datetime, reminder_id)
+        heapq.heappush(self._heap, (scheduled_datetime, instance_id))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _forget_reminders(self, reminder_ids: Iterable[int]):
+        reminder_ids = set(reminder_ids)
+        for instance_id in [i for i, (_, r) in self._due.items() if r in reminder_ids]:
+            del self._due[instance_id]
+
+    @staticmethod
+    def _load_pending(
+        horizon_end: datetime,
+        reminder_ids: Optional[List[int]] = None,
+        after: Optional[datetime] = None
+    ) -> List[Tuple[int, int, datetime]]:
+        """
+        Carga (id, reminder_id, momento de envío) de las instancias pendientes que vencen en
+        (after, horizon_end]. El momento de envío es next_attempt_at si es un reintento.
+        Los reintentos de WhatsApp no entran: no son llamadas, los reenvía el scheduler.
+        """
+        # Import local: reminder_call_service importa servicios que avisan a este módulo
+        from services.reminder_call_service import ReminderCallService
+
+        due_at = func.coalesce(ReminderInstance.next_attempt_at, ReminderInstance.scheduled_datetime)
+        db = SessionLocal()
+        try:
+            query = db.query(ReminderInstance.id, ReminderInstance.reminder_id, due_at).filter(
+                and_(
+                    ReminderInstance.status == ReminderInstanceStatus.PENDING.value,
+                    due_at <= horizon_end,
+                    ~ReminderCallService.notified_by_whatsapp()
+                )
+            )
+            if reminder_ids is not None:
+                query = query.filter(ReminderInstance.reminder_id.in_(reminder_ids))
+            if after is not None:
+                query = query.filter(due_at > after)
+            return query.order_by(due_at).limit(DISPATCHER_MAX_LOADED).all()
+        finally:
+            db.close()
+
+    async def _reload(self, reminder_ids: Optional[List[int]] = None, after: Optional[datetime] = None):
+        """
+        Recarga la ventana: completa, solo de algunos reminders (reminder_ids), o solo las
+        instancias posteriores a after (avance de la ventana).
+        """
+        now = datetime.now()
+        horizon_end = now + timedelta(seconds=self.lookahead_seconds)
+        rows = await asyncio.to_thread(ReminderDispatcher._load_pending, horizon_end, reminder_ids, after)
+
+        if reminder_ids is not None:
+            self._forget_reminders(reminder_ids)
+        else:
+            if after is None:
+                self._due = {}
+                self._heap = []
+            self._last_refresh = now
+            self._loaded_until = horizon_end
+
+        for instance_id, reminder_id, scheduled_datetime in rows:
+            self._due[instance_id] = (scheduled_datetime, reminder_id)
+            self._heap.append((scheduled_datetime, instance_id))
+        heapq.heapify(self._heap)
+
+    def _next_due(self) -> Optional[datetime]:
+        """Fecha de la próxima instancia vigente, descartando las entradas obsoletas del heap"""
+        while self._heap:
+            scheduled_datetime, instance_id = self._heap[0]
+            current = self._due.get(instance_id)
+            if current is not None and current[0] == scheduled_datetime:
+                return scheduled_datetime
+            heapq.heappop(self._heap)
+        return None
+
+    def _pop_due(self, now: datetime) -> int:
+        """Saca del heap todas las instancias vencidas; retorna cuántas eran"""
+        popped = 0
+        while True:
+            next_due = self._next_due()
+            if next_due is None or next_due > now:
+                return popped
+            _, instance_id = heapq.heappop(self._heap)
+            del self._due[instance_id]
+            popped += 1
+
+    async def _dispatch(self):
+        # Import local: reminder_call_service importa servicios que avisan a este módulo
+        from services.reminder_call_service import ReminderCallService
+
+        # process_pending_calls corre sus consultas en threads; el cierre de la sesión
+        # (rollback y devolución de la conexión al pool) también sale del event loop
+        db = SessionLocal()
+        try:
+            results = await ReminderCallService.process_pending_calls(db)
+            logger.info(
+                f"Dispatcher: {results['processed']} procesados, "
+                f"{results['successful']} exitosos, {results['failed']} fallidos, "
+                f"{results['queued']} en cola; relay: {results['delivery']}"
+            )
+        finally:
+            await asyncio.to_thread(db.close)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                self._wake.clear()
+                now = datetime.now()
+
+                refresh_due = (
+                    self._last_refresh is None
+                    or now - self._last_refresh >= timedelta(seconds=self.refresh_seconds)
+                )
+                if self._full_reload or (refresh_due and not self.listening):
+                    self._full_reload = False
+                    self._dirty_reminders.clear()
+                    await self._reload()
+                else:
+                    if self._dirty_reminders:
+                        reminder_ids = list(self._dirty_reminders)
+                        self._dirty_reminders.clear()
+                        await self._reload(reminder_ids)
+                    if refresh_due:
+                        await self._reload(after=self._loaded_until)
+
+                now = datetime.now()
+                if self._pop_due(now):
+                    await self._dispatch()
+                    continue
+
+                timeout = self.refresh_seconds - (now - self._last_refresh).total_seconds()
+                next_due = self._next_due()
+                if next_due is not None:
+                    timeout = min(timeout, (next_due - now).total_seconds())
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, timeout))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el dispatcher de recordatorios: {str(e)}", exc_info=True)
+                # Reintentar con una recarga completa tras una pausa
+                self._full_reload = True
+                if not self._stopping:
+                    await asyncio.sleep(5)
+
+
+# Despachador del proceso (se inicia al arrancar la aplicación)
+reminder_dispatcher = ReminderDispatcher()
@@ -1,17 +1,26 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import and_, func, cast, Date
+from sqlalchemy import and_, func, cast, Date, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from models import ReminderInstance, Reminder, Medicine, NotificationLog
 from dtos.reminder_instances import ReminderInstanceCreate, ReminderInstanceUpdate, ReminderInstanceWithMedicineResponse
+from enums import ReminderInstanceStatus
+from services.schedule_events import emit_schedule_change, INSTANCE_CREATED
+from services.bulk_update import bulk_update_statements
+from services.pagination import paginate
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (ReminderInstance.scheduled_datetime, ReminderInstance.id)
 
 
 class ReminderInstanceService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[ReminderInstance]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[ReminderInstance]:
         """Obtener todas las instancias de recordatorios con paginación"""
-        return db.query(ReminderInstance).offset(skip).limit(limit).all()
+        return paginate(db.query(ReminderInstance), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, instance_id: int) -> Optional[ReminderInstance]:
@@ -24,64 +33,71 @@ class ReminderInstanceService:
         return db.query(ReminderInstance).filter(ReminderInstance.reminder_id == reminder_id).all()
 
     @staticmethod
-    def get_by_reminder_id_with_medicine(
-        db: Session, 
-        reminder_id: int, 
-        limit: Optional[int] = None,
-        order_by_desc: bool = True
-    ) -> List[ReminderInstanceWithMedicineResponse]:
-        """Obtener instancias de un recordatorio con datos de medicina usando joins"""
-        query = (
-            db.query(ReminderInstance, Reminder, Medicine)
-            .join(Reminder, ReminderInstance.reminder_id == Reminder.id)
-            .outerjoin(Medicine, Reminder.medicine == Medicine.id)
-            .filter(ReminderInstance.reminder_id == reminder_id)
+    def _by_reminder_id_with_medicine_select(
+        reminder_id: int, limit: Optional[int] = None, order_by_desc: bool = True
+    ):
+        stmt = ReminderInstanceService._with_medicine_select().where(
+            ReminderInstance.reminder_id == reminder_id
         )
         
         # Order by scheduled_datetime (most recent first by default)
         if order_by_desc:
-            query = query.order_by(ReminderInstance.scheduled_datetime.desc())
+            stmt = stmt.order_by(ReminderInstance.scheduled_datetime.desc())
         else:
-            query = query.order_by(ReminderInstance.scheduled_datetime.asc())
+            stmt = stmt.order_by(ReminderInstance.scheduled_datetime.asc())
         
         # Apply limit if provided
         if limit:
-            query = query.limit(limit)
-        
-        instances = query.all()
-        
-        result = []
-        for instance, reminder, medicine in instances:
-            # Get method from notification log (most recent one for this instance)
-            notification_log = (
-                db.query(NotificationLog)
-                .filter(NotificationLog.reminder_instance_id == instance.id)
-                .order_by(NotificationLog.sent_at.desc())
-                .first()
-            )
-            method = notification_log.notification_type if notification_log else None
-            
-            instance_response = ReminderInstanceWithMedicineResponse(
-                id=instance.id,
-                reminder_id=instance.reminder_id,
-                scheduled_datetime=instance.scheduled_datetime,
-                status=instance.status,
-                taken_at=instance.taken_at,
-                retry_count=instance.retry_count,
-                max_retries=instance.max_retries,
-                family_notified=instance.family_notified,
-                family_notified_at=instance.family_notified_at,
-                notes=instance.notes,
-                created_at=instance.created_at,
-                updated_at=instance.updated_at,
-                message_id=instance.message_id,
-                medicine_name=medicine.name if medicine else None,
-                dosage=medicine.dosage if medicine else None,
-                method=method
-            )
-            result.append(instance_response)
-        
-        return result
+            stmt = stmt.limit(limit)
+        return stmt
+
+    @staticmethod
+    def get_by_reminder_id_with_medicine(
+        db: Session, 
+        reminder_id: int, 
+        limit: Optional[int] = None,
+        order_by_desc: bool = True
+    ) -> List[ReminderInstanceWithMedicineResponse]:
+        """Obtener instancias de un recordatorio con datos de medicina usando joins"""
+        stmt = ReminderInstanceService._by_reminder_id_with_medicine_select(reminder_id, limit, order_by_desc)
+        return ReminderInstanceService._to_with_medicine_responses(db.execute(stmt).all(), normalize_method=False)
+
+    @staticmethod
+    async def get_by_reminder_id_with_medicine_async(
+        db: AsyncSession,
+        reminder_id: int,
+        limit: Optional[int] = None,
+        order_by_desc: bool = True
+    ) -> List[ReminderInstanceWithMedicineResponse]:
+        """Versión asíncrona de get_by_reminder_id_with_medicine"""
+        stmt = ReminderInstanceService._by_reminder_id_with_medicine_select(reminder_id, limit, order_by_desc)
+        result = await db.execute(stmt)
+        return ReminderInstanceService._to_with_medicine_responses(result.all(), normalize_method=False)
+
+    @staticmethod
+    async def get_all_async(
+        db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[ReminderInstance]:
+        """Versión asíncrona de get_all"""
+        result = await db.execute(paginate(select(ReminderInstance), PAGINATION_KEY, skip, limit, cursor))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_by_id_async(db: AsyncSession, instance_id: int) -> Optional[ReminderInstance]:
+        """Versión asíncrona de get_by_id"""
+        return await db.get(ReminderInstance, instance_id)
+
+    @staticmethod
+    async def get_by_reminder_id_async(db: AsyncSession, reminder_id: int) -> List[ReminderInstance]:
+        """Versión asíncrona de get_by_reminder_id"""
+        result = await db.execute(select(ReminderInstance).where(ReminderInstance.reminder_id == reminder_id))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_by_status_async(db: AsyncSession, status: str) -> List[ReminderInstance]:
+        """Versión asíncrona de get_by_status"""
+        result = await db.execute(select(ReminderInstance).where(ReminderInstance.status == status))
+        return list(result.scalars().all())
 
     @staticmethod
     def get_by_status(db: Session, status: str) -> List[ReminderInstance]:
@@ -93,6 +109,11 @@ class ReminderInstanceService:
         """Obtener todas las instancias pendientes"""
         return db.query(ReminderInstance).filter(ReminderInstance.status == "pending").all()
 
+    @staticmethod
+    async def get_pending_async(db: AsyncSession) -> List[ReminderInstance]:
+        """Versión asíncrona de get_pending"""
+        return await ReminderInstanceService.get_by_status_async(db, "pending")
+
     @staticmethod
     def create(db: Session, instance_data: ReminderInstanceCreate) -> ReminderInstance:
         """Crear una nueva instancia de recordatorio"""
@@ -104,6 +125,12 @@ class ReminderInstanceService:
             db.add(instance)
             db.flush()
             db.refresh(instance)
+            if instance.status == ReminderInstanceStatus.PENDING.value:
+                # Se entrega a los dispatchers cuando el llamador hace commit
+                emit_schedule_change(
+                    db, instance.reminder_id, INSTANCE_CREATED,
+                    instance_id=instance.id, scheduled_datetime=instance.scheduled_datetime
+                )
             return instance
         except IntegrityError as e:
             db.rollback()
@@ -115,6 +142,33 @@ class ReminderInstanceService:
             db.rollback()
             raise ValueError(f"Error inesperado al crear la instancia de recordatorio: {str(e)}")
 
+    @staticmethod
+    def create_if_absent(db: Session, instance_data: ReminderInstanceCreate) -> Optional[ReminderInstance]:
+        """
+        Crear una instancia salvo que ya exista una para el mismo (reminder_id, scheduled_datetime).
+        Se apoya en la restricción única: retorna None si la instancia ya existía (p.ej. la creó otro proceso).
+        """
+        data = instance_data.model_dump(exclude={'id'})
+        stmt = (
+            pg_insert(ReminderInstance)
+            .values(**data)
+            .on_conflict_do_nothing(constraint="uq_reminder_instances_reminder_scheduled")
+            .returning(ReminderInstance.id)
+        )
+        
+        try:
+            instance_id = db.execute(stmt).scalar()
+        except IntegrityError as e:
+            db.rollback()
+            error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
+            if 'foreign key' in error_msg.lower() or 'violates foreign key constraint' in error_msg.lower():
+                raise ValueError(f"Error: El reminder_id {instance_data.reminder_id} no existe en la tabla reminders")
+            raise ValueError(f"Error al crear la instancia de recordatorio: {error_msg}")
+        
+        if instance_id is None:
+            return None
+        return db.query(ReminderInstance).filter(ReminderInstance.id == instance_id).first()
+
     @staticmethod
     def update(
         db: Session, instance_id: int, instance_data: ReminderInstanceUpdate
@@ -140,6 +194,59 @@ class ReminderInstanceService:
             db.rollback()
             raise ValueError(f"Error inesperado al actualizar la instancia de recordatorio: {str(e)}")
 
+    @staticmethod
+    def bulk_update(
+        db: Session, updates: List[Tuple[int, ReminderInstanceUpdate]], commit: bool = True,
+        only_status: Optional[List[str]] = None
+    ) -> int:
+        """
+        Aplica muchos cambios (id, datos) con UPDATE ... FROM (VALUES ...), sin cargar ni
+        refrescar objetos ORM. Con commit=False los cambios quedan en la transacción del llamador.
+        Con only_status solo se tocan las instancias que siguen en alguno de esos estados.
+        Retorna la cantidad de filas actualizadas.
+        """
+        statements = bulk_update_statements(
+            ReminderInstance, [(row_id, data.model_dump(exclude_unset=True)) for row_id, data in updates],
+            where=ReminderInstance.status.in_(only_status) if only_status else None
+        )
+        try:
+            updated = sum(db.execute(stmt).rowcount for stmt in statements)
+            if commit:
+                db.commit()
+            return updated
+        except IntegrityError as e:
+            db.rollback()
+            error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
+            raise ValueError(f"Error al actualizar las instancias de recordatorio: {error_msg}")
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Error inesperado al actualizar las instancias de recordatorio: {str(e)}")
+
+    @staticmethod
+    async def bulk_update_async(
+        db: AsyncSession, updates: List[Tuple[int, ReminderInstanceUpdate]], commit: bool = True,
+        only_status: Optional[List[str]] = None
+    ) -> int:
+        """Versión asíncrona de bulk_update"""
+        statements = bulk_update_statements(
+            ReminderInstance, [(row_id, data.model_dump(exclude_unset=True)) for row_id, data in updates],
+            where=ReminderInstance.status.in_(only_status) if only_status else None
+        )
+        try:
+            updated = 0
+            for stmt in statements:
+                updated += (await db.execute(stmt)).rowcount
+            if commit:
+                await db.commit()
+            return updated
+        except IntegrityError as e:
+            await db.rollback()
+            error_msg = str(e.orig) if hasattr(e, 'orig') else str(e)
+            raise ValueError(f"Error al actualizar las instancias de recordatorio: {error_msg}")
+        except Exception as e:
+            await db.rollback()
+            raise ValueError(f"Error inesperado al actualizar las instancias de recordatorio: {str(e)}")
+
     @staticmethod
     def delete(db: Session, instance_id: int) -> bool:
         """Eliminar una instancia de recordatorio"""
@@ -152,18 +259,10 @@ class ReminderInstanceService:
         return True
 
     @staticmethod
-    def _get_method_from_notification_log(db: Session, instance_id: int) -> Optional[str]:
-        """Obtener el método (whatsapp/call) del NotificationLog más reciente para una instancia"""
-        notification_log = (
-            db.query(NotificationLog)
-            .filter(NotificationLog.reminder_instance_id == instance_id)
-            .order_by(NotificationLog.sent_at.desc())
-            .first()
-        )
-        
-        if notification_log and notification_log.notification_type:
-            # Normalizar el tipo de notificación a "whatsapp" o "call"
-            notification_type = notification_log.notification_type.lower()
+    def _normalize_method(notification_type: Optional[str]) -> Optional[str]:
+        """Normalizar el tipo de notificación a "whatsapp" o "call" """
+        if notification_type:
+            notification_type = notification_type.lower()
             if notification_type == "whatsapp":
                 return "whatsapp"
             elif notification_type == "call":
@@ -172,137 +271,143 @@ class ReminderInstanceService:
         return None
 
     @staticmethod
-    def get_all_with_medicine(db: Session, skip: int = 0, limit: int = 100) -> List[ReminderInstanceWithMedicineResponse]:
-        """Obtener todas las instancias con datos de reminder y medicina usando joins"""
-        instances = (
-            db.query(ReminderInstance, Reminder, Medicine)
+    def _with_medicine_select():
+        """
+        Select base de instancias con su medicina y el tipo del NotificationLog más reciente.
+        El log más reciente se resuelve con un LEFT JOIN LATERAL (usa el índice
+        (reminder_instance_id, sent_at DESC)), así la cantidad de queries no depende del resultado.
+        Los avisos a la familia no cuentan: el método es cómo se le recordó al adulto mayor.
+        """
+        latest_log = (
+            select(NotificationLog.notification_type)
+            .where(
+                and_(
+                    NotificationLog.reminder_instance_id == ReminderInstance.id,
+                    # FAMILY_OUTBOX_CHANNEL (no se importa: notification_outbox depende de este módulo)
+                    NotificationLog.notification_type != "family"
+                )
+            )
+            .order_by(NotificationLog.sent_at.desc())
+            .limit(1)
+            .lateral("latest_log")
+        )
+        return (
+            select(ReminderInstance, Medicine, latest_log.c.notification_type)
             .join(Reminder, ReminderInstance.reminder_id == Reminder.id)
             .outerjoin(Medicine, Reminder.medicine == Medicine.id)
-            .offset(skip)
-            .limit(limit)
-            .all()
+            .outerjoin(latest_log, true())
         )
-        
-        result = []
-        for instance, reminder, medicine in instances:
-            method = ReminderInstanceService._get_method_from_notification_log(db, instance.id)
-            
-            instance_response = ReminderInstanceWithMedicineResponse(
-                id=instance.id,
-                reminder_id=instance.reminder_id,
-                scheduled_datetime=instance.scheduled_datetime,
-                status=instance.status,
-                taken_at=instance.taken_at,
-                retry_count=instance.retry_count,
-                max_retries=instance.max_retries,
-                family_notified=instance.family_notified,
-                family_notified_at=instance.family_notified_at,
-                notes=instance.notes,
-                created_at=instance.created_at,
-                updated_at=instance.updated_at,
-                message_id=instance.message_id,
-                medicine_name=medicine.name if medicine else None,
-                dosage=medicine.dosage if medicine else None,
-                method=method
+
+    @staticmethod
+    def _to_with_medicine_response(
+        instance: ReminderInstance, medicine: Optional[Medicine], method: Optional[str]
+    ) -> ReminderInstanceWithMedicineResponse:
+        return ReminderInstanceWithMedicineResponse(
+            id=instance.id,
+            reminder_id=instance.reminder_id,
+            scheduled_datetime=instance.scheduled_datetime,
+            status=instance.status,
+            taken_at=instance.taken_at,
+            retry_count=instance.retry_count,
+            max_retries=instance.max_retries,
+            family_notified=instance.family_notified,
+            family_notified_at=instance.family_notified_at,
+            notes=instance.notes,
+            created_at=instance.created_at,
+            updated_at=instance.updated_at,
+            message_id=instance.message_id,
+            medicine_name=medicine.name if medicine else None,
+            dosage=medicine.dosage if medicine else None,
+            method=method
+        )
+
+    @staticmethod
+    def _to_with_medicine_responses(rows, normalize_method: bool = True) -> List[ReminderInstanceWithMedicineResponse]:
+        return [
+            ReminderInstanceService._to_with_medicine_response(
+                instance,
+                medicine,
+                ReminderInstanceService._normalize_method(notification_type) if normalize_method else notification_type
             )
-            result.append(instance_response)
-        
-        return result
+            for instance, medicine, notification_type in rows
+        ]
 
     @staticmethod
-    def get_today_with_medicine(db: Session) -> List[ReminderInstanceWithMedicineResponse]:
-        """Obtener instancias de hoy con datos de reminder y medicina usando joins"""
+    def _all_with_medicine_select(skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+        return paginate(ReminderInstanceService._with_medicine_select(), PAGINATION_KEY, skip, limit, cursor)
+
+    @staticmethod
+    def _today_with_medicine_select():
         today = datetime.now().date()
         start_of_day = datetime.combine(today, datetime.min.time())
         start_of_tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
         
         # Use date range for PostgreSQL - more reliable
         # Get all instances where scheduled_datetime is >= start of today and < start of tomorrow
-        instances = (
-            db.query(ReminderInstance, Reminder, Medicine)
-            .join(Reminder, ReminderInstance.reminder_id == Reminder.id)
-            .outerjoin(Medicine, Reminder.medicine == Medicine.id)
-            .filter(
+        return (
+            ReminderInstanceService._with_medicine_select()
+            .where(
                 and_(
                     ReminderInstance.scheduled_datetime >= start_of_day,
                     ReminderInstance.scheduled_datetime < start_of_tomorrow
                 )
             )
             .order_by(ReminderInstance.scheduled_datetime.asc())
-            .all()
         )
-        
-        result = []
-        for instance, reminder, medicine in instances:
-            method = ReminderInstanceService._get_method_from_notification_log(db, instance.id)
-            
-            instance_response = ReminderInstanceWithMedicineResponse(
-                id=instance.id,
-                reminder_id=instance.reminder_id,
-                scheduled_datetime=instance.scheduled_datetime,
-                status=instance.status,
-                taken_at=instance.taken_at,
-                retry_count=instance.retry_count,
-                max_retries=instance.max_retries,
-                family_notified=instance.family_notified,
-                family_notified_at=instance.family_notified_at,
-                notes=instance.notes,
-                created_at=instance.created_at,
-                updated_at=instance.updated_at,
-                message_id=instance.message_id,
-                medicine_name=medicine.name if medicine else None,
-                dosage=medicine.dosage if medicine else None,
-                method=method
-            )
-            result.append(instance_response)
-        
-        return result
 
     @staticmethod
-    def get_by_month_with_medicine(db: Session, year: int, month: int) -> List[ReminderInstanceWithMedicineResponse]:
-        """Obtener instancias de un mes específico con datos de reminder y medicina usando joins"""
+    def _month_with_medicine_select(year: int, month: int):
         start_date = datetime(year, month, 1)
         if month == 12:
             end_date = datetime(year + 1, 1, 1)
         else:
             end_date = datetime(year, month + 1, 1)
         
-        instances = (
-            db.query(ReminderInstance, Reminder, Medicine)
-            .join(Reminder, ReminderInstance.reminder_id == Reminder.id)
-            .outerjoin(Medicine, Reminder.medicine == Medicine.id)
-            .filter(
-                and_(
-                    ReminderInstance.scheduled_datetime >= start_date,
-                    ReminderInstance.scheduled_datetime < end_date
-                )
+        return ReminderInstanceService._with_medicine_select().where(
+            and_(
+                ReminderInstance.scheduled_datetime >= start_date,
+                ReminderInstance.scheduled_datetime < end_date
             )
-            .all()
         )
-        
-        result = []
-        for instance, reminder, medicine in instances:
-            method = ReminderInstanceService._get_method_from_notification_log(db, instance.id)
-            
-            instance_response = ReminderInstanceWithMedicineResponse(
-                id=instance.id,
-                reminder_id=instance.reminder_id,
-                scheduled_datetime=instance.scheduled_datetime,
-                status=instance.status,
-                taken_at=instance.taken_at,
-                retry_count=instance.retry_count,
-                max_retries=instance.max_retries,
-                family_notified=instance.family_notified,
-                family_notified_at=instance.family_notified_at,
-                notes=instance.notes,
-                created_at=instance.created_at,
-                updated_at=instance.updated_at,
-                message_id=instance.message_id,
-                medicine_name=medicine.name if medicine else None,
-                dosage=medicine.dosage if medicine else None,
-                method=method
-            )
-            result.append(instance_response)
-        
-        return result
 
+    @staticmethod
+    def get_all_with_medicine(
+        db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[ReminderInstanceWithMedicineResponse]:
+        """Obtener todas las instancias con datos de reminder y medicina usando joins"""
+        stmt = ReminderInstanceService._all_with_medicine_select(skip, limit, cursor)
+        return ReminderInstanceService._to_with_medicine_responses(db.execute(stmt).all())
+
+    @staticmethod
+    async def get_all_with_medicine_async(
+        db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[ReminderInstanceWithMedicineResponse]:
+        """Versión asíncrona de get_all_with_medicine"""
+        result = await db.execute(ReminderInstanceService._all_with_medicine_select(skip, limit, cursor))
+        return ReminderInstanceService._to_with_medicine_responses(result.all())
+
+    @staticmethod
+    def get_today_with_medicine(db: Session) -> List[ReminderInstanceWithMedicineResponse]:
+        """Obtener instancias de hoy con datos de reminder y medicina usando joins"""
+        stmt = ReminderInstanceService._today_with_medicine_select()
+        return ReminderInstanceService._to_with_medicine_responses(db.execute(stmt).all())
+
+    @staticmethod
+    async def get_today_with_medicine_async(db: AsyncSession) -> List[ReminderInstanceWithMedicineResponse]:
+        """Versión asíncrona de get_today_with_medicine"""
+        result = await db.execute(ReminderInstanceService._today_with_medicine_select())
+        return ReminderInstanceService._to_with_medicine_responses(result.all())
+
+    @staticmethod
+    def get_by_month_with_medicine(db: Session, year: int, month: int) -> List[ReminderInstanceWithMedicineResponse]:
+        """Obtener instancias de un mes específico con datos de reminder y medicina usando joins"""
+        stmt = ReminderInstanceService._month_with_medicine_select(year, month)
+        return ReminderInstanceService._to_with_medicine_responses(db.execute(stmt).all())
+
+    @staticmethod
+    async def get_by_month_with_medicine_async(
+        db: AsyncSession, year: int, month: int
+    ) -> List[ReminderInstanceWithMedicineResponse]:
+        """Versión asíncrona de get_by_month_with_medicine"""
+        result = await db.execute(ReminderInstanceService._month_with_medicine_select(year, month))
+        return ReminderInstanceService._to_with_medicine_responses(result.all())
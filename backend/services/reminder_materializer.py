@@ -0,0 +1,138 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from datetime import datetime, timedelta
+from typing import List, Optional
+from models import ReminderInstance
+from enums import ReminderInstanceStatus
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Días hacia adelante para los que se pre-generan reminder_instances
+MATERIALIZE_HORIZON_DAYS = int(os.getenv('REMINDER_MATERIALIZE_HORIZON_DAYS', '7'))
+
+# Genera los slots de cada reminder entre :from_datetime y :horizon_end con generate_series.
+# Cada reminder arranca en el primer slot de su grilla (start_date + k * periodicity) posterior
+# tanto a :from_datetime como a su instancia más reciente, así cada noche solo se generan los
+# días nuevos del horizonte. Los reminders sin periodicidad tienen un único slot (start_date).
+_MATERIALIZE_SQL = """
+INSERT INTO reminder_instances (reminder_id, scheduled_datetime, status, retry_count, max_retries, family_notified)
+SELECT slots.reminder_id, slots.scheduled_datetime, :status, 0, 3, false
+FROM (
+    SELECT r.id AS reminder_id, slot AS scheduled_datetime
+    FROM reminders r
+    LEFT JOIN LATERAL (
+        SELECT MAX(ri.scheduled_datetime) AS latest
+        FROM reminder_instances ri
+        WHERE ri.reminder_id = r.id
+    ) li ON true
+    CROSS JOIN LATERAL (
+        SELECT GREATEST(
+            CAST(:from_datetime AS timestamp),
+            COALESCE(li.latest + INTERVAL '1 microsecond', CAST(:from_datetime AS timestamp))
+        ) AS lower_bound
+    ) lb
+    CROSS JOIN LATERAL generate_series(
+        GREATEST(
+            r.start_date,
+            r.start_date + make_interval(mins => r.periodicity * CAST(CEIL(
+                EXTRACT(EPOCH FROM (lb.lower_bound - r.start_date)) / 60.0 / r.periodicity
+            ) AS integer))
+        ),
+        LEAST(
+            CAST(:horizon_end AS timestamp),
+            COALESCE(r.end_date + INTERVAL '1 day' - INTERVAL '1 microsecond', CAST(:horizon_end AS timestamp))
+        ),
+        make_interval(mins => r.periodicity)
+    ) AS slot
+    WHERE r.is_active IS TRUE
+      AND r.periodicity > 0
+      AND r.start_date <= CAST(:horizon_end AS timestamp)
+      {reminder_filter}
+
+    UNION ALL
+
+    SELECT r.id AS reminder_id, r.start_date AS scheduled_datetime
+    FROM reminders r
+    WHERE r.is_active IS TRUE
+      AND COALESCE(r.periodicity, 0) = 0
+      AND r.start_date >= CAST(:from_datetime AS timestamp)
+      AND r.start_date <= CAST(:horizon_end AS timestamp)
+      {reminder_filter}
+) slots
+ON CONFLICT ON CONSTRAINT uq_reminder_instances_reminder_scheduled DO NOTHING
+"""
+
+
+class ReminderMaterializerService:
+    @staticmethod
+    def materialize(
+        db: Session,
+        horizon_days: int = MATERIALIZE_HORIZON_DAYS,
+        reminder_ids: Optional[List[int]] = None,
+        from_datetime: Optional[datetime] = None
+    ) -> int:
+        """
+        Genera por adelantado las reminder_instances de los próximos horizon_days días
+        con un único INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+
+        Las instancias quedan scheduled, no pending: ni el claim de llamadas ni el dispatcher
+        las toman. Solo el despacho de WhatsApp (ReminderCatchUpService) las adopta cuando
+        vencen, igual que cuando creaba el slot al momento.
+
+        Args:
+            db: Sesión de base de datos
+            horizon_days: Días hacia adelante a materializar
+            reminder_ids: Limitar a estos reminders (por defecto, todos los activos)
+            from_datetime: Desde cuándo generar slots (por defecto, ahora)
+
+        Returns:
+            Cantidad de instancias creadas
+        """
+        from_datetime = from_datetime or datetime.now()
+        horizon_end = from_datetime + timedelta(days=horizon_days)
+
+        reminder_filter = "AND r.id = ANY(:reminder_ids)" if reminder_ids is not None else ""
+        stmt = text(_MATERIALIZE_SQL.format(reminder_filter=reminder_filter))
+        params = {
+            "status": ReminderInstanceStatus.SCHEDULED.value,
+            "from_datetime": from_datetime,
+            "horizon_end": horizon_end,
+        }
+        if reminder_ids is not None:
+            stmt = stmt.bindparams(bindparam("reminder_ids", type_=ARRAY(Integer)))
+            params["reminder_ids"] = list(reminder_ids)
+
+        try:
+            created = db.execute(stmt, params).rowcount
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        logger.info(f"Materializadas {created} reminder_instances hasta {horizon_end}")
+        return created
+
+    @staticmethod
+    def regenerate(db: Session, reminder_id: int, horizon_days: int = MATERIALIZE_HORIZON_DAYS) -> int:
+        """
+        Regenera las instancias futuras de un reminder cuyo horario cambió: elimina solo las
+        instancias futuras aún no adoptadas (scheduled) y vuelve a materializar el horizonte.
+        """
+        now = datetime.now()
+        try:
+            db.query(ReminderInstance).filter(
+                ReminderInstance.reminder_id == reminder_id,
+                ReminderInstance.scheduled_datetime > now,
+                ReminderInstance.status == ReminderInstanceStatus.SCHEDULED.value
+            ).delete(synchronize_session=False)
+        except Exception:
+            db.rollback()
+            raise
+
+        # materialize hace el commit del borrado y la inserción juntos
+        return ReminderMaterializerService.materialize(
+            db, horizon_days=horizon_days, reminder_ids=[reminder_id], from_datetime=now
+        )
@@ -0,0 +1,173 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any, Tuple
+from models import Reminder, Medicine, User
+from services.message_cache import MessageCache
+from integrations.gemini import generate_content
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+WHATSAPP_CHANNEL = "whatsapp"
+CALL_CHANNEL = "call"
+
+# Mensajes generados por IA reutilizables entre instancias del mismo recordatorio
+message_cache = MessageCache(
+    max_entries=int(os.getenv('MESSAGE_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.getenv('MESSAGE_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+)
+
+
+class ReminderMessageService:
+    @staticmethod
+    def _cache_key(
+        channel: str, medicine_name: str, tablets_per_dose: Optional[int], elderly_name: Optional[str]
+    ) -> Tuple:
+        """Clave normalizada con los únicos datos que cambian el prompt"""
+        return (
+            channel,
+            " ".join(medicine_name.split()).lower(),
+            tablets_per_dose or None,
+            " ".join(elderly_name.split()).lower() if elderly_name else None,
+        )
+
+    @staticmethod
+    def _build_medicine_prompt(
+        channel: str, medicine_name: str, tablets_info: str, elderly_name: Optional[str]
+    ) -> str:
+        name_context = f"\n- Nombre de la persona: {elderly_name}" if elderly_name else ""
+        name_instruction = f"\n- Dirigirse a la persona por su nombre: {elderly_name}" if elderly_name else "\n- Usar un saludo genérico y amigable"
+
+        if channel == CALL_CHANNEL:
+            return f"""Genera un mensaje de recordatorio amigable y claro en español para tomar medicamento que será dicho en una llamada telefónica.
+
+                Información del medicamento:
+                - Nombre: {medicine_name}
+                - Dosis: {tablets_info}{name_context}
+
+                El mensaje debe:
+                - Ser cálido y empático, dirigido a una persona mayor{name_instruction}
+                - Mencionar el nombre del medicamento: {medicine_name}
+                - Especificar claramente la cantidad: {tablets_info}
+                - Ser breve (máximo 2-3 oraciones)
+                - Usar un tono amigable y no alarmante
+                - Ser apropiado para ser dicho en voz alta en una llamada
+
+                Solo devuelve el mensaje, sin comillas ni formato adicional."""
+
+        return f"""Genera un mensaje de recordatorio amigable y claro en español para tomar medicamento.
+
+Información del medicamento:
+- Nombre: {medicine_name}
+- Dosis: {tablets_info}{name_context}
+
+El mensaje debe:
+- Ser cálido y empático, dirigido a una persona mayor{name_instruction}
+- Mencionar el nombre del medicamento: {medicine_name}
+- Especificar claramente la cantidad: {tablets_info}
+- Ser breve (máximo 2-3 oraciones)
+- Incluir una solicitud para confirmar cuando se haya tomado
+- Usar un tono amigable y no alarmante
+
+Solo devuelve el mensaje, sin comillas ni formato adicional."""
+
+    @staticmethod
+    def _fallback_medicine_message(
+        channel: str, medicine_name: str, tablets_info: str, elderly_name: Optional[str]
+    ) -> str:
+        if channel == CALL_CHANNEL:
+            greeting = f"Querido/a {elderly_name}, " if elderly_name else "Hola, "
+            return f"{greeting}recuerda tomar {medicine_name} ({tablets_info}). ¿Ya lo tomaste?"
+
+        greeting = f"Querido/a {elderly_name}, " if elderly_name else ""
+        return f"{greeting}Recordatorio: Es hora de tomar {medicine_name} ({tablets_info}). Por favor confirma cuando lo hayas tomado."
+
+    @staticmethod
+    def _extract_text(gemini_response: Dict[str, Any]) -> str:
+        """Extraer el texto de la respuesta de Gemini"""
+        if not gemini_response or "candidates" not in gemini_response:
+            raise ValueError("Formato de respuesta de Gemini inválido")
+
+        candidates = gemini_response.get("candidates", [])
+        if not candidates:
+            raise ValueError("No se encontraron candidates en la respuesta")
+
+        parts = candidates[0].get("content", {}).get("parts", [])
+        if not parts:
+            raise ValueError("No se encontraron parts en la respuesta")
+
+        message = parts[0].get("text", "").strip()
+        if not message:
+            raise ValueError("Respuesta vacía de Gemini")
+        return message
+
+    @staticmethod
+    def get_medicine_message(
+        channel: str,
+        medicine_name: str,
+        tablets_per_dose: Optional[int],
+        elderly_name: Optional[str] = None
+    ) -> str:
+        """
+        Obtiene el mensaje de recordatorio de medicamento para el canal (whatsapp/call).
+        Usa el cache si hay un mensaje vigente para los mismos datos; si no, lo genera con Gemini.
+        Los mensajes por defecto (cuando Gemini falla) no se guardan en el cache.
+        """
+        key = ReminderMessageService._cache_key(channel, medicine_name, tablets_per_dose, elderly_name)
+        cached_message = message_cache.get(key)
+        if cached_message is not None:
+            return cached_message
+
+        tablets_info = f"{tablets_per_dose} tableta(s)" if tablets_per_dose else "la dosis indicada"
+        try:
+            prompt = ReminderMessageService._build_medicine_prompt(channel, medicine_name, tablets_info, elderly_name)
+            message = ReminderMessageService._extract_text(generate_content(prompt))
+            logger.info(f"Mensaje generado por IA para medicamento {medicine_name}: {message}")
+            message_cache.set(key, message)
+            return message
+        except Exception as e:
+            logger.error(f"Error al generar mensaje con IA: {str(e)}. Usando mensaje por defecto.")
+            return ReminderMessageService._fallback_medicine_message(channel, medicine_name, tablets_info, elderly_name)
+
+    @staticmethod
+    def prewarm_for_date(db: Session, target_date: Optional[date] = None) -> Dict:
+        """
+        Genera por adelantado los mensajes de los recordatorios de medicamento vigentes en
+        target_date (por defecto mañana), para que el envío no espere a Gemini.
+        """
+        target_date = target_date or (datetime.now().date() + timedelta(days=1))
+        end_of_day = datetime.combine(target_date + timedelta(days=1), datetime.min.time())
+
+        rows = (
+            db.query(Medicine.name, Medicine.tablets_per_dose, User.full_name)
+            .join(Reminder, Reminder.medicine == Medicine.id)
+            .outerjoin(User, User.id == Medicine.id)
+            .filter(
+                and_(
+                    Reminder.is_active.is_(True),
+                    Reminder.reminder_type == "medicine",
+                    Reminder.start_date < end_of_day,
+                    or_(Reminder.end_date.is_(None), Reminder.end_date >= target_date)
+                )
+            )
+            .distinct()
+            .all()
+        )
+
+        results = {"candidates": len(rows), "generated": 0, "cached": 0}
+        for medicine_name, tablets_per_dose, elderly_name in rows:
+            for channel in (WHATSAPP_CHANNEL, CALL_CHANNEL):
+                key = ReminderMessageService._cache_key(channel, medicine_name, tablets_per_dose, elderly_name)
+                if message_cache.contains(key):
+                    results["cached"] += 1
+                    continue
+                ReminderMessageService.get_medicine_message(channel, medicine_name, tablets_per_dose, elderly_name)
+                results["generated"] += 1
+
+        logger.info(
+            f"Pre-generación de mensajes para {target_date}: {results['generated']} generados, "
+            f"{results['cached']} ya en cache"
+        )
+        return results
@@ -0,0 +1,115 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, exists, func, text
+from datetime import datetime, timedelta
+from typing import Optional
+from models import ReminderInstance
+from enums import ReminderInstanceStatus
+from services.schedule_events import emit_schedule_change, INSTANCE_RETRIED
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Backoff exponencial: el reintento n espera un tiempo al azar entre 0 y min(max, base * 2^n)
+# ("full jitter"), así tras una caída del proveedor los reintentos no llegan todos juntos
+RETRY_BASE_SECONDS = int(os.getenv('REMINDER_RETRY_BASE_SECONDS', '60'))
+RETRY_MAX_DELAY_SECONDS = int(os.getenv('REMINDER_RETRY_MAX_DELAY_SECONDS', '1800'))
+# Minutos sin respuesta tras el envío para reintentar una instancia en waiting
+RESPONSE_TIMEOUT_MINUTES = int(os.getenv('REMINDER_RESPONSE_TIMEOUT_MINUTES', '30'))
+# Instancias reprogramadas por sentencia
+RETRY_BATCH_SIZE = 1000
+
+# Vuelve a dejar pending las instancias fallidas o sin respuesta que aún tienen reintentos,
+# con next_attempt_at calculado en la misma sentencia (backoff + jitter por fila)
+_SCHEDULE_RETRIES_SQL = text("""
+UPDATE reminder_instances ri
+SET status = :pending,
+    retry_count = COALESCE(ri.retry_count, 0) + 1,
+    next_attempt_at = CAST(:now AS timestamp) + make_interval(
+        secs => random() * LEAST(:max_delay, :base * power(2, COALESCE(ri.retry_count, 0)))
+    ),
+    claimed_by = NULL,
+    lease_expires_at = NULL,
+    updated_at = now()
+WHERE ri.id IN (
+    SELECT candidate.id
+    FROM reminder_instances candidate
+    WHERE (
+            candidate.status = :failure
+            OR (candidate.status = :waiting AND candidate.updated_at < :unanswered_before)
+          )
+      AND COALESCE(candidate.retry_count, 0) < COALESCE(candidate.max_retries, 3)
+    ORDER BY candidate.updated_at
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING ri.id, ri.reminder_id, ri.next_attempt_at
+""")
+
+
+class ReminderRetryService:
+    @staticmethod
+    def due_exists(now: datetime):
+        """
+        Condición EXISTS: hay instancias que schedule_retries reprogramaría (mismo criterio que
+        _SCHEDULE_RETRIES_SQL, sobre ix_reminder_instances_retryable)
+        """
+        unanswered_before = now - timedelta(minutes=RESPONSE_TIMEOUT_MINUTES)
+        return exists().where(
+            and_(
+                or_(
+                    ReminderInstance.status == ReminderInstanceStatus.FAILURE.value,
+                    and_(
+                        ReminderInstance.status == ReminderInstanceStatus.WAITING.value,
+                        ReminderInstance.updated_at < unanswered_before
+                    )
+                ),
+                func.coalesce(ReminderInstance.retry_count, 0) < func.coalesce(ReminderInstance.max_retries, 3)
+            )
+        )
+
+    @staticmethod
+    def schedule_retries(db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Reprograma en bloque (set-based, sin cargar objetos) las instancias fallidas o sin
+        respuesta que no agotaron max_retries: vuelven a pending con retry_count + 1 y un
+        next_attempt_at con backoff exponencial y jitter. El claim las toma cuando vence ese momento,
+        por el canal del envío original: las notificadas por WhatsApp las reenvía
+        ReminderSchedulerService (claim_whatsapp_retries) y el resto vuelve a ser llamada.
+
+        Returns:
+            Cantidad de instancias reprogramadas
+        """
+        now = now or datetime.now()
+        params = {
+            "pending": ReminderInstanceStatus.PENDING.value,
+            "failure": ReminderInstanceStatus.FAILURE.value,
+            "waiting": ReminderInstanceStatus.WAITING.value,
+            "now": now,
+            "unanswered_before": now - timedelta(minutes=RESPONSE_TIMEOUT_MINUTES),
+            "base": RETRY_BASE_SECONDS,
+            "max_delay": RETRY_MAX_DELAY_SECONDS,
+            "batch_size": RETRY_BATCH_SIZE,
+        }
+
+        scheduled = 0
+        while True:
+            try:
+                rows = db.execute(_SCHEDULE_RETRIES_SQL, params).all()
+                for instance_id, reminder_id, next_attempt_at in rows:
+                    emit_schedule_change(
+                        db, reminder_id, INSTANCE_RETRIED,
+                        instance_id=instance_id, scheduled_datetime=next_attempt_at
+                    )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            scheduled += len(rows)
+            if len(rows) < RETRY_BATCH_SIZE:
+                break
+
+        if scheduled:
+            logger.info(f"Reintentos: {scheduled} reminder_instances reprogramadas")
+        return scheduled
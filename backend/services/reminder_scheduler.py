@@ -1,38 +1,37 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_, func
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict
-from models import Reminder, ReminderInstance, Appointment, Medicine, ElderlyProfile, NotificationLog, User
+from typing import Optional, List, Dict, Tuple
+from models import Reminder, ReminderInstance
 from services.reminder_instances import ReminderInstanceService
-from services.notification_logs import NotificationLogService
-from dtos.reminder_instances import ReminderInstanceCreate, ReminderInstanceUpdate
-from dtos.notification_logs import NotificationLogUpdate
+from dtos.reminder_instances import ReminderInstanceCreate
 from enums import ReminderInstanceStatus
-from integrations.kapso import send_whatsapp_message
 from integrations.telegram import send_telegram_message
-from integrations.gemini import generate_content
+from services.reminder_messages import ReminderMessageService, WHATSAPP_CHANNEL
+from services.notification_outbox import NotificationOutboxService, WHATSAPP_OUTBOX_CHANNEL
+from services.reminder_call_service import ReminderCallService, CLAIM_BATCH_SIZE
+from services.recipient_context import RecipientContextService
+from services.reference_cache import ReferenceCache
+from dtos.recipients import RecipientContext
 import logging
-from models import User
 
 logger = logging.getLogger(__name__)
 
 
 class ReminderSchedulerService:
     @staticmethod
-    def calculate_next_scheduled_datetime(
-        db: Session, reminder: Reminder
+    def _next_slot(
+        reminder: Reminder, latest_scheduled: Optional[datetime], now: datetime
     ) -> Optional[datetime]:
         """
-        Calcula el próximo scheduled_datetime basado en:
-        - start_date del reminder
-        - periodicity (minutos entre recordatorios)
-        - Número de reminder_instances ya creadas para ese reminder
+        Calcula el próximo slot: el primero de la grilla start_date + k * periodicity posterior
+        a la instancia más reciente. Es la misma grilla del materializador, así una instancia
+        fuera de la grilla (p.ej. creada a mano) no desplaza los slots siguientes.
+        No hace queries: la instancia más reciente ya viene resuelta por el llamador.
         """
         if not reminder.is_active:
             return None
         
-        now = datetime.now()
-        
         # Si start_date es en el futuro, no hay nada que procesar aún
         if reminder.start_date > now:
             return None
@@ -43,21 +42,17 @@ class ReminderSchedulerService:
             if end_datetime < now:
                 return None
         
-        # Verificar si ya existe una instancia para este reminder
-        # Buscar la instancia más reciente para este reminder
-        existing_instance = db.query(ReminderInstance).filter(
-            ReminderInstance.reminder_id == reminder.id
-        ).order_by(ReminderInstance.scheduled_datetime.desc()).first()
         # Si periodicity es None o 0, solo se envía una vez
         if not reminder.periodicity or reminder.periodicity == 0:
-            if not existing_instance:
+            if latest_scheduled is None:
                 return reminder.start_date
             return None
         
         # Calcular el próximo scheduled_datetime
-        if existing_instance:
-            # Si ya existe una instancia, el próximo es su scheduled_datetime + periodicity
-            next_datetime = existing_instance.scheduled_datetime + timedelta(minutes=reminder.periodicity)
+        if latest_scheduled is not None and latest_scheduled >= reminder.start_date:
+            # Si ya existe una instancia, el próximo es el siguiente slot de la grilla
+            period = timedelta(minutes=reminder.periodicity)
+            next_datetime = reminder.start_date + period * ((latest_scheduled - reminder.start_date) // period + 1)
         else:
             # Si no existe, el primero es start_date
             next_datetime = reminder.start_date
@@ -67,43 +62,90 @@ class ReminderSchedulerService:
             return next_datetime
         
         return None
+
+    @staticmethod
+    def calculate_next_scheduled_datetime(
+        db: Session, reminder: Reminder
+    ) -> Optional[datetime]:
+        """
+        Calcula el próximo scheduled_datetime basado en:
+        - start_date del reminder
+        - periodicity (minutos entre recordatorios)
+        - Número de reminder_instances ya creadas para ese reminder
+        """
+        # Buscar la instancia más reciente para este reminder
+        latest_scheduled = db.query(func.max(ReminderInstance.scheduled_datetime)).filter(
+            ReminderInstance.reminder_id == reminder.id
+        ).scalar()
+        return ReminderSchedulerService._next_slot(reminder, latest_scheduled, datetime.now())
     
     @staticmethod
-    def get_reminders_to_process(db: Session) -> List[Reminder]:
+    def get_active_reminders_with_latest(
+        db: Session, now: datetime
+    ) -> List[Tuple[Reminder, Optional[datetime]]]:
         """
-        Obtiene reminders activos que deben procesarse ahora
+        Obtiene los reminders activos y vigentes junto con el scheduled_datetime de su instancia
+        más reciente ya despachada, en una sola query (agregado agrupado por reminder_id unido
+        contra reminders).
+        
+        Las instancias scheduled no cuentan: son slots materializados por adelantado que aún
+        no se envían, y el siguiente slot a despachar es justamente uno de ellos.
         """
-        now = datetime.now()
-        active_reminders = db.query(Reminder).filter(
+        active_filter = and_(
             Reminder.is_active.is_(True),
-            Reminder.start_date <= now
-        ).all()
+            Reminder.start_date <= now,
+            or_(Reminder.end_date.is_(None), Reminder.end_date >= now.date())
+        )
         
+        latest_instances = (
+            db.query(
+                ReminderInstance.reminder_id.label("reminder_id"),
+                func.max(ReminderInstance.scheduled_datetime).label("latest_scheduled")
+            )
+            .join(Reminder, ReminderInstance.reminder_id == Reminder.id)
+            .filter(
+                active_filter,
+                ReminderInstance.status != ReminderInstanceStatus.SCHEDULED.value
+            )
+            .group_by(ReminderInstance.reminder_id)
+            .subquery()
+        )
+        
+        return (
+            db.query(Reminder, latest_instances.c.latest_scheduled)
+            .outerjoin(latest_instances, latest_instances.c.reminder_id == Reminder.id)
+            .filter(active_filter)
+            .all()
+        )
+
+    @staticmethod
+    def get_reminders_to_process(db: Session) -> List[Tuple[Reminder, datetime]]:
+        """
+        Obtiene reminders activos que deben procesarse ahora, junto con su próximo scheduled_datetime.
+        
+        Resuelve la instancia más reciente de todos los reminders activos en una sola query,
+        en lugar de dos queries por reminder.
+        """
+        now = datetime.now()
+        rows = ReminderSchedulerService.get_active_reminders_with_latest(db, now)
+        
+        # El próximo slot siempre es posterior a la instancia más reciente (o es el primero),
+        # por lo que no puede existir ya una instancia con ese scheduled_datetime exacto.
         reminders_to_process = []
-        for reminder in active_reminders:
-            next_datetime = ReminderSchedulerService.calculate_next_scheduled_datetime(db, reminder)
-            if next_datetime is None:
-                continue
-            
-            # Verificar que no exista ya un reminder_instance para ese momento exacto
-            existing_instance = db.query(ReminderInstance).filter(
-                and_(
-                    ReminderInstance.reminder_id == reminder.id,
-                    ReminderInstance.scheduled_datetime == next_datetime
-                )
-            ).first()
-            
-            if not existing_instance:
+        for reminder, latest_scheduled in rows:
+            next_datetime = ReminderSchedulerService._next_slot(reminder, latest_scheduled, now)
+            if next_datetime is not None:
                 reminders_to_process.append((reminder, next_datetime))
         
         return reminders_to_process
     
     @staticmethod
     def get_emergency_contact(
-        db: Session, reminder: Reminder
+        db: Session, reminder: Reminder, context: Optional[RecipientContext] = None
     ) -> Optional[str]:
         """
-        Obtiene el emergency_contact según el reminder_type
+        Obtiene el emergency_contact según el reminder_type.
+        Si no viene el context ya resuelto para el lote, se resuelve con una consulta.
         """
         if reminder.reminder_type == "medicine":
             # reminder.medicine es FK a medicines.id
@@ -111,28 +153,27 @@ class ReminderSchedulerService:
                 logger.error(f"Reminder {reminder.id} de tipo medicine no tiene campo medicine")
                 return None
             
-            medicine = db.query(Medicine).filter(Medicine.id == reminder.medicine).first()
-            if not medicine:
+            if context is None:
+                context = RecipientContextService.resolve(db, [reminder.id]).get(reminder.id)
+            if not context or not context.medicine_name:
                 logger.error(f"Medicine con ID {reminder.medicine} no encontrado")
                 return None
             
             # medicine.id es FK a elderly_profiles.id
-            elderly_profile = db.query(ElderlyProfile).filter(
-                ElderlyProfile.id == medicine.id
-            ).first()
-            
-            if not elderly_profile:
-                logger.error(f"ElderlyProfile con ID {medicine.id} no encontrado")
+            if not context.elderly_profile_id:
+                logger.error(f"ElderlyProfile con ID {reminder.medicine} no encontrado")
                 return None
             
-            return elderly_profile.emergency_contact
+            return context.emergency_contact
         
         # Otros tipos de reminder no implementados por ahora
         logger.warning(f"Tipo de reminder '{reminder.reminder_type}' no implementado")
         return None
     
     @staticmethod
-    def create_whatsapp_message(db: Session, reminder: Reminder) -> tuple[str, list]:
+    def create_whatsapp_message(
+        db: Session, reminder: Reminder, context: Optional[RecipientContext] = None
+    ) -> tuple[str, list]:
         """
         Crea el mensaje de WhatsApp apropiado según el tipo de reminder
         Retorna: (mensaje, botones)
@@ -143,72 +184,15 @@ class ReminderSchedulerService:
                 logger.error(f"Reminder {reminder.id} de tipo medicine no tiene campo medicine")
                 message = "Recordatorio: Es hora de tomar tu medicamento. Por favor confirma cuando lo hayas tomado."
             else:
-                medicine = db.query(Medicine).filter(Medicine.id == reminder.medicine).first()
-                if not medicine:
+                if context is None:
+                    context = RecipientContextService.resolve(db, [reminder.id]).get(reminder.id)
+                if not context or not context.medicine_name:
                     logger.error(f"Medicine con ID {reminder.medicine} no encontrado")
                     message = "Recordatorio: Es hora de tomar tu medicamento. Por favor confirma cuando lo hayas tomado."
                 else:
-                    # Obtener información de la persona mayor
-                    elderly_profile = db.query(ElderlyProfile).filter(
-                        ElderlyProfile.id == medicine.id
-                    ).first()
-                    
-                    elderly_name = None
-                    if elderly_profile:
-                        user = db.query(User).filter(User.id == elderly_profile.id).first()
-                        if user:
-                            elderly_name = user.full_name
-                    
-                    try:
-                        tablets_info = f"{medicine.tablets_per_dose} tableta(s)" if medicine.tablets_per_dose else "la dosis indicada"
-                        
-                        name_context = f"\n- Nombre de la persona: {elderly_name}" if elderly_name else ""
-                        name_instruction = f"\n- Dirigirse a la persona por su nombre: {elderly_name}" if elderly_name else "\n- Usar un saludo genérico y amigable"
-                        
-                        prompt = f"""Genera un mensaje de recordatorio amigable y claro en español para tomar medicamento. 
-
-Información del medicamento:
-- Nombre: {medicine.name}
-- Dosis: {tablets_info}{name_context}
-
-El mensaje debe:
-- Ser cálido y empático, dirigido a una persona mayor{name_instruction}
-- Mencionar el nombre del medicamento: {medicine.name}
-- Especificar claramente la cantidad: {tablets_info}
-- Ser breve (máximo 2-3 oraciones)
-- Incluir una solicitud para confirmar cuando se haya tomado
-- Usar un tono amigable y no alarmante
-
-Solo devuelve el mensaje, sin comillas ni formato adicional."""
-
-                        # Generar contenido con Gemini
-                        gemini_response = generate_content(prompt)
-                        
-                        # Extraer el texto de la respuesta de Gemini
-                        if gemini_response and "candidates" in gemini_response:
-                            candidates = gemini_response.get("candidates", [])
-                            if candidates and len(candidates) > 0:
-                                content = candidates[0].get("content", {})
-                                parts = content.get("parts", [])
-                                if parts and len(parts) > 0:
-                                    message = parts[0].get("text", "").strip()
-                                    if not message:
-                                        raise ValueError("Respuesta vacía de Gemini")
-                                else:
-                                    raise ValueError("No se encontraron parts en la respuesta")
-                            else:
-                                raise ValueError("No se encontraron candidates en la respuesta")
-                        else:
-                            raise ValueError("Formato de respuesta de Gemini inválido")
-                        
-                        logger.info(f"Mensaje generado por IA para medicamento {medicine.name}: {message}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error al generar mensaje con IA: {str(e)}. Usando mensaje por defecto.")
-                        # Mensaje por defecto con información del medicamento
-                        tablets_info = f"{medicine.tablets_per_dose} tableta(s)" if medicine.tablets_per_dose else "la dosis indicada"
-                        greeting = f"Querido/a {elderly_name}, " if elderly_name else ""
-                        message = f"{greeting}Recordatorio: Es hora de tomar {medicine.name} ({tablets_info}). Por favor confirma cuando lo hayas tomado."
+                    message = ReminderMessageService.get_medicine_message(
+                        WHATSAPP_CHANNEL, context.medicine_name, context.tablets_per_dose, context.elderly_name
+                    )
             
             buttons = [
                 {"id": "taken", "title": "Ya lo tomé"},
@@ -225,131 +209,72 @@ Solo devuelve el mensaje, sin comillas ni formato adicional."""
     
     @staticmethod
     async def process_reminder(
-        db: Session, reminder: Reminder, scheduled_datetime: datetime
+        db: Session,
+        reminder: Reminder,
+        scheduled_datetime: datetime,
+        reminder_instance: Optional[ReminderInstance] = None,
+        context: Optional[RecipientContext] = None
     ) -> Dict:
         """
-        Procesa un reminder: crea reminder_instance, envía WhatsApp y actualiza estados
+        Procesa un reminder: crea reminder_instance (salvo que ya venga materializada) y
+        encola el WhatsApp en el outbox. El envío y los cambios de estado los hace el relay.
+        context trae los datos de envío ya resueltos para el lote (si no, se resuelven aquí).
         """
         result = {
             "reminder_id": reminder.id,
+            "reminder_instance_id": reminder_instance.id if reminder_instance is not None else None,
             "success": False,
+            "message_id": None,
             "error": None
         }
         
         try:
+            # Datos de contacto y del medicamento en una sola consulta
+            if context is None:
+                context = RecipientContextService.resolve(db, [reminder.id]).get(reminder.id)
+            
             # Obtener emergency_contact
-            emergency_contact = ReminderSchedulerService.get_emergency_contact(db, reminder)
+            emergency_contact = ReminderSchedulerService.get_emergency_contact(db, reminder, context)
             if not emergency_contact:
                 error_msg = f"No se pudo obtener emergency_contact para reminder {reminder.id}"
                 logger.error(error_msg)
                 result["error"] = error_msg
                 return result
             
-            # Verificar si ya existe una instancia para este reminder y scheduled_datetime
-            existing_instance = db.query(ReminderInstance).filter(
-                and_(
-                    ReminderInstance.reminder_id == reminder.id,
-                    ReminderInstance.scheduled_datetime == scheduled_datetime
-                )
-            ).first()
-            
-            if existing_instance:
-                reminder_instance = existing_instance
-                logger.info(f"Usando ReminderInstance existente {reminder_instance.id} para reminder {reminder.id}")
-            else:
-                # Crear nueva instancia
+            if reminder_instance is None:
+                # Crear la instancia; la restricción única (reminder_id, scheduled_datetime)
+                # evita duplicados si otro proceso ya creó este slot
                 instance_data = ReminderInstanceCreate(
                     reminder_id=reminder.id,
                     scheduled_datetime=scheduled_datetime,
                     status=ReminderInstanceStatus.PENDING.value
                 )
                 
-                reminder_instance = ReminderInstanceService.create(db, instance_data)
+                reminder_instance = ReminderInstanceService.create_if_absent(db, instance_data)
                 if not reminder_instance:
-                    error_msg = f"No se pudo crear reminder_instance para reminder {reminder.id}"
-                    logger.error(error_msg)
+                    error_msg = f"Ya existe una reminder_instance para reminder {reminder.id} en {scheduled_datetime}"
+                    logger.info(error_msg)
                     result["error"] = error_msg
                     return result
                 logger.info(f"ReminderInstance {reminder_instance.id} creado para reminder {reminder.id}")
+                result["reminder_instance_id"] = reminder_instance.id
             
-            # Asegurar que el reminder_instance esté en la sesión
-            db.flush()
-            
-            # Crear notification_log en la misma transacción
-            message, buttons = ReminderSchedulerService.create_whatsapp_message(db, reminder)
-            notification_log = NotificationLog(
-                reminder_instance_id=reminder_instance.id,
-                notification_type="whatsapp",
-                recepient_phone=emergency_contact,
-                status="pending",
-                sent_at=datetime.now()
+            # NotificationLog y entrada del outbox en una sola transacción; el envío lo hace el relay
+            message, buttons = ReminderSchedulerService.create_whatsapp_message(db, reminder, context)
+            outbox_entry = NotificationOutboxService.enqueue(
+                db,
+                reminder_instance,
+                WHATSAPP_OUTBOX_CHANNEL,
+                emergency_contact,
+                {"body_text": message, "buttons": buttons}
             )
-            db.add(notification_log)
-            db.flush()
-            db.refresh(notification_log)
+            if outbox_entry is None:
+                result["error"] = f"El WhatsApp de reminder_instance {reminder_instance.id} ya estaba encolado o la instancia fue respondida"
+                return result
             
-            # Commit de reminder_instance y notification_log juntos
-            db.commit()
-            logger.info(f"ReminderInstance {reminder_instance.id} y NotificationLog {notification_log.id} creados exitosamente")
+            result["success"] = True
+            logger.info(f"WhatsApp de reminder {reminder.id} encolado para {emergency_contact}")
             
-            # Enviar WhatsApp
-            try:
-                response = await send_whatsapp_message(
-                    to=emergency_contact,
-                    body_text=message,
-                    buttons=buttons
-                )
-
-                print('response', response)
-
-                # response = await send_telegram_message(
-                #     chat_id=emergency_contact,
-                #     text=message
-                # )
-                # # Extraer message_id de la respuesta de Telegram
-                # message_id = response.get("result", {}).get("message_id") if response.get("ok") else None
-                # logger.info(f"Mensaje de Telegram enviado - message_id: {message_id}, chat_id: {emergency_contact}")
-                
-                # Actualizar estados a "waiting" y "sent"
-                # Extraer message_id de la respuesta de WhatsApp/Kapso
-                # La estructura es: {"messages": [{"id": "wamid.xxx"}]}
-                message_id = None
-                if "messages" in response and len(response["messages"]) > 0:
-                    message_id = response["messages"][0].get("id")
-                print(f"Mensaje de WhatsApp enviado - message_id: {message_id}, to: {emergency_contact}")
-                instance_update = ReminderInstanceUpdate(
-                    status=ReminderInstanceStatus.WAITING.value,
-                    message_id=str(message_id)
-                )
-                ReminderInstanceService.update(db, reminder_instance.id, instance_update)
-                
-                log_update = NotificationLogUpdate(
-                    status="sent",
-                    sent_at=datetime.now()
-                )
-                NotificationLogService.update(db, notification_log.id, log_update)
-                
-                result["success"] = True
-                logger.info(f"Reminder {reminder.id} procesado exitosamente. WhatsApp enviado a {emergency_contact}")
-                
-            except Exception as e:
-                error_msg = f"Error al enviar WhatsApp: {str(e)}"
-                logger.error(error_msg)
-                
-                # Actualizar estados a "failure"
-                instance_update = ReminderInstanceUpdate(
-                    status=ReminderInstanceStatus.FAILURE.value
-                )
-                ReminderInstanceService.update(db, reminder_instance.id, instance_update)
-                
-                log_update = NotificationLogUpdate(
-                    status="failed",
-                    error_message=error_msg
-                )
-                NotificationLogService.update(db, notification_log.id, log_update)
-                
-                result["error"] = error_msg
-                
         except Exception as e:
             db.rollback()
             error_msg = f"Error al procesar reminder {reminder.id}: {str(e)}"
@@ -359,12 +284,46 @@ Solo devuelve el mensaje, sin comillas ni formato adicional."""
         return result
     
     @staticmethod
-    async def process_pending_reminders(db: Session) -> Dict:
+    def claim_whatsapp_retries(db: Session) -> List[Tuple[Reminder, ReminderInstance]]:
+        """
+        Toma los reintentos vencidos de WhatsApp (instancias ya notificadas por WhatsApp que
+        ReminderRetryService devolvió a pending), con su reminder, para reenviarlos por el
+        mismo canal. El claim de llamadas no las toma.
+        """
+        retries = []
+        while True:
+            claimed_ids = ReminderCallService.claim_pending_instances(db, whatsapp_retries=True)
+            if claimed_ids:
+                retries.extend(
+                    db.query(Reminder, ReminderInstance)
+                    .join(ReminderInstance, ReminderInstance.reminder_id == Reminder.id)
+                    .filter(ReminderInstance.id.in_(claimed_ids))
+                    .all()
+                )
+            # Un lote incompleto significa que no quedan reintentos disponibles
+            if len(claimed_ids) < CLAIM_BATCH_SIZE:
+                break
+        return retries
+
+    @staticmethod
+    async def process_pending_reminders(db: Session, cache: Optional[ReferenceCache] = None) -> Dict:
         """
         Procesa todos los reminders pendientes
-        Retorna estadísticas del procesamiento
+        Retorna estadísticas del procesamiento: processed son los slots vencidos y
+        successful/failed/queued el estado de sus WhatsApp (queued: encolados, aún sin enviar en
+        esta ejecución); delivery resume el relay completo, de todos los canales
+        
+        cache es la cache de datos de referencia del tick (por defecto, una nueva para esta ejecución).
+        
+        Los slots vencidos (incluidos los perdidos durante una caída) se materializan de una vez
+        con ReminderCatchUpService, que aplica la política de recuperación configurada. Los
+        reintentos vencidos de WhatsApp se reenvían en la misma pasada.
         """
-        reminders_to_process = ReminderSchedulerService.get_reminders_to_process(db)
+        # Import local: reminder_catchup depende de este módulo
+        from services.reminder_catchup import ReminderCatchUpService
+        
+        due_instances = ReminderCatchUpService.materialize_due_slots(db)
+        due_instances.extend(ReminderSchedulerService.claim_whatsapp_retries(db))
         
         results = {
             "processed": 0,
@@ -372,14 +331,22 @@ Solo devuelve el mensaje, sin comillas ni formato adicional."""
             "failed": 0,
             "errors": []
         }
+        # Resultados de los WhatsApp encolados en esta ejecución, por reminder_instance_id
+        enqueued: Dict[int, Dict] = {}
+        
+        # Datos de envío de todos los reminders vencidos en una sola consulta
+        cache = cache if cache is not None else ReferenceCache()
+        contexts = RecipientContextService.resolve(db, (reminder.id for reminder, _ in due_instances), cache)
         
-        for reminder, scheduled_datetime in reminders_to_process:
-            print('processing reminder', reminder)
-            result = await ReminderSchedulerService.process_reminder(db, reminder, scheduled_datetime)
+        for reminder, reminder_instance in due_instances:
+            result = await ReminderSchedulerService.process_reminder(
+                db, reminder, reminder_instance.scheduled_datetime,
+                reminder_instance=reminder_instance, context=contexts.get(reminder.id)
+            )
             results["processed"] += 1
             
             if result["success"]:
-                results["successful"] += 1
+                enqueued[result["reminder_instance_id"]] = result
             else:
                 results["failed"] += 1
                 if result["error"]:
@@ -388,5 +355,12 @@ Solo devuelve el mensaje, sin comillas ni formato adicional."""
                         "error": result["error"]
                     })
         
+        # Enviar lo encolado; el éxito/fallo de cada WhatsApp se cuenta con su envío
+        delivery = await NotificationOutboxService.drain(db)
+        NotificationOutboxService.settle_enqueued(
+            results, enqueued, delivery, WHATSAPP_OUTBOX_CHANNEL,
+            error_key="reminder_id", provider_key="message_id"
+        )
+        
         return results
 
@@ -5,13 +5,25 @@ from typing import List, Optional, Dict, Any
 from models import Reminder, Appointment, ElderlyProfile, Medicine  # Importar todas las tablas referenciadas
 from dtos.reminders import ReminderCreate, ReminderUpdate, ReminderWithMedicineResponse
 from dtos.medicines import MedicineResponse
+from services.reminder_materializer import ReminderMaterializerService
+from services.schedule_events import emit_schedule_change, REMINDER_CREATED, REMINDER_UPDATED, REMINDER_DELETED
+from services.pagination import paginate
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Campos que definen el horario de un reminder: si cambian, se regeneran sus instancias futuras
+SCHEDULE_FIELDS = {"periodicity", "start_date", "end_date", "is_active"}
+
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (Reminder.id,)
 
 
 class ReminderService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Reminder]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[Reminder]:
         """Obtener todos los recordatorios con paginación"""
-        return db.query(Reminder).offset(skip).limit(limit).all()
+        return paginate(db.query(Reminder), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, reminder_id: int) -> Optional[Reminder]:
@@ -34,8 +46,12 @@ class ReminderService:
         reminder = Reminder(**reminder_data.model_dump())
         db.add(reminder)
         try:
+            # El evento necesita el id; Postgres lo entrega a los dispatchers con el commit
+            db.flush()
+            emit_schedule_change(db, reminder.id, REMINDER_CREATED)
             db.commit()
             db.refresh(reminder)
+            ReminderService._materialize_schedule(db, reminder.id)
             return reminder
         except IntegrityError as e:
             db.rollback()
@@ -67,12 +83,20 @@ class ReminderService:
             return None
 
         update_data = reminder_data.model_dump(exclude_unset=True)
+        schedule_changed = any(
+            field in SCHEDULE_FIELDS and getattr(reminder, field) != value
+            for field, value in update_data.items()
+        )
         for field, value in update_data.items():
             setattr(reminder, field, value)
 
         try:
+            if schedule_changed:
+                emit_schedule_change(db, reminder.id, REMINDER_UPDATED)
             db.commit()
             db.refresh(reminder)
+            if schedule_changed:
+                ReminderService._materialize_schedule(db, reminder.id, regenerate=True)
             return reminder
         except IntegrityError as e:
             db.rollback()
@@ -82,6 +106,20 @@ class ReminderService:
             db.rollback()
             raise ValueError(f"Error inesperado al actualizar el recordatorio: {str(e)}")
 
+    @staticmethod
+    def _materialize_schedule(db: Session, reminder_id: int, regenerate: bool = False):
+        """
+        Genera (o regenera) las instancias futuras del reminder. Un error aquí no debe hacer
+        fallar la operación: el job nocturno vuelve a materializar el horizonte.
+        """
+        try:
+            if regenerate:
+                ReminderMaterializerService.regenerate(db, reminder_id)
+            else:
+                ReminderMaterializerService.materialize(db, reminder_ids=[reminder_id])
+        except Exception as e:
+            logger.error(f"Error materializando instancias del reminder {reminder_id}: {str(e)}")
+
     @staticmethod
     def delete(db: Session, reminder_id: int) -> bool:
         """Eliminar un recordatorio"""
@@ -90,19 +128,19 @@ class ReminderService:
             return False
 
         db.delete(reminder)
+        emit_schedule_change(db, reminder_id, REMINDER_DELETED)
         db.commit()
         return True
 
     @staticmethod
-    def get_all_with_medicine(db: Session, skip: int = 0, limit: int = 100) -> List[ReminderWithMedicineResponse]:
+    def get_all_with_medicine(
+        db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None
+    ) -> List[ReminderWithMedicineResponse]:
         """Obtener todos los recordatorios con datos de medicina usando join"""
-        reminders = (
-            db.query(Reminder, Medicine)
-            .outerjoin(Medicine, Reminder.medicine == Medicine.id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        reminders = paginate(
+            db.query(Reminder, Medicine).outerjoin(Medicine, Reminder.medicine == Medicine.id),
+            PAGINATION_KEY, skip, limit, cursor
+        ).all()
         
         result = []
         for reminder, medicine in reminders:
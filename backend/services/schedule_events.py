@@ -0,0 +1,137 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime
+from typing import Dict, Optional, Any
+from database import ASYNCPG_DSN, ASYNCPG_CONNECT_ARGS
+import asyncio
+import asyncpg
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Canal de Postgres por el que se avisan los cambios de horario a los dispatchers
+SCHEDULE_CHANNEL = os.getenv('REMINDER_SCHEDULE_CHANNEL', 'reminder_schedule_changes')
+# Espera máxima entre reintentos de conexión del listener
+LISTENER_MAX_BACKOFF_SECONDS = 60
+
+REMINDER_CREATED = "reminder_created"
+REMINDER_UPDATED = "reminder_updated"
+REMINDER_DELETED = "reminder_deleted"
+INSTANCE_CREATED = "instance_created"
+INSTANCE_RETRIED = "instance_retried"
+
+
+def emit_schedule_change(
+    db: Session,
+    reminder_id: int,
+    change: str,
+    instance_id: Optional[int] = None,
+    scheduled_datetime: Optional[datetime] = None
+):
+    """
+    Emite un evento de cambio de horario con pg_notify dentro de la transacción actual.
+    Postgres solo lo entrega al hacer commit (y lo descarta si hay rollback), así que
+    debe llamarse antes del commit de la operación que hizo el cambio.
+    """
+    payload: Dict[str, Any] = {"reminder_id": reminder_id, "change": change}
+    if instance_id is not None:
+        payload["instance_id"] = instance_id
+    if scheduled_datetime is not None:
+        payload["scheduled_datetime"] = scheduled_datetime.isoformat()
+
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": SCHEDULE_CHANNEL, "payload": json.dumps(payload, separators=(",", ":"))}
+    )
+
+
+class ScheduleChangeListener:
+    """
+    Escucha (LISTEN) el canal de cambios de horario con una conexión asyncpg dedicada y
+    aplica cada evento al dispatcher, que solo recarga el reminder afectado.
+    Si la conexión se cae reintenta con backoff; mientras tanto el dispatcher vuelve a
+    recargar su ventana completa periódicamente.
+    """
+
+    def __init__(
+        self,
+        dispatcher,
+        dsn: str = ASYNCPG_DSN,
+        connect_args: Optional[Dict[str, Any]] = None,
+        channel: str = SCHEDULE_CHANNEL
+    ):
+        self.dispatcher = dispatcher
+        self.dsn = dsn
+        self.connect_args = ASYNCPG_CONNECT_ARGS if connect_args is None else connect_args
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Arranca el listener en el event loop actual"""
+        if self._task is not None:
+            logger.warning("Listener de cambios de horario ya está iniciado")
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task = self._task
+        self._task = None
+        if task is None:
+            return
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        logger.info("Listener de cambios de horario detenido")
+
+    def apply_event(self, payload: str):
+        """Aplica un evento (JSON) al dispatcher"""
+        try:
+            event = json.loads(payload)
+            reminder_id = int(event["reminder_id"])
+            change = event["change"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Evento de cambio de horario inválido: {payload}")
+            return
+
+        if change in (INSTANCE_CREATED, INSTANCE_RETRIED) and event.get("scheduled_datetime"):
+            self.dispatcher.notify_instance_scheduled(
+                int(event["instance_id"]),
+                reminder_id,
+                datetime.fromisoformat(event["scheduled_datetime"])
+            )
+        else:
+            self.dispatcher.notify_reminder_changed(reminder_id)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        self.apply_event(payload)
+
+    async def _run(self):
+        backoff = 1
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn, **self.connect_args)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self._on_notification)
+                self.dispatcher.set_listening(True)
+                logger.info(f"Escuchando cambios de horario en el canal {self.channel}")
+                backoff = 1
+                await closed.wait()
+                logger.warning("Se perdió la conexión del listener de cambios de horario")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el listener de cambios de horario: {str(e)}")
+            finally:
+                self.dispatcher.set_listening(False)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, LISTENER_MAX_BACKOFF_SECONDS)
@@ -4,6 +4,7 @@ from passlib.context import CryptContext
 from typing import List, Optional
 from models import User
 from dtos.users import UserCreate, UserUpdate
+from services.pagination import paginate
 
 # Configurar el contexto de hashing de contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,11 +20,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# Orden estable de los listados (clave de la paginación por cursor)
+PAGINATION_KEY = (User.id,)
+
+
 class UserService:
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
+    def get_all(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[User]:
         """Obtener todos los usuarios con paginación"""
-        return db.query(User).offset(skip).limit(limit).all()
+        return paginate(db.query(User), PAGINATION_KEY, skip, limit, cursor).all()
 
     @staticmethod
     def get_by_id(db: Session, user_id: int) -> Optional[User]:
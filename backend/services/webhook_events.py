@@ -0,0 +1,610 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, select, update, delete, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timedelta
+from typing import Any, Dict, Hashable, List, Optional
+from collections import OrderedDict
+from models import WebhookEvent, ReminderInstance, Reminder, NotificationLog
+from enums import ReminderInstanceStatus, WebhookEventStatus
+from dtos.reminder_instances import ReminderInstanceUpdate
+from dtos.notification_logs import NotificationLogUpdate
+from services.reminder_instances import ReminderInstanceService
+from services.notification_logs import NotificationLogService
+from services.bulk_update import bulk_update_statements
+from services.inventory import InventoryService
+from services.refill_forecast import refill_forecaster
+from services.reminder_call_service import WORKER_ID
+from integrations.telegram import answer_callback_query
+from database import SessionLocal
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+KAPSO_PROVIDER = "kapso"
+TELEGRAM_PROVIDER = "telegram"
+
+# Eventos tomados por lote, tareas que procesan lotes en paralelo y espera máxima entre barridos
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '200'))
+WEBHOOK_WORKER_CONCURRENCY = int(os.getenv('WEBHOOK_WORKER_CONCURRENCY', '2'))
+WEBHOOK_POLL_SECONDS = float(os.getenv('WEBHOOK_POLL_SECONDS', '5'))
+# Lease de un lote tomado y reintentos antes de dar un evento por fallido
+WEBHOOK_LEASE_SECONDS = int(os.getenv('WEBHOOK_LEASE_SECONDS', '120'))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '5'))
+# Horas que se conservan los eventos cerrados; es también la ventana de deduplicación
+WEBHOOK_EVENT_RETENTION_HOURS = int(os.getenv('WEBHOOK_EVENT_RETENTION_HOURS', '72'))
+WEBHOOK_PURGE_BATCH_SIZE = 5000
+# IDs de eventos recientes recordados en memoria para rechazar reenvíos sin ir a la base de datos
+WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv('WEBHOOK_DEDUP_CACHE_SIZE', '50000'))
+
+# Respuestas de Telegram: callback_data -> (estado de la instancia, respuesta registrada)
+_TELEGRAM_RESPONSES = {
+    "taken": (ReminderInstanceStatus.SUCCESS.value, "taken: Ya lo tomé"),
+    "skip": (ReminderInstanceStatus.REJECTED.value, "skip: Omitir"),
+    "confirm": (ReminderInstanceStatus.SUCCESS.value, "confirm: Confirmado"),
+    "cancel": (ReminderInstanceStatus.REJECTED.value, "cancel: Cancelado"),
+}
+
+
+class WebhookDedupCache:
+    """
+    Conjunto acotado (LRU) y con TTL de los (provider, event_id) ya recibidos por este proceso.
+    Es solo un filtro rápido delante de la restricción única de webhook_events: un miss no
+    significa que el evento sea nuevo. Se usa desde el event loop, sin locks.
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 72 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def seen(self, key: Hashable) -> bool:
+        """Indica si la clave se registró dentro del TTL"""
+        expires_at = self._entries.get(key)
+        if expires_at is None or expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def add(self, key: Hashable):
+        """Registra una clave, desalojando las menos recientes si se supera el tamaño máximo"""
+        self._entries[key] = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Filtro de reenvíos del proceso
+webhook_dedup_cache = WebhookDedupCache(
+    max_entries=WEBHOOK_DEDUP_CACHE_SIZE,
+    ttl_seconds=WEBHOOK_EVENT_RETENTION_HOURS * 3600
+)
+
+
+class WebhookEventService:
+    @staticmethod
+    def kapso_event_id(body: Dict[str, Any]) -> Optional[str]:
+        """ID del mensaje entrante de Kapso (identifica la entrega del webhook)"""
+        message = body.get("message") or {}
+        return message.get("id")
+
+    @staticmethod
+    def telegram_event_id(body: Dict[str, Any]) -> Optional[str]:
+        """update_id de Telegram"""
+        update_id = body.get("update_id")
+        return str(update_id) if update_id is not None else None
+
+    @staticmethod
+    async def append_async(
+        db: AsyncSession, provider: str, payload: Dict[str, Any], event_id: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Guarda el webhook tal como llegó para procesarlo en segundo plano: un solo INSERT,
+        así el endpoint responde de inmediato aunque la base de datos esté lenta.
+
+        Los reenvíos de un evento ya recibido (mismo provider y event_id) se descartan: primero
+        contra la cache en memoria, y si no está ahí, con ON CONFLICT DO NOTHING sobre la
+        restricción única.
+
+        Returns:
+            El id del evento, o None si era un reenvío
+        """
+        dedup_key = (provider, event_id)
+        if event_id is not None and webhook_dedup_cache.seen(dedup_key):
+            return None
+
+        try:
+            result = await db.execute(
+                pg_insert(WebhookEvent)
+                .values(
+                    provider=provider,
+                    event_id=event_id,
+                    payload=payload,
+                    status=WebhookEventStatus.PENDING.value,
+                    attempts=0
+                )
+                .on_conflict_do_nothing(constraint="uq_webhook_events_provider_event")
+                .returning(WebhookEvent.id)
+            )
+            event_pk = result.scalar_one_or_none()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        if event_id is not None:
+            webhook_dedup_cache.add(dedup_key)
+        return event_pk
+
+    @staticmethod
+    def purge_expired(db: Session, now: Optional[datetime] = None) -> int:
+        """
+        Elimina por lotes los eventos procesados o fallidos más antiguos que la retención.
+        Pasado ese plazo un reenvío ya no se reconoce como duplicado.
+
+        Returns:
+            Cantidad de eventos eliminados
+        """
+        now = now or datetime.now()
+        cutoff = now - timedelta(hours=WEBHOOK_EVENT_RETENTION_HOURS)
+        expired = (
+            select(WebhookEvent.id)
+            .where(
+                WebhookEvent.status.in_([WebhookEventStatus.PROCESSED.value, WebhookEventStatus.FAILED.value]),
+                WebhookEvent.received_at < cutoff
+            )
+            .limit(WEBHOOK_PURGE_BATCH_SIZE)
+        )
+
+        purged = 0
+        while True:
+            try:
+                deleted = db.execute(
+                    delete(WebhookEvent)
+                    .where(WebhookEvent.id.in_(expired.scalar_subquery()))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            purged += deleted
+            if deleted < WEBHOOK_PURGE_BATCH_SIZE:
+                break
+
+        if purged:
+            logger.info(f"Eliminados {purged} webhook_events anteriores a {cutoff}")
+        return purged
+
+    @staticmethod
+    def parse_kapso(body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extrae teléfono, message_id del mensaje original y respuesta del botón de un webhook
+        de Kapso. Lanza ValueError si el webhook no trae los datos necesarios.
+        """
+        message = body.get("message") or {}
+        phone_number = message.get("from") or (body.get("conversation") or {}).get("phone_number")
+
+        button_id = None
+        button_title = None
+        user_response = None
+        interactive = message.get("interactive") or {}
+        if interactive.get("type") == "button_reply" and "button_reply" in interactive:
+            button_reply = interactive["button_reply"]
+            button_id = button_reply.get("id")
+            button_title = button_reply.get("title")
+            user_response = f"{button_id}: {button_title}" if button_id and button_title else button_id or button_title
+
+        if not phone_number:
+            raise ValueError("No se pudo obtener el número de teléfono del webhook")
+
+        message_id = (message.get("context") or {}).get("id")
+        if not message_id:
+            raise ValueError("No se pudo obtener message_id del mensaje")
+
+        # "taken" o "btn_yes" o "Si" = respuesta positiva; cualquier otra = negativa
+        is_positive_response = bool(
+            button_id in ["taken", "btn_yes"] or
+            button_title and button_title.lower() in ["sí", "si", "yes", "ya lo tomé"]
+        )
+        return {
+            "message_id": message_id,
+            "phone_number": phone_number,
+            "user_response": user_response or f"Respuesta recibida: {button_id or button_title}",
+            "is_positive_response": is_positive_response
+        }
+
+    @staticmethod
+    def parse_telegram(body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extrae el callback_query de un webhook de Telegram.
+        Lanza ValueError si el webhook no trae los datos necesarios.
+        """
+        callback_query = body.get("callback_query") or {}
+        callback_data = callback_query.get("data")
+        message_id = None
+        if "message_id" in (callback_query.get("message") or {}):
+            message_id = str(callback_query["message"]["message_id"])
+
+        if not callback_data:
+            raise ValueError("No se pudo obtener callback_data")
+        if not message_id:
+            raise ValueError("No se pudo obtener message_id del mensaje")
+
+        instance_status, user_response = _TELEGRAM_RESPONSES.get(
+            callback_data, (ReminderInstanceStatus.SUCCESS.value, f"{callback_data}: Respuesta recibida")
+        )
+        return {
+            "message_id": message_id,
+            "callback_data": callback_data,
+            "instance_status": instance_status,
+            "user_response": user_response
+        }
+
+    @staticmethod
+    def claim_batch(
+        db: Session,
+        worker_id: str = WORKER_ID,
+        batch_size: int = WEBHOOK_BATCH_SIZE,
+        lease_seconds: int = WEBHOOK_LEASE_SECONDS
+    ) -> List[Dict[str, Any]]:
+        """
+        Toma un lote de eventos por procesar (pending, o processing con el lease vencido) con
+        FOR UPDATE SKIP LOCKED y los marca como processing.
+        """
+        now = datetime.now()
+        claimable = (
+            select(WebhookEvent.id)
+            .where(
+                or_(
+                    WebhookEvent.status == WebhookEventStatus.PENDING.value,
+                    and_(
+                        WebhookEvent.status == WebhookEventStatus.PROCESSING.value,
+                        WebhookEvent.lease_expires_at < now
+                    )
+                )
+            )
+            .order_by(WebhookEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_(claimable.scalar_subquery()))
+            .values(
+                status=WebhookEventStatus.PROCESSING.value,
+                claimed_by=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=WebhookEvent.attempts + 1
+            )
+            .returning(WebhookEvent.id, WebhookEvent.provider, WebhookEvent.payload, WebhookEvent.attempts)
+            .execution_options(synchronize_session=False)
+        )
+
+        try:
+            events = [dict(row) for row in db.execute(stmt).mappings().all()]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        # Los webhooks se aplican en orden de llegada (la última respuesta gana)
+        return sorted(events, key=lambda event: event["id"])
+
+    @staticmethod
+    def process_batch(db: Session, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Aplica un lote de webhooks en una sola transacción: una consulta IN para todos los
+        message_id, y los cambios de reminder_instances, notification_logs y medicines en
+        bloque. Los eventos sin datos suficientes o sin instancia quedan como failed.
+
+        Returns:
+            processed / failed y los callback_query de Telegram por confirmar
+        """
+        now = datetime.now()
+        results = {"processed": 0, "failed": 0, "callback_ids": []}
+        if not events:
+            return results
+
+        parsed = []
+        event_changes = []
+        for event in events:
+            try:
+                if event["provider"] == KAPSO_PROVIDER:
+                    data = WebhookEventService.parse_kapso(event["payload"])
+                elif event["provider"] == TELEGRAM_PROVIDER:
+                    callback_id = (event["payload"].get("callback_query") or {}).get("id")
+                    if callback_id:
+                        results["callback_ids"].append(callback_id)
+                    data = WebhookEventService.parse_telegram(event["payload"])
+                else:
+                    raise ValueError(f"Proveedor de webhook desconocido: {event['provider']}")
+                parsed.append((event, data))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                event_changes.append((event["id"], {
+                    "status": WebhookEventStatus.FAILED.value, "last_error": str(e), "processed_at": now
+                }))
+
+        # Todas las instancias del lote en una sola consulta (la más antigua por message_id)
+        message_ids = {data["message_id"] for _, data in parsed}
+        instances = {}
+        if message_ids:
+            rows = db.execute(
+                select(ReminderInstance.message_id, ReminderInstance.id, ReminderInstance.reminder_id)
+                .where(ReminderInstance.message_id.in_(message_ids))
+                .order_by(ReminderInstance.id)
+            ).all()
+            for message_id, instance_id, reminder_id in rows:
+                instances.setdefault(message_id, (instance_id, reminder_id))
+
+        # notification_log de Telegram de cada instancia
+        telegram_instance_ids = {
+            instances[data["message_id"]][0]
+            for event, data in parsed
+            if event["provider"] == TELEGRAM_PROVIDER and data["message_id"] in instances
+        }
+        telegram_logs = {}
+        if telegram_instance_ids:
+            rows = db.execute(
+                select(NotificationLog.reminder_instance_id, NotificationLog.id)
+                .where(
+                    NotificationLog.reminder_instance_id.in_(telegram_instance_ids),
+                    NotificationLog.notification_type == "telegram"
+                )
+                .order_by(NotificationLog.id)
+            ).all()
+            for instance_id, log_id in rows:
+                telegram_logs.setdefault(instance_id, log_id)
+
+        instance_updates = []
+        log_updates = []
+        new_logs = []
+        # Una dosis por instancia confirmada, aunque llegue más de una respuesta en el lote
+        taken: Dict[int, int] = {}
+        for event, data in parsed:
+            instance = instances.get(data["message_id"])
+            if instance is None:
+                event_changes.append((event["id"], {
+                    "status": WebhookEventStatus.FAILED.value,
+                    "last_error": f"No se encontró reminder_instance para el message_id {data['message_id']}",
+                    "processed_at": now
+                }))
+                continue
+
+            instance_id, reminder_id = instance
+            if event["provider"] == KAPSO_PROVIDER:
+                positive = data["is_positive_response"]
+                new_logs.append({
+                    "reminder_instance_id": instance_id,
+                    "notification_type": "whatsapp",
+                    "recepient_phone": data["phone_number"],
+                    "status": "sent" if positive else "rejected",
+                    "sent_at": now,
+                    "delivered_at": now,
+                    "response": data["user_response"]
+                })
+                instance_changes = {
+                    "status": ReminderInstanceStatus.SUCCESS.value if positive else ReminderInstanceStatus.REJECTED.value
+                }
+                if positive:
+                    instance_changes["taken_at"] = now
+                    taken[instance_id] = reminder_id
+                instance_updates.append((instance_id, ReminderInstanceUpdate(**instance_changes)))
+            else:
+                log_id = telegram_logs.get(instance_id)
+                if log_id is not None:
+                    log_updates.append((log_id, NotificationLogUpdate(
+                        response=data["user_response"], delivered_at=now, status="delivered"
+                    )))
+                else:
+                    logger.warning(f"No se encontró notification_log para reminder_instance_id {instance_id}")
+                instance_updates.append((instance_id, ReminderInstanceUpdate(
+                    status=data["instance_status"],
+                    taken_at=now if data["callback_data"] == "taken" else None
+                )))
+
+            event_changes.append((event["id"], {
+                "status": WebhookEventStatus.PROCESSED.value, "last_error": None, "processed_at": now
+            }))
+
+        try:
+            if new_logs:
+                db.execute(insert(NotificationLog), new_logs)
+            ReminderInstanceService.bulk_update(db, instance_updates, commit=False)
+            NotificationLogService.bulk_update(db, log_updates, commit=False)
+            consumed = WebhookEventService._consume_tablets(db, taken)
+            for stmt in bulk_update_statements(WebhookEvent, event_changes):
+                db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        # El pronóstico de reposición se actualiza solo con lo ya commiteado
+        refill_forecaster.apply_consumption(consumed)
+
+        for _, changes in event_changes:
+            if changes["status"] == WebhookEventStatus.PROCESSED.value:
+                results["processed"] += 1
+            else:
+                results["failed"] += 1
+        return results
+
+    @staticmethod
+    def _consume_tablets(db: Session, taken: Dict[int, int]) -> Dict[int, int]:
+        """
+        Descuenta del stock las dosis confirmadas (reminder_instance_id -> reminder_id).
+        Retorna las pastillas descontadas por medicine_id.
+        """
+        if not taken:
+            return {}
+
+        medicine_by_reminder = dict(
+            db.execute(
+                select(Reminder.id, Reminder.medicine)
+                .where(Reminder.id.in_(set(taken.values())), Reminder.medicine.isnot(None))
+            ).all()
+        )
+        return InventoryService.consume_doses(db, [
+            (instance_id, medicine_by_reminder[reminder_id])
+            for instance_id, reminder_id in taken.items()
+            if reminder_id in medicine_by_reminder
+        ])
+
+    @staticmethod
+    def release_batch(db: Session, events: List[Dict[str, Any]], error: str):
+        """
+        Devuelve a pending un lote cuyo procesamiento falló (o lo marca failed si agotó los
+        intentos), para que lo retome el próximo barrido sin esperar al lease.
+        """
+        changes = [
+            (event["id"], {
+                "status": (
+                    WebhookEventStatus.FAILED.value
+                    if event["attempts"] >= WEBHOOK_MAX_ATTEMPTS
+                    else WebhookEventStatus.PENDING.value
+                ),
+                "last_error": error
+            })
+            for event in events
+        ]
+        try:
+            for stmt in bulk_update_statements(WebhookEvent, changes):
+                db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+class WebhookEventWorker:
+    """
+    Pool de tareas asyncio que procesan los webhooks encolados por lotes. Los endpoints solo
+    guardan el evento y avisan con notify(); si no llega ningún aviso (eventos guardados por
+    otra réplica) se barre cada poll_seconds.
+
+    El trabajo con la base de datos de cada lote corre en un thread, así el procesamiento no
+    bloquea el event loop que atiende los webhooks.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = WEBHOOK_WORKER_CONCURRENCY,
+        poll_seconds: float = WEBHOOK_POLL_SECONDS,
+        batch_size: int = WEBHOOK_BATCH_SIZE
+    ):
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Arranca las tareas del pool en el event loop actual"""
+        if self._tasks:
+            logger.warning("Worker de webhooks ya está iniciado")
+            return
+
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._tasks = [loop.create_task(self._run()) for _ in range(self.concurrency)]
+        logger.info(f"Worker de webhooks iniciado ({self.concurrency} tareas)")
+
+    async def stop(self, drain_seconds: float = 30):
+        """Detiene el pool esperando (hasta drain_seconds) a que terminen los lotes en curso"""
+        tasks = self._tasks
+        self._tasks = []
+        if not tasks:
+            return
+
+        self._stopping = True
+        self._wake.set()
+        done, pending = await asyncio.wait(tasks, timeout=drain_seconds)
+        if pending:
+            # Los lotes cancelados se retoman al vencer su lease
+            logger.warning("El procesamiento de webhooks no terminó a tiempo; se cancela")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Worker de webhooks detenido")
+
+    def notify(self):
+        """Avisa que se encoló un webhook (llamar desde el event loop de la aplicación)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _process_once(self) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            events = WebhookEventService.claim_batch(db, batch_size=self.batch_size)
+            if not events:
+                return {"claimed": 0, "processed": 0, "failed": 0, "callback_ids": []}
+            try:
+                results = WebhookEventService.process_batch(db, events)
+            except Exception as e:
+                logger.error(f"Error al procesar un lote de {len(events)} webhooks: {str(e)}", exc_info=True)
+                WebhookEventService.release_batch(db, events, str(e))
+                return {"claimed": len(events), "processed": 0, "failed": len(events), "callback_ids": []}
+            results["claimed"] = len(events)
+            return results
+        finally:
+            db.close()
+
+    @staticmethod
+    async def _answer_callbacks(callback_ids: List[str]):
+        """Confirma a Telegram los callback_query del lote en paralelo"""
+        outcomes = await asyncio.gather(
+            *(answer_callback_query(callback_id) for callback_id in callback_ids),
+            return_exceptions=True
+        )
+        for callback_id, outcome in zip(callback_ids, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"No se pudo confirmar el callback_query {callback_id}: {str(outcome)}")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                self._wake.clear()
+                # Procesar lotes hasta vaciar la cola
+                while not self._stopping:
+                    results = await asyncio.to_thread(self._process_once)
+                    if results["callback_ids"]:
+                        await self._answer_callbacks(results["callback_ids"])
+                    if results["claimed"]:
+                        logger.info(
+                            f"Webhooks: {results['processed']} procesados, {results['failed']} fallidos"
+                        )
+                    if results["claimed"] < self.batch_size:
+                        break
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el worker de webhooks: {str(e)}", exc_info=True)
+                if not self._stopping:
+                    await asyncio.sleep(self.poll_seconds)
+
+
+# Worker del proceso (se inicia al arrancar la aplicación)
+webhook_worker = WebhookEventWorker()